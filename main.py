@@ -11,13 +11,14 @@ from kivy.properties import ObjectProperty, StringProperty, NumericProperty
 from kivy.clock import Clock
 from kivy.metrics import dp
 from kivy.uix.screenmanager import Screen
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy import platform
 from datetime import datetime
 import requests
 import json
 import logging
-import threading
-from functools import partial
+from itertools import count, islice
+import sya_cliente_http as cliente_http
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +28,16 @@ logger = logging.getLogger(__name__)
 SERVER_URL = "http://34.67.103.132:5000"
 # SERVER_URL = "http://127.0.0.1:5000"
 
+# Cantidad máxima de sugerencias en el popup de materiales
+MAX_SUGERENCIAS = 10
+
+def decodificar_catalogo(datos):
+    """Convierte un catálogo en formato columnar ({columnas, filas}) a lista de diccionarios."""
+    if isinstance(datos, dict) and "columnas" in datos and "filas" in datos:
+        columnas = datos["columnas"]
+        return [dict(zip(columnas, fila)) for fila in datos["filas"]]
+    return datos
+
 # Solicitar permisos en Android
 if platform == "android":
     try:
@@ -35,32 +46,54 @@ if platform == "android":
     except ImportError:
         pass
 
-class MaterialItem(BoxLayout):
-    """Widget para mostrar un material en la lista de requerimientos."""
+class MaterialItem(RecycleDataViewBehavior, BoxLayout):
+    """Fila reciclable de la lista de requerimientos; sus botones actúan sobre material_id."""
+    material_id = NumericProperty(0)
     producto = StringProperty("")
     unidad = StringProperty("")
     cantidad = NumericProperty(0.0)
 
-    def __init__(self, producto="", unidad="", cantidad=0.0, **kwargs):
-        super(MaterialItem, self).__init__(**kwargs)
-        self.producto = producto
-        self.unidad = unidad
-        self.cantidad = cantidad
-
 class FormularioScreen(Screen):
     """Pantalla principal del formulario de requerimientos."""
     fecha_input = ObjectProperty(None)
     solicitante_input = ObjectProperty(None)
     orden_trabajo_input = ObjectProperty(None)
     cliente_input = ObjectProperty(None)
-    materiales_container = ObjectProperty(None)
+    materiales_rv = ObjectProperty(None)
 
     def __init__(self, **kwargs):
         super(FormularioScreen, self).__init__(**kwargs)
         self.materiales = []
-        self.materiales_lista = []
+        self._ids_materiales = count(1)
+
+        # Popups reutilizables: se construyen en el primer uso
+        self._popup_agregar = None
+        self._popup_editar = None
+        self._popup_eliminar = None
+        self._popup_mensaje = None
+        self._popup_carga = None
+
+        # Datos y Idempotency-Key del último envío sin confirmar
+        self._envio_pendiente = None
+        self._material_en_edicion = None
+        self._material_a_eliminar = None
         Clock.schedule_once(self.on_start)
 
+    @property
+    def materiales_lista(self):
+        """Materiales de la lista en el formato que espera el servidor."""
+        return [
+            {'producto': m['producto'], 'unidad': m['unidad'], 'cantidad': "{:.2f}".format(m['cantidad'])}
+            for m in self.materiales_rv.data
+        ]
+
+    def _posicion_material(self, material_id):
+        """Devuelve la posición del material con ese id, o None si ya no está en la lista."""
+        for posicion, material in enumerate(self.materiales_rv.data):
+            if material['material_id'] == material_id:
+                return posicion
+        return None
+
     def on_start(self, *args):
         """Inicializa la pantalla con la fecha actual."""
         # Establecer fecha actual
@@ -72,14 +105,19 @@ class FormularioScreen(Screen):
 
     def cargar_materiales(self):
         """Carga la lista de materiales desde el servidor."""
-        threading.Thread(target=self._cargar_materiales_thread).start()
+        cliente_http.en_segundo_plano(self._cargar_materiales_thread)
 
     def _cargar_materiales_thread(self):
         """Función para cargar materiales en un hilo separado."""
         try:
-            response = requests.get(f"{SERVER_URL}/api/logistica/materiales", timeout=10)
+            # Formato columnar (la sesión compartida ya acepta gzip) para reducir los datos descargados
+            response = cliente_http.get(
+                f"{SERVER_URL}/api/logistica/materiales",
+                params={"formato": "columnar", "campos": "material,unidad"},
+                timeout=10
+            )
             response.raise_for_status()
-            self.materiales = response.json()
+            self.materiales = decodificar_catalogo(response.json())
             logger.info(f"Materiales cargados: {len(self.materiales)}")
         except requests.exceptions.RequestException as e:
             logger.error(f"Error al cargar materiales: {e}")
@@ -89,13 +127,13 @@ class FormularioScreen(Screen):
                 "Puede continuar trabajando, pero la función de autocompletado no estará disponible."
             ))
 
-    def mostrar_popup_agregar_material(self):
-        """Muestra el popup para agregar un nuevo material."""
+    def _construir_popup_material(self, titulo, texto_boton, con_sugerencias):
+        """Construye el popup con los campos de un material (se crea una sola vez y se reutiliza)."""
         content = BoxLayout(orientation='vertical', spacing=10, padding=20)
 
         # Título
         title_label = Label(
-            text="Agregar Material",
+            text=titulo,
             font_size=dp(24),
             size_hint_y=None,
             height=dp(40)
@@ -110,7 +148,7 @@ class FormularioScreen(Screen):
         producto_input = TextInput(
             multiline=False,
             font_size=dp(18),
-            hint_text="Comience a tipear..."
+            hint_text="Comience a tipear..." if con_sugerencias else ""
         )
         form_layout.add_widget(producto_input)
 
@@ -135,12 +173,36 @@ class FormularioScreen(Screen):
 
         content.add_widget(form_layout)
 
-        # Sugerencias de productos
-        sugerencias_scroll = ScrollView(size_hint=(1, None), height=dp(200))
-        self.sugerencias_layout = GridLayout(cols=1, spacing=2, size_hint_y=None)
-        self.sugerencias_layout.bind(minimum_height=self.sugerencias_layout.setter('height'))
-        sugerencias_scroll.add_widget(self.sugerencias_layout)
-        content.add_widget(sugerencias_scroll)
+        popup = Popup(
+            title=titulo,
+            content=content,
+            size_hint=(0.9, 0.8),
+            auto_dismiss=False
+        )
+        popup.producto_input = producto_input
+        popup.unidad_input = unidad_input
+        popup.cantidad_input = cantidad_input
+
+        # Sugerencias de productos: un conjunto fijo de botones que se reutiliza en cada tecla
+        if con_sugerencias:
+            sugerencias_scroll = ScrollView(size_hint=(1, None), height=dp(200))
+            sugerencias_layout = GridLayout(cols=1, spacing=2, size_hint_y=None)
+            sugerencias_layout.bind(minimum_height=sugerencias_layout.setter('height'))
+            sugerencias_scroll.add_widget(sugerencias_layout)
+            content.add_widget(sugerencias_scroll)
+
+            popup.sugerencias_layout = sugerencias_layout
+            popup.botones_sugerencia = []
+            for _ in range(MAX_SUGERENCIAS):
+                btn = Button(
+                    size_hint_y=None,
+                    height=dp(40),
+                    halign='left',
+                    valign='middle'
+                )
+                btn.material = None
+                btn.bind(on_release=self._seleccionar_sugerencia)
+                popup.botones_sugerencia.append(btn)
 
         # Botones
         buttons_layout = BoxLayout(size_hint_y=None, height=dp(50), spacing=10)
@@ -150,60 +212,67 @@ class FormularioScreen(Screen):
             size_hint_x=0.5
         )
 
-        agregar_btn = Button(
-            text="Agregar",
+        accion_btn = Button(
+            text=texto_boton,
             size_hint_x=0.5,
             background_color=(0, 0.7, 0, 1)
         )
 
         buttons_layout.add_widget(cancelar_btn)
-        buttons_layout.add_widget(agregar_btn)
+        buttons_layout.add_widget(accion_btn)
         content.add_widget(buttons_layout)
 
-        # Crear y mostrar el popup
-        popup = Popup(
-            title="Agregar Material",
-            content=content,
-            size_hint=(0.9, 0.8),
-            auto_dismiss=False
-        )
-
-        # Configurar eventos
         cancelar_btn.bind(on_release=popup.dismiss)
-        agregar_btn.bind(on_release=lambda x: self.agregar_material(
-            producto_input.text,
-            unidad_input.text,
-            cantidad_input.text,
-            popup
-        ))
+        popup.accion_btn = accion_btn
+        return popup
 
-        # Configurar autocompletado
-        producto_input.bind(text=lambda instance, value: self.actualizar_sugerencias(value, self.sugerencias_layout, producto_input, unidad_input))
+    def _rellenar_popup_material(self, popup, producto, unidad, cantidad):
+        """Restablece los campos del popup de material antes de abrirlo."""
+        popup.producto_input.text = producto
+        popup.unidad_input.text = unidad
+        popup.cantidad_input.text = cantidad
 
-        popup.open()
+    def mostrar_popup_agregar_material(self):
+        """Muestra el popup para agregar un nuevo material."""
+        if self._popup_agregar is None:
+            popup = self._construir_popup_material("Agregar Material", "Agregar", con_sugerencias=True)
+
+            # Configurar eventos
+            popup.accion_btn.bind(on_release=lambda x: self.agregar_material(
+                popup.producto_input.text,
+                popup.unidad_input.text,
+                popup.cantidad_input.text,
+                popup
+            ))
+
+            # Configurar autocompletado
+            popup.producto_input.bind(text=lambda instance, value: self.actualizar_sugerencias(value))
+            self._popup_agregar = popup
+
+        # Al vaciar el producto también se vacían las sugerencias
+        self._rellenar_popup_material(self._popup_agregar, "", "", "")
+        self._popup_agregar.open()
 
-    def actualizar_sugerencias(self, texto, sugerencias_layout, producto_input, unidad_input):
+    def actualizar_sugerencias(self, texto):
         """Actualiza la lista de sugerencias basadas en el texto ingresado."""
-        sugerencias_layout.clear_widgets()
+        popup = self._popup_agregar
+        popup.sugerencias_layout.clear_widgets()
 
         if not texto or len(texto) < 2:
             return
 
         texto = texto.upper()
-        sugerencias = [m for m in self.materiales if texto in m['material'].upper()]
+        sugerencias = islice((m for m in self.materiales if texto in m['material'].upper()), MAX_SUGERENCIAS)
 
-        for material in sugerencias[:10]:  # Limitar a 10 sugerencias
-            btn = Button(
-                text=material['material'],
-                size_hint_y=None,
-                height=dp(40),
-                halign='left',
-                valign='middle'
-            )
-            btn.bind(on_release=lambda btn, m=material: self.seleccionar_material(
-                m, producto_input, unidad_input
-            ))
-            sugerencias_layout.add_widget(btn)
+        for btn, material in zip(popup.botones_sugerencia, sugerencias):
+            btn.material = material
+            btn.text = material['material']
+            popup.sugerencias_layout.add_widget(btn)
+
+    def _seleccionar_sugerencia(self, btn):
+        """Aplica la sugerencia asociada al botón pulsado."""
+        popup = self._popup_agregar
+        self.seleccionar_material(btn.material, popup.producto_input, popup.unidad_input)
 
     def seleccionar_material(self, material, producto_input, unidad_input):
         """Selecciona un material de la lista de sugerencias."""
@@ -226,145 +295,50 @@ class FormularioScreen(Screen):
                 self.mostrar_error("Error", "La cantidad debe ser mayor a cero")
                 return
 
-            # Formatear cantidad a 2 decimales
-            cantidad_formateada = "{:.2f}".format(cantidad_float)
-
-            # Agregar a la lista
-            self.materiales_lista.append({
+            # Agregar a la lista (la RecycleView solo agrega la fila nueva)
+            self.materiales_rv.data.append({
+                'material_id': next(self._ids_materiales),
                 'producto': producto,
                 'unidad': unidad,
-                'cantidad': cantidad_formateada
+                'cantidad': round(cantidad_float, 2)
             })
 
-            # Actualizar la UI
-            self.actualizar_lista_materiales()
-
             # Cerrar popup
             popup.dismiss()
 
         except ValueError:
             self.mostrar_error("Error", "La cantidad debe ser un número válido")
 
-    def actualizar_lista_materiales(self):
-        """Actualiza la lista de materiales en la UI."""
-        if self.materiales_container:
-            self.materiales_container.clear_widgets()
-
-            for i, material in enumerate(self.materiales_lista):
-                item = MaterialItem(
-                    producto=material['producto'],
-                    unidad=material['unidad'],
-                    cantidad=float(material['cantidad'])
-                )
-
-                # Agregar botones de editar y eliminar
-                editar_btn = Button(
-                    text="Editar",
-                    size_hint=(None, None),
-                    size=(dp(80), dp(40))
-                )
-                editar_btn.bind(on_release=partial(self.editar_material, i))
-
-                eliminar_btn = Button(
-                    text="Eliminar",
-                    size_hint=(None, None),
-                    size=(dp(80), dp(40)),
-                    background_color=(0.8, 0, 0, 1)
-                )
-                eliminar_btn.bind(on_release=partial(self.eliminar_material, i))
-
-                item.add_widget(editar_btn)
-                item.add_widget(eliminar_btn)
-
-                self.materiales_container.add_widget(item)
-
-    def editar_material(self, indice, *args):
+    def editar_material(self, material_id, *args):
         """Muestra el popup para editar un material existente."""
-        material = self.materiales_lista[indice]
-
-        content = BoxLayout(orientation='vertical', spacing=10, padding=20)
-
-        # Título
-        title_label = Label(
-            text="Editar Material",
-            font_size=dp(24),
-            size_hint_y=None,
-            height=dp(40)
-        )
-        content.add_widget(title_label)
-
-        # Campos del formulario
-        form_layout = GridLayout(cols=2, spacing=10, size_hint_y=None, height=dp(180))
-
-        # Producto
-        form_layout.add_widget(Label(text="Producto:", font_size=dp(18)))
-        producto_input = TextInput(
-            multiline=False,
-            font_size=dp(18),
-            text=material['producto']
-        )
-        form_layout.add_widget(producto_input)
-
-        # Unidad
-        form_layout.add_widget(Label(text="Unidad:", font_size=dp(18)))
-        unidad_input = TextInput(
-            multiline=False,
-            font_size=dp(18),
-            text=material['unidad']
-        )
-        form_layout.add_widget(unidad_input)
-
-        # Cantidad
-        form_layout.add_widget(Label(text="Cantidad:", font_size=dp(18)))
-        cantidad_input = TextInput(
-            multiline=False,
-            font_size=dp(18),
-            input_filter='float',
-            text=material['cantidad']
-        )
-        form_layout.add_widget(cantidad_input)
-
-        content.add_widget(form_layout)
-
-        # Botones
-        buttons_layout = BoxLayout(size_hint_y=None, height=dp(50), spacing=10)
-
-        cancelar_btn = Button(
-            text="Cancelar",
-            size_hint_x=0.5
-        )
-
-        guardar_btn = Button(
-            text="Guardar",
-            size_hint_x=0.5,
-            background_color=(0, 0.7, 0, 1)
-        )
-
-        buttons_layout.add_widget(cancelar_btn)
-        buttons_layout.add_widget(guardar_btn)
-        content.add_widget(buttons_layout)
-
-        # Crear y mostrar el popup
-        popup = Popup(
-            title="Editar Material",
-            content=content,
-            size_hint=(0.9, 0.8),
-            auto_dismiss=False
+        posicion = self._posicion_material(material_id)
+        if posicion is None:
+            return
+        material = self.materiales_rv.data[posicion]
+
+        if self._popup_editar is None:
+            popup = self._construir_popup_material("Editar Material", "Guardar", con_sugerencias=False)
+
+            # Configurar eventos: el material a editar se lee al pulsar, no al construir
+            popup.accion_btn.bind(on_release=lambda x: self.guardar_edicion_material(
+                self._material_en_edicion,
+                popup.producto_input.text,
+                popup.unidad_input.text,
+                popup.cantidad_input.text,
+                popup
+            ))
+            self._popup_editar = popup
+
+        self._material_en_edicion = material_id
+        self._rellenar_popup_material(
+            self._popup_editar,
+            material['producto'],
+            material['unidad'],
+            "{:.2f}".format(material['cantidad'])
         )
+        self._popup_editar.open()
 
-        # Configurar eventos
-        cancelar_btn.bind(on_release=popup.dismiss)
-        guardar_btn.bind(on_release=lambda x: self.guardar_edicion_material(
-            indice,
-            producto_input.text,
-            unidad_input.text,
-            cantidad_input.text,
-            popup
-        ))
-
-        popup.open()
-
-    def guardar_edicion_material(self, indice, producto, unidad, cantidad, popup):
+    def guardar_edicion_material(self, material_id, producto, unidad, cantidad, popup):
         """Guarda los cambios de un material editado."""
         if not producto:
             self.mostrar_error("Error", "Debe ingresar un producto")
@@ -380,18 +354,15 @@ class FormularioScreen(Screen):
                 self.mostrar_error("Error", "La cantidad debe ser mayor a cero")
                 return
 
-            # Formatear cantidad a 2 decimales
-            cantidad_formateada = "{:.2f}".format(cantidad_float)
-
-            # Actualizar en la lista
-            self.materiales_lista[indice] = {
-                'producto': producto,
-                'unidad': unidad,
-                'cantidad': cantidad_formateada
-            }
-
-            # Actualizar la UI
-            self.actualizar_lista_materiales()
+            # Actualizar en la lista (la RecycleView solo refresca esa fila)
+            posicion = self._posicion_material(material_id)
+            if posicion is not None:
+                self.materiales_rv.data[posicion] = {
+                    'material_id': material_id,
+                    'producto': producto,
+                    'unidad': unidad,
+                    'cantidad': round(cantidad_float, 2)
+                }
 
             # Cerrar popup
             popup.dismiss()
@@ -399,56 +370,59 @@ class FormularioScreen(Screen):
         except ValueError:
             self.mostrar_error("Error", "La cantidad debe ser un número válido")
 
-    def eliminar_material(self, indice, *args):
+    def eliminar_material(self, material_id, *args):
         """Elimina un material de la lista."""
-        content = BoxLayout(orientation='vertical', spacing=10, padding=20)
+        if self._popup_eliminar is None:
+            content = BoxLayout(orientation='vertical', spacing=10, padding=20)
 
-        # Mensaje
-        msg_label = Label(
-            text="¿Está seguro que desea eliminar este material?",
-            font_size=dp(18)
-        )
-        content.add_widget(msg_label)
+            # Mensaje
+            msg_label = Label(
+                text="¿Está seguro que desea eliminar este material?",
+                font_size=dp(18)
+            )
+            content.add_widget(msg_label)
 
-        # Botones
-        buttons_layout = BoxLayout(size_hint_y=None, height=dp(50), spacing=10)
+            # Botones
+            buttons_layout = BoxLayout(size_hint_y=None, height=dp(50), spacing=10)
 
-        cancelar_btn = Button(
-            text="Cancelar",
-            size_hint_x=0.5
-        )
+            cancelar_btn = Button(
+                text="Cancelar",
+                size_hint_x=0.5
+            )
 
-        confirmar_btn = Button(
-            text="Eliminar",
-            size_hint_x=0.5,
-            background_color=(0.8, 0, 0, 1)
-        )
+            confirmar_btn = Button(
+                text="Eliminar",
+                size_hint_x=0.5,
+                background_color=(0.8, 0, 0, 1)
+            )
 
-        buttons_layout.add_widget(cancelar_btn)
-        buttons_layout.add_widget(confirmar_btn)
-        content.add_widget(buttons_layout)
+            buttons_layout.add_widget(cancelar_btn)
+            buttons_layout.add_widget(confirmar_btn)
+            content.add_widget(buttons_layout)
 
-        # Crear y mostrar el popup
-        popup = Popup(
-            title="Confirmar eliminación",
-            content=content,
-            size_hint=(0.8, 0.4),
-            auto_dismiss=False
-        )
+            popup = Popup(
+                title="Confirmar eliminación",
+                content=content,
+                size_hint=(0.8, 0.4),
+                auto_dismiss=False
+            )
 
-        # Configurar eventos
-        cancelar_btn.bind(on_release=popup.dismiss)
-        confirmar_btn.bind(on_release=lambda x: self.confirmar_eliminar_material(indice, popup))
+            # Configurar eventos
+            cancelar_btn.bind(on_release=popup.dismiss)
+            confirmar_btn.bind(on_release=lambda x: self.confirmar_eliminar_material(
+                self._material_a_eliminar, popup
+            ))
+            self._popup_eliminar = popup
 
-        popup.open()
+        self._material_a_eliminar = material_id
+        self._popup_eliminar.open()
 
-    def confirmar_eliminar_material(self, indice, popup):
+    def confirmar_eliminar_material(self, material_id, popup):
         """Confirma la eliminación de un material."""
-        # Eliminar de la lista
-        del self.materiales_lista[indice]
-
-        # Actualizar la UI
-        self.actualizar_lista_materiales()
+        # Eliminar de la lista por id: si ya se eliminó, no se borra otra fila
+        posicion = self._posicion_material(material_id)
+        if posicion is not None:
+            del self.materiales_rv.data[posicion]
 
         # Cerrar popup
         popup.dismiss()
@@ -472,7 +446,7 @@ class FormularioScreen(Screen):
             self.mostrar_error("Error", "Debe ingresar el nombre del cliente")
             return
 
-        if not self.materiales_lista:
+        if not self.materiales_rv.data:
             self.mostrar_error("Error", "Debe agregar al menos un material")
             return
 
@@ -486,29 +460,38 @@ class FormularioScreen(Screen):
         }
 
         # Mostrar popup de carga
-        content = BoxLayout(orientation='vertical', spacing=10, padding=20)
-        msg_label = Label(
-            text="Enviando requerimientos al servidor...",
-            font_size=dp(18)
-        )
-        content.add_widget(msg_label)
+        if self._popup_carga is None:
+            content = BoxLayout(orientation='vertical', spacing=10, padding=20)
+            msg_label = Label(
+                text="Enviando requerimientos al servidor...",
+                font_size=dp(18)
+            )
+            content.add_widget(msg_label)
 
-        popup = Popup(
-            title="Enviando datos",
-            content=content,
-            size_hint=(0.8, 0.4),
-            auto_dismiss=False
-        )
+            self._popup_carga = Popup(
+                title="Enviando datos",
+                content=content,
+                size_hint=(0.8, 0.4),
+                auto_dismiss=False
+            )
+        popup = self._popup_carga
         popup.open()
 
-        # Enviar datos en un hilo separado
-        threading.Thread(target=self._enviar_requerimientos_thread, args=(datos, popup)).start()
+        # Si se reintenta el mismo envío (p. ej. tras un error de conexión) se reutiliza su clave
+        if self._envio_pendiente is None or self._envio_pendiente[0] != datos:
+            self._envio_pendiente = (datos, cliente_http.nueva_clave_idempotencia())
+        clave = self._envio_pendiente[1]
+
+        # Enviar datos en segundo plano
+        cliente_http.en_segundo_plano(self._enviar_requerimientos_thread, datos, clave, popup)
 
-    def _enviar_requerimientos_thread(self, datos, popup):
+    def _enviar_requerimientos_thread(self, datos, clave, popup):
         """Función para enviar requerimientos en un hilo separado."""
         try:
-            response = requests.post(
+            # La misma clave en cada reintento: el servidor no duplica un envío ya procesado
+            response = cliente_http.post_idempotente(
                 f"{SERVER_URL}/api/logistica/enviar-requerimientos",
+                clave=clave,
                 json=datos,
                 timeout=30
             )
@@ -551,69 +534,62 @@ class FormularioScreen(Screen):
         self.cliente_input.text = ""
 
         # Limpiar lista de materiales
-        self.materiales_lista = []
-        self.actualizar_lista_materiales()
+        self.materiales_rv.data = []
+        self._envio_pendiente = None
 
-    def mostrar_error(self, titulo, mensaje):
-        """Muestra un popup de error."""
-        content = BoxLayout(orientation='vertical', spacing=10, padding=20)
+    def _mostrar_mensaje(self, titulo, mensaje, color_boton):
+        """Muestra el popup de mensajes, que se construye una sola vez y se reutiliza."""
+        if self._popup_mensaje is None:
+            content = BoxLayout(orientation='vertical', spacing=10, padding=20)
 
-        msg_label = Label(
-            text=mensaje,
-            font_size=dp(18)
-        )
-        content.add_widget(msg_label)
-
-        btn = Button(
-            text="Aceptar",
-            size_hint=(None, None),
-            size=(dp(150), dp(50)),
-            pos_hint={'center_x': 0.5}
-        )
-        content.add_widget(btn)
+            msg_label = Label(
+                font_size=dp(18)
+            )
+            content.add_widget(msg_label)
 
-        popup = Popup(
-            title=titulo,
-            content=content,
-            size_hint=(0.8, 0.4),
-            auto_dismiss=False
-        )
+            btn = Button(
+                text="Aceptar",
+                size_hint=(None, None),
+                size=(dp(150), dp(50)),
+                pos_hint={'center_x': 0.5}
+            )
+            content.add_widget(btn)
 
-        btn.bind(on_release=popup.dismiss)
-        popup.open()
+            popup = Popup(
+                content=content,
+                size_hint=(0.8, 0.4),
+                auto_dismiss=False
+            )
 
-    def mostrar_exito(self, titulo, mensaje):
-        """Muestra un popup de éxito."""
-        content = BoxLayout(orientation='vertical', spacing=10, padding=20)
+            btn.bind(on_release=popup.dismiss)
+            popup.msg_label = msg_label
+            popup.aceptar_btn = btn
+            self._popup_mensaje = popup
 
-        msg_label = Label(
-            text=mensaje,
-            font_size=dp(18)
-        )
-        content.add_widget(msg_label)
+        popup = self._popup_mensaje
+        popup.title = titulo
+        popup.msg_label.text = mensaje
+        popup.aceptar_btn.background_color = color_boton
 
-        btn = Button(
-            text="Aceptar",
-            size_hint=(None, None),
-            size=(dp(150), dp(50)),
-            pos_hint={'center_x': 0.5},
-            background_color=(0, 0.7, 0, 1)
-        )
-        content.add_widget(btn)
+        # Si ya está abierto (dos mensajes seguidos) solo se actualiza el texto
+        if popup.parent is None:
+            popup.open()
 
-        popup = Popup(
-            title=titulo,
-            content=content,
-            size_hint=(0.8, 0.4),
-            auto_dismiss=False
-        )
+    def mostrar_error(self, titulo, mensaje):
+        """Muestra un popup de error."""
+        self._mostrar_mensaje(titulo, mensaje, (1, 1, 1, 1))
 
-        btn.bind(on_release=popup.dismiss)
-        popup.open()
+    def mostrar_exito(self, titulo, mensaje):
+        """Muestra un popup de éxito."""
+        self._mostrar_mensaje(titulo, mensaje, (0, 0.7, 0, 1))
 
 class FormularioApp(App):
     def build(self):
         return FormularioScreen()
 
+    def on_stop(self):
+        """Libera las conexiones y los hilos del cliente HTTP al cerrar la app."""
+        cliente_http.cerrar()
+
 if __name__ == '__main__':
     FormularioApp().run()
@@ -0,0 +1,164 @@
+# sya_cliente_http.py
+"""Capa HTTP compartida por la app de logística (Kivy) y la app de escritorio (Tkinter)."""
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Configuración del cliente
+TIEMPO_ESPERA = 10  # Segundos por defecto para cada solicitud
+CONEXIONES_POR_HOST = 8
+HILOS_MAXIMOS = 4
+REINTENTOS = 3
+FACTOR_ESPERA = 0.5  # Espera entre reintentos: 0.5 s, 1 s, 2 s...
+EVENTOS_TIEMPO_LECTURA = 45  # El servidor envía un latido cada 15 s
+EVENTOS_ESPERA_RECONEXION = 5
+
+_sesion = None
+_ejecutor = None
+_lock = threading.Lock()
+
+
+def crear_sesion():
+    """Crea una sesión con pool de conexiones persistentes y reintentos en métodos idempotentes."""
+    reintentos = Retry(
+        total=REINTENTOS,
+        connect=REINTENTOS,
+        read=REINTENTOS,
+        status=REINTENTOS,
+        backoff_factor=FACTOR_ESPERA,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=CONEXIONES_POR_HOST, max_retries=reintentos)
+    sesion = requests.Session()
+    sesion.mount("http://", adaptador)
+    sesion.mount("https://", adaptador)
+    sesion.headers["Accept-Encoding"] = "gzip, deflate"
+    return sesion
+
+
+def obtener_sesion():
+    """Devuelve la sesión compartida, creándola en el primer uso."""
+    global _sesion
+    with _lock:
+        if _sesion is None:
+            _sesion = crear_sesion()
+        return _sesion
+
+
+def obtener_ejecutor():
+    """Devuelve el pool de hilos compartido para las llamadas en segundo plano."""
+    global _ejecutor
+    with _lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=HILOS_MAXIMOS, thread_name_prefix="sya-http")
+        return _ejecutor
+
+
+def en_segundo_plano(funcion, *args, **kwargs):
+    """Ejecuta una función en el pool de hilos y devuelve su Future."""
+    return obtener_ejecutor().submit(funcion, *args, **kwargs)
+
+
+def get(url, **kwargs):
+    """GET con la sesión compartida (se reintenta ante fallos de red y 429/502/503/504)."""
+    kwargs.setdefault("timeout", TIEMPO_ESPERA)
+    return obtener_sesion().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    """POST con la sesión compartida (no se reintenta: no es idempotente)."""
+    kwargs.setdefault("timeout", TIEMPO_ESPERA)
+    return obtener_sesion().post(url, **kwargs)
+
+
+def escuchar_eventos(url, al_recibir, detener):
+    """Lee un flujo Server-Sent Events hasta que se active detener, reconectando con Last-Event-ID.
+
+    al_recibir(tipo, datos) se llama desde el hilo lector con los datos ya decodificados de JSON.
+    Pensada para ejecutarse en un hilo propio: la conexión queda abierta mientras dure la escucha.
+    """
+    ultimo_id = None
+    while not detener.is_set():
+        try:
+            headers = {"Accept": "text/event-stream"}
+            if ultimo_id:
+                headers["Last-Event-ID"] = ultimo_id
+            with obtener_sesion().get(url, headers=headers, stream=True,
+                                      timeout=(TIEMPO_ESPERA, EVENTOS_TIEMPO_LECTURA)) as response:
+                response.raise_for_status()
+                response.encoding = "utf-8"
+                tipo, datos, id_evento = "message", [], None
+                # chunk_size=1: cada evento se entrega apenas llega, sin esperar a llenar un bloque
+                for linea in response.iter_lines(chunk_size=1, decode_unicode=True):
+                    if detener.is_set():
+                        return
+                    if linea:
+                        campo, _, valor = linea.partition(":")
+                        valor = valor[1:] if valor.startswith(" ") else valor
+                        if campo == "event":
+                            tipo = valor
+                        elif campo == "data":
+                            datos.append(valor)
+                        elif campo == "id":
+                            id_evento = valor
+                        continue
+                    # Línea vacía: fin del evento (los latidos son comentarios y no traen datos)
+                    if datos:
+                        ultimo_id = id_evento or ultimo_id
+                        al_recibir(tipo, json.loads("\n".join(datos)))
+                    tipo, datos, id_evento = "message", [], None
+        except (requests.RequestException, ValueError):
+            pass
+        detener.wait(EVENTOS_ESPERA_RECONEXION)
+
+
+def nueva_clave_idempotencia():
+    """Genera una clave Idempotency-Key para un envío (la misma en todos sus reintentos)."""
+    return uuid.uuid4().hex
+
+
+def post_idempotente(url, clave=None, **kwargs):
+    """POST con Idempotency-Key que se reintenta ante fallos de red, 409 (en curso), 429 y 502/503/504.
+
+    El servidor devuelve la respuesta original si el envío ya se procesó, así que reintentar
+    no duplica datos. Las subidas de archivos deben poder releerse (se rebobinan en cada intento).
+    """
+    kwargs.setdefault("timeout", TIEMPO_ESPERA)
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers["Idempotency-Key"] = clave or nueva_clave_idempotencia()
+    for intento in range(REINTENTOS + 1):
+        for archivo in (kwargs.get("files") or {}).values():
+            contenido = archivo[1] if isinstance(archivo, tuple) else archivo
+            if hasattr(contenido, "seek"):
+                contenido.seek(0)
+        try:
+            response = obtener_sesion().post(url, headers=headers, **kwargs)
+            if response.status_code not in (409, 429, 502, 503, 504) or intento == REINTENTOS:
+                return response
+            espera = float(response.headers.get("Retry-After") or FACTOR_ESPERA * (2 ** intento))
+        except (requests.ConnectionError, requests.Timeout):
+            if intento == REINTENTOS:
+                raise
+            espera = FACTOR_ESPERA * (2 ** intento)
+        time.sleep(espera)
+
+
+def cerrar():
+    """Cierra las conexiones y el pool de hilos (al salir de la aplicación)."""
+    global _sesion, _ejecutor
+    with _lock:
+        if _ejecutor is not None:
+            _ejecutor.shutdown(wait=False)
+            _ejecutor = None
+        if _sesion is not None:
+            _sesion.close()
+            _sesion = None
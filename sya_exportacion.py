@@ -0,0 +1,284 @@
+# sya_exportacion.py
+"""Exportación de libros Excel por flujo: el .xlsx se entrega por partes a medida que se arma.
+
+Las hojas se escriben como XML directamente dentro del zip, sin pasar por un libro de
+openpyxl ni por un archivo temporal del libro completo. En paralelo, el XML de cada hoja se
+genera antes en un proceso aparte y el proceso principal solo arma el zip, así que un libro
+con varias hojas tarda aproximadamente lo que su hoja más grande. No depende de Flask ni
+del servidor.
+
+Los trabajadores forman un pool que se crea en el primer uso y vive hasta que termina el
+proceso. Se inician con spawn y no con fork, porque el servidor tiene hilos y un hijo creado
+con fork heredaría los locks que otro hilo tuviera tomados.
+"""
+import atexit
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from xml.sax.saxutils import escape, quoteattr
+
+PROCESOS_MAXIMOS = int(os.environ.get("SYA_EXPORTACION_PROCESOS", str(min(5, os.cpu_count() or 1))))
+HOJAS_MINIMAS = 2  # Con una sola hoja no hay nada que repartir entre procesos
+BLOQUE_SALIDA = 256 * 1024  # Bytes del libro que se acumulan antes de entregarlos a la respuesta
+
+# Estilos de celda definidos en styles.xml (mismos formatos que usa openpyxl al escribir)
+ESTILO_FECHA_HORA = 1
+ESTILO_FECHA = 2
+ESTILO_HORA = 3
+ESTILO_DURACION = 4
+
+# Caracteres de control que XML no admite
+CARACTERES_ILEGALES = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+NS_HOJA = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_RELACIONES = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PAQUETE = "http://schemas.openxmlformats.org/package/2006/relationships"
+TIPO_HOJA = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+_ejecutor = None
+_lock = threading.Lock()
+
+
+def disponible():
+    """Indica si se puede exportar en paralelo (hace falta más de un proceso)."""
+    return PROCESOS_MAXIMOS > 1
+
+
+def obtener_ejecutor():
+    """Devuelve el pool de procesos compartido; lo crea en el primer uso y lo cierra al salir."""
+    global _ejecutor
+    with _lock:
+        if _ejecutor is None:
+            _ejecutor = ProcessPoolExecutor(max_workers=PROCESOS_MAXIMOS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _ejecutor
+
+
+def reiniciar_ejecutor():
+    """Descarta el pool (p. ej. si un trabajador murió); el siguiente uso crea uno nuevo."""
+    global _ejecutor
+    with _lock:
+        if _ejecutor is not None:
+            _ejecutor.shutdown(wait=False, cancel_futures=True)
+            _ejecutor = None
+
+
+atexit.register(reiniciar_ejecutor)
+
+
+def celda_xml(referencia, valor):
+    """Serializa una celda; los textos van como inlineStr para no necesitar sharedStrings."""
+    if valor is None:
+        return ""
+    if isinstance(valor, str):
+        texto = CARACTERES_ILEGALES.sub("", valor)
+        if texto.startswith("=") and len(texto) > 1:
+            # Igual que openpyxl: un texto que empieza con "=" es una fórmula
+            return f'<c r="{referencia}"><f>{escape(texto[1:])}</f></c>'
+        return f'<c r="{referencia}" t="inlineStr"><is><t xml:space="preserve">{escape(texto)}</t></is></c>'
+    if isinstance(valor, bool):
+        return f'<c r="{referencia}" t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)) and not (isinstance(valor, float) and not math.isfinite(valor)):
+        return f'<c r="{referencia}"><v>{valor!r}</v></c>'
+    from openpyxl.utils.datetime import to_excel
+    if isinstance(valor, datetime):
+        return f'<c r="{referencia}" s="{ESTILO_FECHA_HORA}"><v>{to_excel(valor)!r}</v></c>'
+    if isinstance(valor, date):
+        return f'<c r="{referencia}" s="{ESTILO_FECHA}"><v>{to_excel(valor)!r}</v></c>'
+    if isinstance(valor, time):
+        return f'<c r="{referencia}" s="{ESTILO_HORA}"><v>{to_excel(valor)!r}</v></c>'
+    if isinstance(valor, timedelta):
+        return f'<c r="{referencia}" s="{ESTILO_DURACION}"><v>{to_excel(valor)!r}</v></c>'
+    return celda_xml(referencia, str(valor))
+
+
+def xml_hoja(titulo, cabecera, particiones, completar_fila=None):
+    """Genera, por partes, el XML de una hoja con la cabecera y las filas de todas las particiones.
+
+    particiones es la lista de (periodo, ruta) en orden cronológico. completar_fila, si se
+    indica, recibe (periodo, hoja, número de fila, valores) y devuelve los valores a escribir
+    o None para omitir la fila.
+    """
+    from openpyxl.utils import get_column_letter
+    letras = []
+
+    def fila_xml(numero_fila, fila):
+        while len(letras) < len(fila):
+            letras.append(get_column_letter(len(letras) + 1))
+        celdas = "".join(celda_xml(f"{letras[i]}{numero_fila}", valor) for i, valor in enumerate(fila))
+        return f'<row r="{numero_fila}">{celdas}</row>'
+
+    yield (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+           f'<worksheet xmlns="{NS_HOJA}"><sheetData>' + fila_xml(1, cabecera))
+    numero_fila = 1
+    for periodo, ruta in particiones:
+        for numero_origen, fila in enumerate(_filas_de(ruta, titulo), 2):
+            fila = list(fila)
+            if completar_fila:
+                fila = completar_fila(periodo, titulo, numero_origen, fila)
+                if fila is None:
+                    continue
+            numero_fila += 1
+            yield fila_xml(numero_fila, fila)
+    yield "</sheetData></worksheet>"
+
+
+def renderizar_hoja(titulo, cabecera, particiones, ruta_xml):
+    """Escribe en ruta_xml el XML de una hoja. Se ejecuta en un proceso trabajador del pool."""
+    with open(ruta_xml, "w", encoding="utf-8") as f:
+        for parte in xml_hoja(titulo, cabecera, particiones):
+            f.write(parte)
+
+
+def _filas_de(ruta, titulo):
+    """Recorre las filas de datos (sin la cabecera) de una hoja de una partición."""
+    import openpyxl
+    wb = openpyxl.load_workbook(ruta, read_only=True)
+    try:
+        if titulo in wb.sheetnames:
+            yield from wb[titulo].iter_rows(min_row=2, values_only=True)
+    finally:
+        wb.close()
+
+
+class _Tuberia:
+    """Destino de ZipFile que guarda lo escrito hasta que el generador lo entrega."""
+    def __init__(self):
+        self._bloques = []
+        self.pendientes = 0
+
+    def write(self, datos):
+        self._bloques.append(bytes(datos))
+        self.pendientes += len(datos)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self._bloques)
+        self._bloques.clear()
+        self.pendientes = 0
+        return datos
+
+
+def exportar_libro(cabeceras, particiones, completar_fila=None, paralelo=False):
+    """Devuelve un generador con los bytes del libro (.xlsx), producidos a medida que se arman.
+
+    cabeceras es {título: fila de cabecera} en el orden de las hojas y particiones la lista
+    de (periodo, ruta) de los libros de origen, en orden cronológico. Con paralelo, cada hoja
+    se genera antes en un proceso del pool; un fallo se propaga aquí, antes de enviar nada.
+    """
+    titulos = list(cabeceras)
+    directorio = None
+    rutas_xml = None
+    if paralelo:
+        directorio = tempfile.mkdtemp(prefix="sya_exportacion_")
+        try:
+            ejecutor = obtener_ejecutor()
+            rutas_xml = [os.path.join(directorio, f"sheet{numero}.xml") for numero in range(1, len(titulos) + 1)]
+            futuros = [ejecutor.submit(renderizar_hoja, titulo, list(cabeceras[titulo]), list(particiones), ruta_xml)
+                       for titulo, ruta_xml in zip(titulos, rutas_xml)]
+            for futuro in futuros:
+                futuro.result()
+        except Exception:
+            shutil.rmtree(directorio, ignore_errors=True)
+            raise
+    flujo = _generar_zip(cabeceras, particiones, completar_fila, rutas_xml, directorio)
+    # Se avanza hasta el primer yield para que close() borre los temporales aunque no se recorra
+    next(flujo)
+    return flujo
+
+
+def _generar_zip(cabeceras, particiones, completar_fila, rutas_xml, directorio):
+    titulos = list(cabeceras)
+    tuberia = _Tuberia()
+    try:
+        yield b""
+        with zipfile.ZipFile(tuberia, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("[Content_Types].xml", _tipos_contenido(len(titulos)))
+            zf.writestr("_rels/.rels",
+                        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                        f'<Relationships xmlns="{NS_PAQUETE}">'
+                        f'<Relationship Id="rId1" Type="{NS_RELACIONES}/officeDocument" Target="xl/workbook.xml"/>'
+                        f'</Relationships>')
+            zf.writestr("xl/workbook.xml", _libro(titulos))
+            zf.writestr("xl/_rels/workbook.xml.rels", _relaciones_libro(len(titulos)))
+            zf.writestr("xl/styles.xml", _estilos())
+            for numero, titulo in enumerate(titulos, 1):
+                with zf.open(f"xl/worksheets/sheet{numero}.xml", "w", force_zip64=True) as destino:
+                    if rutas_xml:
+                        with open(rutas_xml[numero - 1], "rb") as origen:
+                            partes = iter(lambda: origen.read(BLOQUE_SALIDA), b"")
+                            for parte in partes:
+                                destino.write(parte)
+                                if tuberia.pendientes:
+                                    yield tuberia.vaciar()
+                    else:
+                        for parte in xml_hoja(titulo, list(cabeceras[titulo]), particiones, completar_fila):
+                            destino.write(parte.encode("utf-8"))
+                            if tuberia.pendientes >= BLOQUE_SALIDA:
+                                yield tuberia.vaciar()
+        yield tuberia.vaciar()
+    finally:
+        if directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+
+def _tipos_contenido(num_hojas):
+    hojas = "".join(f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="{TIPO_HOJA}"/>'
+                    for n in range(1, num_hojas + 1))
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{hojas}</Types>')
+
+
+def _libro(titulos):
+    hojas = "".join(f'<sheet name={quoteattr(titulo)} sheetId="{n}" r:id="rId{n}"/>'
+                    for n, titulo in enumerate(titulos, 1))
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<workbook xmlns="{NS_HOJA}" xmlns:r="{NS_RELACIONES}"><sheets>{hojas}</sheets></workbook>')
+
+
+def _relaciones_libro(num_hojas):
+    hojas = "".join(f'<Relationship Id="rId{n}" Type="{NS_RELACIONES}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                    for n in range(1, num_hojas + 1))
+    estilos = f'<Relationship Id="rId{num_hojas + 1}" Type="{NS_RELACIONES}/styles" Target="styles.xml"/>'
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<Relationships xmlns="{NS_PAQUETE}">{hojas}{estilos}</Relationships>')
+
+
+def _estilos():
+    # Formatos en el mismo orden que los ESTILO_*: 164 fecha y hora, 165 fecha, 166 hora, 167 duración
+    formatos = ["yyyy-mm-dd h:mm:ss", "yyyy-mm-dd", "h:mm:ss", "[hh]:mm:ss"]
+    num_fmts = "".join(f'<numFmt numFmtId="{164 + i}" formatCode="{codigo}"/>' for i, codigo in enumerate(formatos))
+    xfs = "".join(f'<xf numFmtId="{164 + i}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+                  for i in range(len(formatos)))
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<styleSheet xmlns="{NS_HOJA}">'
+            f'<numFmts count="{len(formatos)}">{num_fmts}</numFmts>'
+            '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+            '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+            '<fill><patternFill patternType="gray125"/></fill></fills>'
+            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            f'<cellXfs count="{len(formatos) + 1}"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+            f'{xfs}</cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+            '</styleSheet>')
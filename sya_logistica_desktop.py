@@ -1,12 +1,16 @@
+import json
 import os
+import queue
 import subprocess
 import sys
+import threading
 import tkinter as tk
 from datetime import datetime
 from tkinter import messagebox, ttk
 import pandas as pd
 import requests
 import openpyxl
+import sya_cliente_http as cliente_http
 from openpyxl.utils import get_column_letter
 
 # Configuración DPI para Windows
@@ -33,6 +37,24 @@ except ImportError:
 API_BASE_URL = "http://34.67.103.132:5000/api/logistica"
 REQUERIMIENTOS_FILENAME = "sya_logistica_requerimientos.xlsx"
 BDD_FILENAME = "logistica_materiales.csv"
+VERSION_FILENAME = "sya_logistica_requerimientos.version.json"
+# Rango del libro descargado: desde el mes de la línea más antigua con saldo pendiente
+RANGO_REQUERIMIENTOS = {"desde": "pendientes"}
+
+# Actualización automática de requerimientos
+AUTO_SYNC_INTERVALO_MS = 60000  # Cada cuánto se consulta la versión en el servidor
+AUTO_SYNC_REVISION_MS = 500  # Cada cuánto se revisa si terminó la sincronización o llegó un evento
+EVENTOS_URL = API_BASE_URL.rsplit("/", 1)[0] + "/eventos"
+EVENTOS_QUE_SINCRONIZAN = ("logistica", "reinicio")
+AVISO_DURACION_MS = 5000
+
+# Visor de requerimientos
+COLUMNAS_INDEXADAS = ("Fecha", "Solicitante", "Orden de Trabajo", "Cliente")
+FORMATOS_FECHA = ("%d/%m/%Y", "%Y/%m/%d", "%Y-%m-%d")
+VISOR_FILAS_POR_LOTE = 2000  # Filas que entrega el hilo lector en cada lote
+VISOR_ALTO_FILA = 22  # Píxeles por fila del Treeview
+VISOR_ALTO_ENCABEZADO = 26  # Píxeles aproximados de la fila de cabeceras
+VISOR_ESPERA_FILTRO_MS = 250
 
 
 # Clase para manejar utilidades de rutas y archivos
@@ -88,19 +110,31 @@ class FileUtils:
 # Clase para manejar operaciones con el servidor
 class APIClient:
     @staticmethod
-    def descargar_archivo(url, ruta_destino, status_callback=None):
-        """Descarga un archivo desde una URL y lo guarda en la ruta especificada."""
+    def guardar_descarga(url, ruta_destino, params=None):
+        """Descarga una URL a un archivo (reemplazándolo al terminar) y devuelve las cabeceras de la respuesta."""
+        response = cliente_http.get(url, params=params, stream=True, timeout=30)
+        response.raise_for_status()
+
+        ruta_tmp = ruta_destino + ".tmp"
+        with open(ruta_tmp, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                f.write(chunk)
+        os.replace(ruta_tmp, ruta_destino)
+        return response.headers
+
+    @staticmethod
+    def descargar_archivo(url, ruta_destino, status_callback=None, cabeceras=None, params=None):
+        """Descarga un archivo desde una URL y lo guarda en la ruta especificada.
+
+        Si se pasa un diccionario en cabeceras, se completa con las cabeceras de la respuesta.
+        """
         try:
             if status_callback:
                 status_callback("Descargando archivo...")
-                
-            response = requests.get(url, stream=True, timeout=30)
-            response.raise_for_status()
 
-            with open(ruta_destino, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-                    
+            headers = APIClient.guardar_descarga(url, ruta_destino, params)
+            if cabeceras is not None:
+                cabeceras.update(headers)
             return True
         except requests.exceptions.RequestException as e:
             if status_callback:
@@ -113,6 +147,32 @@ class APIClient:
             messagebox.showerror("Error", f"Ocurrió un error al descargar el archivo:\n{e}")
             return False
 
+    @staticmethod
+    def consultar_json(url, params=None, etag=None):
+        """GET que devuelve (json, etag); json es None si el servidor responde 304 (sin cambios)."""
+        headers = {'If-None-Match': etag} if etag else {}
+        response = cliente_http.get(url, params=params, headers=headers)
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return response.json(), response.headers.get('ETag')
+
+    @staticmethod
+    def version_desde_cabeceras(cabeceras):
+        """Versión de los requerimientos informada por el servidor en la descarga (None si no la envía).
+
+        "desde" es la posición en el registro de la primera línea del archivo: el archivo
+        contiene las líneas [desde, lineas).
+        """
+        if 'X-Lineas' not in cabeceras:
+            return None
+        return {
+            "lineas": int(cabeceras['X-Lineas']),
+            "desde": int(cabeceras.get('X-Lineas-Desde', 0)),
+            "registro": cabeceras['X-Registro'],
+            "saldos": cabeceras['X-Saldos']
+        }
+
     @staticmethod
     def subir_archivo(url, ruta_archivo, status_callback=None):
         """Sube un archivo al servidor."""
@@ -122,9 +182,16 @@ class APIClient:
                 
             with open(ruta_archivo, 'rb') as f:
                 files = {'file': (os.path.basename(ruta_archivo), f)}
-                response = requests.post(url, files=files, timeout=60)
-                response.raise_for_status()
-                
+                response = cliente_http.post(url, files=files, timeout=60)
+            if response.status_code == 422:
+                # El servidor validó el archivo y lo rechazó; el catálogo anterior sigue vigente
+                problemas = response.json().get("problemas", [])
+                if status_callback:
+                    status_callback("Archivo rechazado por el servidor")
+                messagebox.showerror("Archivo no válido", "El servidor rechazó el archivo:\n- " + "\n- ".join(problemas))
+                return False
+            response.raise_for_status()
+
             return True
         except requests.exceptions.RequestException as e:
             if status_callback:
@@ -179,6 +246,40 @@ class ExcelUtils:
             print(f"Error al ordenar el archivo: {e}")
             return None
 
+    @staticmethod
+    def agregar_filas(ruta_archivo, columnas, filas, status_callback=None):
+        """Agrega filas nuevas a un archivo Excel ya ordenado y lo reordena por fecha descendente."""
+        try:
+            if status_callback:
+                status_callback("Agregando líneas nuevas...")
+
+            df = pd.read_excel(ruta_archivo)
+            nuevas = pd.DataFrame(filas, columns=columnas)
+
+            # Las fechas llegan como las envió la app; el archivo local ya las tiene en dd/mm/yyyy
+            fechas = []
+            for fecha in nuevas['Fecha']:
+                for formato in FORMATOS_FECHA:
+                    try:
+                        fecha = datetime.strptime(str(fecha), formato).strftime('%d/%m/%Y')
+                        break
+                    except ValueError:
+                        continue
+                fechas.append(fecha)
+            nuevas['Fecha'] = fechas
+
+            # Orden estable: en una misma fecha las líneas nuevas quedan después de las existentes
+            df = pd.concat([df, nuevas], ignore_index=True)
+            orden = pd.to_datetime(df['Fecha'], format='%d/%m/%Y', errors='coerce')
+            df = df.loc[orden.sort_values(ascending=False, kind='stable').index]
+            df.to_excel(ruta_archivo, index=False)
+            return True
+        except Exception as e:
+            if status_callback:
+                status_callback("Error al agregar líneas nuevas")
+            print(f"Error al agregar líneas nuevas: {e}")
+            return False
+
     @staticmethod
     def ajustar_columnas(ruta_archivo, status_callback=None):
         """Ajusta el ancho de las columnas del archivo Excel."""
@@ -226,6 +327,301 @@ class ExcelUtils:
             return False
 
 
+# Clase para el visor de requerimientos integrado
+class VisorRequerimientos:
+    """Tabla virtualizada: el Treeview solo contiene las filas visibles y se rellena al desplazarse."""
+
+    def __init__(self, root, ruta_archivo):
+        self.ruta_archivo = ruta_archivo
+        self.ventana = tk.Toplevel(root)
+        self.ventana.title(f"Requerimientos - {os.path.basename(ruta_archivo)}")
+        self.ventana.geometry("1100x600")
+        self.ventana.protocol("WM_DELETE_WINDOW", self.cerrar)
+
+        self.cabeceras = []
+        self.filas = []  # Tuplas de texto en el orden del archivo
+        self.posiciones_columna = {}  # Columna indexada -> posición en la fila
+        self.claves = {}  # Columna indexada -> clave de orden de cada fila
+        self.indices = {}  # Columna indexada -> {valor normalizado: [filas]}
+        self.ordenes = {}  # Caché de filas ordenadas (ascendente) por columna
+        self.vista = []  # Filas que pasan el filtro, en el orden elegido
+        self.inicio = 0  # Primera fila de la vista que se muestra
+        self.visibles = 0
+        self.items = []  # Items reutilizables del Treeview
+        self.items_adjuntos = 0
+        self.orden_columna = None
+        self.orden_descendente = False
+        self.cargando = True
+        self._filtro_pendiente = None
+        self._cola = queue.Queue()
+        self._cancelado = threading.Event()
+
+        self.construir_interfaz()
+        threading.Thread(target=self._leer_archivo, daemon=True).start()
+        self.ventana.after(100, self._recibir_lotes)
+
+    def construir_interfaz(self):
+        """Crea la barra de filtro y la tabla."""
+        barra = ttk.Frame(self.ventana, padding=(10, 5))
+        barra.pack(fill='x')
+
+        ttk.Label(barra, text="Filtrar por:").pack(side='left')
+        self.filtro_columna = ttk.Combobox(barra, values=COLUMNAS_INDEXADAS, state='readonly', width=18)
+        self.filtro_columna.current(0)
+        self.filtro_columna.pack(side='left', padx=5)
+        self.filtro_columna.bind('<<ComboboxSelected>>', self.programar_filtro)
+
+        self.filtro_texto = tk.StringVar()
+        ttk.Entry(barra, textvariable=self.filtro_texto, width=30).pack(side='left', padx=5)
+        self.filtro_texto.trace_add('write', self.programar_filtro)
+
+        self.info_label = ttk.Label(barra, text="Cargando...")
+        self.info_label.pack(side='right')
+
+        marco = ttk.Frame(self.ventana)
+        marco.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+
+        ttk.Style(self.ventana).configure("Visor.Treeview", rowheight=VISOR_ALTO_FILA)
+        self.tree = ttk.Treeview(marco, show='headings', style="Visor.Treeview", selectmode='browse')
+        self.scroll_y = ttk.Scrollbar(marco, orient='vertical', command=self.desplazar)
+        scroll_x = ttk.Scrollbar(marco, orient='horizontal', command=self.tree.xview)
+        self.tree.configure(xscrollcommand=scroll_x.set)
+
+        scroll_x.pack(side='bottom', fill='x')
+        self.scroll_y.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill='both', expand=True)
+
+        # El desplazamiento lo gestiona el visor: el Treeview nunca tiene filas fuera de pantalla
+        self.tree.bind('<Configure>', self.redimensionar)
+        self.tree.bind('<MouseWheel>', lambda e: self.mover(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.mover(-3))
+        self.tree.bind('<Button-5>', lambda e: self.mover(3))
+        self.tree.bind('<Up>', lambda e: self.mover(-1))
+        self.tree.bind('<Down>', lambda e: self.mover(1))
+        self.tree.bind('<Prior>', lambda e: self.mover(-self.visibles))
+        self.tree.bind('<Next>', lambda e: self.mover(self.visibles))
+
+    @staticmethod
+    def texto_celda(valor):
+        """Convierte el valor de una celda al texto que se muestra."""
+        if valor is None:
+            return ""
+        if isinstance(valor, datetime):
+            return valor.strftime('%d/%m/%Y')
+        if isinstance(valor, float) and valor.is_integer():
+            return str(int(valor))
+        return str(valor)
+
+    @staticmethod
+    def clave_fecha(texto):
+        """Clave de orden para la columna Fecha; las fechas no reconocidas van al final."""
+        for formato in FORMATOS_FECHA:
+            try:
+                return (0, datetime.strptime(texto, formato), "")
+            except ValueError:
+                continue
+        return (1, datetime.min, texto)
+
+    def _leer_archivo(self):
+        """Lee el libro en modo streaming (hilo secundario) y entrega las filas por lotes."""
+        try:
+            wb = openpyxl.load_workbook(self.ruta_archivo, read_only=True, data_only=True)
+            try:
+                filas = wb.active.iter_rows(values_only=True)
+                cabeceras = next(filas, None)
+                if cabeceras is None:
+                    self._cola.put(("fin", None))
+                    return
+                cabeceras = [self.texto_celda(c) for c in cabeceras]
+                ancho = len(cabeceras)
+                self._cola.put(("cabeceras", cabeceras))
+
+                lote = []
+                for fila in filas:
+                    if self._cancelado.is_set():
+                        return
+                    if all(v is None for v in fila):
+                        continue
+                    valores = [self.texto_celda(v) for v in fila[:ancho]]
+                    valores.extend([""] * (ancho - len(valores)))
+                    lote.append(tuple(valores))
+                    if len(lote) >= VISOR_FILAS_POR_LOTE:
+                        self._cola.put(("filas", lote))
+                        lote = []
+                if lote:
+                    self._cola.put(("filas", lote))
+            finally:
+                wb.close()
+            self._cola.put(("fin", None))
+        except Exception as e:
+            self._cola.put(("error", str(e)))
+
+    def _recibir_lotes(self):
+        """Incorpora en el hilo de la interfaz los lotes leídos hasta el momento."""
+        if self._cancelado.is_set():
+            return
+
+        hay_filas = False
+        try:
+            while True:
+                tipo, dato = self._cola.get_nowait()
+                if tipo == "cabeceras":
+                    self.configurar_columnas(dato)
+                elif tipo == "filas":
+                    self.indexar(dato)
+                    hay_filas = True
+                elif tipo == "error":
+                    self.cargando = False
+                    messagebox.showerror("Error", f"No se pudo leer el archivo:\n{dato}", parent=self.ventana)
+                else:
+                    self.cargando = False
+        except queue.Empty:
+            pass
+
+        if hay_filas or not self.cargando:
+            self.aplicar_vista()
+        if self.cargando:
+            self.ventana.after(100, self._recibir_lotes)
+
+    def configurar_columnas(self, cabeceras):
+        """Define las columnas de la tabla y prepara los índices de las columnas filtrables."""
+        self.cabeceras = cabeceras
+        columnas = [f"c{i}" for i in range(len(cabeceras))]
+        self.tree.configure(columns=columnas)
+        for id_columna, cabecera in zip(columnas, cabeceras):
+            self.tree.column(id_columna, width=130, minwidth=60, stretch=False)
+            if cabecera in COLUMNAS_INDEXADAS:
+                self.tree.heading(id_columna, text=cabecera, command=lambda c=cabecera: self.ordenar_por(c))
+            else:
+                self.tree.heading(id_columna, text=cabecera)
+
+        for columna in COLUMNAS_INDEXADAS:
+            if columna in cabeceras:
+                self.posiciones_columna[columna] = cabeceras.index(columna)
+                self.claves[columna] = []
+                self.indices[columna] = {}
+
+    def indexar(self, lote):
+        """Agrega un lote de filas y actualiza los índices en memoria."""
+        base = len(self.filas)
+        self.filas.extend(lote)
+        for columna, posicion in self.posiciones_columna.items():
+            claves = self.claves[columna]
+            indice = self.indices[columna]
+            for numero, fila in enumerate(lote, start=base):
+                valor = fila[posicion].casefold()
+                claves.append(self.clave_fecha(fila[posicion]) if columna == "Fecha" else valor)
+                indice.setdefault(valor, []).append(numero)
+        self.ordenes.clear()
+
+    def filas_filtradas(self):
+        """Filas que cumplen el filtro, recorriendo solo los valores distintos del índice (None = todas)."""
+        texto = self.filtro_texto.get().strip().casefold()
+        indice = self.indices.get(self.filtro_columna.get())
+        if not texto or indice is None:
+            return None
+
+        filas = []
+        for valor, numeros in indice.items():
+            if texto in valor:
+                filas.extend(numeros)
+        return filas
+
+    def aplicar_vista(self):
+        """Recalcula la vista (filtro y orden) y refresca las filas visibles."""
+        self._filtro_pendiente = None
+        filas = self.filas_filtradas()
+        columna = self.orden_columna
+
+        if columna is None:
+            self.vista = list(range(len(self.filas))) if filas is None else sorted(filas)
+        elif filas is None:
+            orden = self.ordenes.get(columna)
+            if orden is None:
+                orden = self.ordenes[columna] = sorted(range(len(self.filas)), key=self.claves[columna].__getitem__)
+            self.vista = orden[::-1] if self.orden_descendente else orden
+        else:
+            self.vista = sorted(filas, key=self.claves[columna].__getitem__, reverse=self.orden_descendente)
+
+        self.mover(0)
+
+    def programar_filtro(self, *args):
+        """Aplica el filtro poco después de la última tecla para no recalcular en cada una."""
+        if self._filtro_pendiente is not None:
+            self.ventana.after_cancel(self._filtro_pendiente)
+        self.inicio = 0
+        self._filtro_pendiente = self.ventana.after(VISOR_ESPERA_FILTRO_MS, self.aplicar_vista)
+
+    def ordenar_por(self, columna):
+        """Ordena por la columna indicada; un segundo clic invierte el orden."""
+        if self.orden_columna == columna:
+            self.orden_descendente = not self.orden_descendente
+        else:
+            self.orden_columna = columna
+            self.orden_descendente = False
+
+        for id_columna, cabecera in zip(self.tree['columns'], self.cabeceras):
+            if cabecera == columna:
+                cabecera += " ▼" if self.orden_descendente else " ▲"
+            self.tree.heading(id_columna, text=cabecera)
+
+        self.inicio = 0
+        self.aplicar_vista()
+
+    def redimensionar(self, event):
+        """Ajusta la cantidad de items del Treeview al alto disponible."""
+        visibles = max(1, (event.height - VISOR_ALTO_ENCABEZADO) // VISOR_ALTO_FILA)
+        if visibles == self.visibles:
+            return
+        self.visibles = visibles
+        while len(self.items) < visibles:
+            iid = self.tree.insert('', 'end')
+            self.tree.detach(iid)
+            self.items.append(iid)
+        self.mover(0)
+
+    def desplazar(self, *args):
+        """Comando de la barra de desplazamiento vertical."""
+        if args[0] == 'moveto':
+            self.inicio = int(float(args[1]) * len(self.vista))
+            self.mover(0)
+        elif args[0] == 'scroll':
+            paso = int(args[1])
+            self.mover(paso * self.visibles if args[2] == 'pages' else paso)
+
+    def mover(self, filas):
+        """Desplaza la ventana visible y vuelve a rellenar solo los items en pantalla."""
+        total = len(self.vista)
+        self.inicio = max(0, min(self.inicio + filas, total - self.visibles))
+
+        adjuntos = min(self.visibles, total - self.inicio)
+        for numero, iid in enumerate(self.items):
+            if numero < adjuntos:
+                self.tree.item(iid, values=self.filas[self.vista[self.inicio + numero]])
+                if numero >= self.items_adjuntos:
+                    self.tree.move(iid, '', numero)
+            elif numero < self.items_adjuntos:
+                self.tree.detach(iid)
+        self.items_adjuntos = adjuntos
+        self.tree.selection_set(())
+
+        if total:
+            self.scroll_y.set(self.inicio / total, min(1.0, (self.inicio + self.visibles) / total))
+        else:
+            self.scroll_y.set(0.0, 1.0)
+
+        estado = " (cargando...)" if self.cargando else ""
+        self.info_label.config(text=f"{total:,} de {len(self.filas):,} filas{estado}")
+        return "break"
+
+    def cerrar(self):
+        """Detiene la lectura en curso y cierra la ventana."""
+        self._cancelado.set()
+        if self._filtro_pendiente is not None:
+            self.ventana.after_cancel(self._filtro_pendiente)
+        self.ventana.destroy()
+
+
 # Clase de aplicación principal
 class SyaLogisticaApp:
     def __init__(self, root):
@@ -237,6 +633,16 @@ class SyaLogisticaApp:
         # Variables para almacenar rutas de archivos
         self.ultimo_archivo = None
         self.ultimo_archivo_bdd = None
+
+        # Actualización automática: versión del servidor que corresponde al Excel local
+        self.auto_sync = tk.BooleanVar(value=False)
+        self._auto_sync_id = None
+        self._sincronizando = False
+        self._etag_version = None
+        self._cambios_servidor = threading.Event()
+        self._detener_eventos = None
+        self._vigilancia_id = None
+        self._lock_requerimientos = threading.Lock()
         
         # Configuración del icono
         try:
@@ -248,7 +654,9 @@ class SyaLogisticaApp:
         self.configurar_estilos()
         
         # Crear carpeta de descargas
-        FileUtils.crear_carpeta_descargas()
+        ruta_descargas = FileUtils.crear_carpeta_descargas()
+        self.ruta_version = os.path.join(ruta_descargas, VERSION_FILENAME)
+        self.version_local = self.leer_version_local()
         
         # Inicializar la interfaz
         self.inicializar_interfaz()
@@ -320,6 +728,14 @@ class SyaLogisticaApp:
             style="Abrir.TButton"
         )
         btn_abrir_excel.pack(side='left', padx=5, expand=True, fill='x')
+
+        btn_ver_requerimientos = ttk.Button(
+            frame_requerimientos, 
+            text="Ver Requerimientos", 
+            command=self.ver_requerimientos, 
+            style="Abrir.TButton"
+        )
+        btn_ver_requerimientos.pack(side='left', padx=5, expand=True, fill='x')
         
         # Sección Base de Datos Materiales
         frame_bdd = ttk.LabelFrame(frame_botones_principal, text="Base de Datos Materiales (CSV)", padding=(10, 5))
@@ -360,6 +776,14 @@ class SyaLogisticaApp:
             style="Abrir.TButton"
         )
         btn_abrir_carpeta.pack(padx=5, expand=True, fill='x')
+
+        chk_auto_sync = ttk.Checkbutton(
+            frame_general,
+            text="Actualizar requerimientos automáticamente",
+            variable=self.auto_sync,
+            command=self.alternar_auto_sync
+        )
+        chk_auto_sync.pack(padx=5, pady=(10, 0), anchor='w')
         
         # Etiqueta de estado
         self.status_label = ttk.Label(self.root, text="Listo", font=("Helvetica", 10), background="#f0f0f0")
@@ -396,17 +820,31 @@ class SyaLogisticaApp:
         ruta_descargas = FileUtils.crear_carpeta_descargas()
         ruta_archivo = os.path.join(ruta_descargas, REQUERIMIENTOS_FILENAME)
         
-        # Descargar archivo
+        # Descargar archivo (sin cruzarse con una actualización automática en curso). No se espera
+        # al lock: la actualización puede estar bajando el libro completo y congelaría la ventana
         url = f"{API_BASE_URL}/descargar-requerimientos"
-        descarga_exitosa = APIClient.descargar_archivo(url, ruta_archivo, self.actualizar_estado)
-        
-        if not descarga_exitosa:
+        cabeceras = {}
+        if not self._lock_requerimientos.acquire(blocking=False):
+            self.actualizar_estado("Actualización automática en curso")
+            messagebox.showinfo("Actualización en curso",
+                                "La actualización automática está descargando los requerimientos.\n"
+                                "Intente nuevamente en unos segundos.")
             return None
-        
-        # Procesar archivo descargado
-        df = ExcelUtils.ordenar_excel_por_fecha(ruta_archivo, self.actualizar_estado)
-        if df is not None:
-            ExcelUtils.ajustar_columnas(ruta_archivo, self.actualizar_estado)
+        try:
+            descarga_exitosa = APIClient.descargar_archivo(
+                url, ruta_archivo, self.actualizar_estado, cabeceras, RANGO_REQUERIMIENTOS
+            )
+
+            if not descarga_exitosa:
+                return None
+
+            # Procesar archivo descargado
+            df = ExcelUtils.ordenar_excel_por_fecha(ruta_archivo, self.actualizar_estado)
+            if df is not None:
+                ExcelUtils.ajustar_columnas(ruta_archivo, self.actualizar_estado)
+            self.guardar_version_local(APIClient.version_desde_cabeceras(cabeceras))
+        finally:
+            self._lock_requerimientos.release()
         
         # Actualizar estado y mostrar mensaje
         self.actualizar_estado(f"Archivo descargado: {REQUERIMIENTOS_FILENAME}")
@@ -417,40 +855,242 @@ class SyaLogisticaApp:
         self.ultimo_archivo = ruta_archivo
         return ruta_archivo
     
+    def buscar_archivo_requerimientos(self):
+        """Devuelve el último Excel de requerimientos descargado, o None si no hay ninguno."""
+        if self.ultimo_archivo and os.path.exists(self.ultimo_archivo):
+            return self.ultimo_archivo
+
+        # Buscar el archivo más reciente en la carpeta de descargas
+        ruta_descargas = FileUtils.crear_carpeta_descargas()
+        archivos_excel = [
+            f for f in os.listdir(ruta_descargas) 
+            if f.startswith("sya_logistica_requerimientos") and f.endswith(".xlsx")
+        ]
+        if not archivos_excel:
+            return None
+
+        # Ordenar por fecha de modificación (más reciente primero)
+        archivos_excel.sort(key=lambda x: os.path.getmtime(os.path.join(ruta_descargas, x)), reverse=True)
+        self.ultimo_archivo = os.path.join(ruta_descargas, archivos_excel[0])
+        return self.ultimo_archivo
+
     def abrir_excel(self):
         """Abre el último archivo Excel descargado."""
         try:
-            if hasattr(self, 'ultimo_archivo') and self.ultimo_archivo and os.path.exists(self.ultimo_archivo):
+            ruta_archivo = self.buscar_archivo_requerimientos()
+            if ruta_archivo:
                 # Abrir el archivo con la aplicación predeterminada
-                if FileUtils.abrir_archivo(self.ultimo_archivo):
-                    self.actualizar_estado(f"Archivo abierto: {os.path.basename(self.ultimo_archivo)}")
+                if FileUtils.abrir_archivo(ruta_archivo):
+                    self.actualizar_estado(f"Archivo abierto: {os.path.basename(ruta_archivo)}")
             else:
-                # Buscar el archivo más reciente en la carpeta de descargas
-                ruta_descargas = FileUtils.crear_carpeta_descargas()
-                archivos_excel = [
-                    f for f in os.listdir(ruta_descargas) 
-                    if f.startswith("sya_logistica_requerimientos") and f.endswith(".xlsx")
-                ]
-
-                if archivos_excel:
-                    # Ordenar por fecha de modificación (más reciente primero)
-                    archivos_excel.sort(key=lambda x: os.path.getmtime(os.path.join(ruta_descargas, x)), reverse=True)
-                    self.ultimo_archivo = os.path.join(ruta_descargas, archivos_excel[0])
-
-                    # Abrir el archivo
-                    if FileUtils.abrir_archivo(self.ultimo_archivo):
-                        self.actualizar_estado(f"Archivo abierto: {os.path.basename(self.ultimo_archivo)}")
-                else:
-                    # Si no hay archivo descargado, mostrar mensaje
-                    messagebox.showinfo(
-                        "Información",
-                        "No hay archivo para abrir. Por favor, descargue primero los requerimientos."
-                    )
-                    self.actualizar_estado("No hay archivo para abrir")
+                # Si no hay archivo descargado, mostrar mensaje
+                messagebox.showinfo(
+                    "Información",
+                    "No hay archivo para abrir. Por favor, descargue primero los requerimientos."
+                )
+                self.actualizar_estado("No hay archivo para abrir")
         except Exception as e:
             self.actualizar_estado("Error al abrir el archivo")
             messagebox.showerror("Error", f"Ocurrió un error al abrir el archivo:\n{e}")
+
+    def ver_requerimientos(self):
+        """Muestra el último Excel descargado en el visor integrado, sin abrir la hoja de cálculo."""
+        try:
+            ruta_archivo = self.buscar_archivo_requerimientos()
+            if ruta_archivo:
+                VisorRequerimientos(self.root, ruta_archivo)
+                self.actualizar_estado(f"Visor abierto: {os.path.basename(ruta_archivo)}")
+            else:
+                messagebox.showinfo(
+                    "Información",
+                    "No hay archivo para ver. Por favor, descargue primero los requerimientos."
+                )
+                self.actualizar_estado("No hay archivo para ver")
+        except Exception as e:
+            self.actualizar_estado("Error al abrir el visor")
+            messagebox.showerror("Error", f"Ocurrió un error al abrir el visor:\n{e}")
     
+    def leer_version_local(self):
+        """Lee la versión del servidor que corresponde al Excel descargado (None si no se conoce)."""
+        try:
+            with open(self.ruta_version, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def guardar_version_local(self, version):
+        """Guarda la versión del Excel descargado para que la actualización automática siga desde ahí."""
+        self.version_local = version
+        if version is None:
+            if os.path.exists(self.ruta_version):
+                os.remove(self.ruta_version)
+            return
+        with open(self.ruta_version, 'w', encoding='utf-8') as f:
+            json.dump(version, f)
+
+    def alternar_auto_sync(self):
+        """Activa o desactiva la actualización automática de requerimientos."""
+        if self.auto_sync.get():
+            self.actualizar_estado("Actualización automática activada")
+
+            # Los eventos del servidor adelantan la sincronización; la consulta periódica queda de respaldo
+            self._detener_eventos = threading.Event()
+            threading.Thread(
+                target=cliente_http.escuchar_eventos,
+                args=(EVENTOS_URL, self.al_recibir_evento, self._detener_eventos),
+                daemon=True
+            ).start()
+            if not self._sincronizando:
+                self.programar_auto_sync(0)
+            self._vigilancia_id = self.root.after(AUTO_SYNC_REVISION_MS, self.vigilar_eventos)
+        else:
+            if self._vigilancia_id is not None:
+                self.root.after_cancel(self._vigilancia_id)
+                self._vigilancia_id = None
+            if self._detener_eventos is not None:
+                self._detener_eventos.set()
+                self._detener_eventos = None
+            if self._auto_sync_id is not None:
+                self.root.after_cancel(self._auto_sync_id)
+                self._auto_sync_id = None
+            self.actualizar_estado("Actualización automática desactivada")
+
+    def al_recibir_evento(self, tipo, datos):
+        """Recibe los eventos del servidor (desde el hilo lector: no toca la interfaz)."""
+        if tipo in EVENTOS_QUE_SINCRONIZAN:
+            self._cambios_servidor.set()
+
+    def vigilar_eventos(self):
+        """Lanza una sincronización apenas un evento avisa de líneas nuevas."""
+        if self._cambios_servidor.is_set() and not self._sincronizando:
+            self._cambios_servidor.clear()
+            if self._auto_sync_id is not None:
+                self.root.after_cancel(self._auto_sync_id)
+            self.ejecutar_auto_sync()
+        self._vigilancia_id = self.root.after(AUTO_SYNC_REVISION_MS, self.vigilar_eventos)
+
+    def programar_auto_sync(self, espera=AUTO_SYNC_INTERVALO_MS):
+        """Programa la próxima consulta de versión."""
+        self._auto_sync_id = self.root.after(espera, self.ejecutar_auto_sync)
+
+    def ejecutar_auto_sync(self):
+        """Lanza la sincronización en segundo plano y revisa su resultado sin bloquear la interfaz."""
+        self._auto_sync_id = None
+        if not self.auto_sync.get():
+            return
+        self._sincronizando = True
+        ruta_archivo = os.path.join(os.path.dirname(self.ruta_version), REQUERIMIENTOS_FILENAME)
+        futuro = cliente_http.en_segundo_plano(self.sincronizar_requerimientos, ruta_archivo)
+        self.root.after(AUTO_SYNC_REVISION_MS, self.revisar_auto_sync, futuro, ruta_archivo)
+
+    def revisar_auto_sync(self, futuro, ruta_archivo):
+        """Muestra el resultado de la sincronización cuando termina y programa la siguiente."""
+        if not futuro.done():
+            self.root.after(AUTO_SYNC_REVISION_MS, self.revisar_auto_sync, futuro, ruta_archivo)
+            return
+
+        try:
+            nuevas = futuro.result()
+            if nuevas:
+                self.ultimo_archivo = ruta_archivo
+                self.actualizar_estado(f"Requerimientos actualizados: {nuevas} línea(s) nueva(s)")
+                self.mostrar_aviso(f"{nuevas} línea(s) nueva(s) de requerimientos")
+        except Exception as e:
+            self.actualizar_estado("Error en la actualización automática")
+            print(f"Error en la actualización automática: {e}")
+
+        self._sincronizando = False
+        if self.auto_sync.get() and self._auto_sync_id is None:
+            self.programar_auto_sync()
+
+    def sincronizar_requerimientos(self, ruta_archivo):
+        """Trae al Excel local los cambios del servidor. Se ejecuta en segundo plano: no toca la interfaz.
+
+        Consulta la versión (una respuesta mínima, 304 si no cambió). Si solo se anexaron líneas
+        descarga únicamente esas; si cambiaron los saldos o se reconstruyó el registro, el libro
+        completo. Devuelve la cantidad de líneas nuevas.
+        """
+        with self._lock_requerimientos:
+            local = self.version_local if os.path.exists(ruta_archivo) else None
+            version, etag = APIClient.consultar_json(
+                f"{API_BASE_URL}/version", etag=self._etag_version if local else None
+            )
+            nuevas = 0
+            if version is not None and (local is None or any(local.get(k) != v for k, v in version.items())):
+                nuevas = self.actualizar_archivo_requerimientos(ruta_archivo, local, version)
+            # El ETag se recuerda solo si el archivo quedó al día; si algo falló se vuelve a intentar
+            self._etag_version = etag
+            return nuevas
+
+    def actualizar_archivo_requerimientos(self, ruta_archivo, local, version):
+        """Lleva el Excel local de la versión local a la del servidor y devuelve las líneas nuevas."""
+        conocidas = local['lineas'] if local else 0
+        if local and version['registro'] == local['registro'] and version['saldos'] == local['saldos']:
+            resultado = self.descargar_lineas_nuevas(local)
+            if resultado is not None:
+                columnas, filas, version = resultado
+                if filas:
+                    if not ExcelUtils.agregar_filas(ruta_archivo, columnas, filas):
+                        raise RuntimeError("No se pudieron agregar las líneas nuevas al Excel")
+                    ExcelUtils.ajustar_columnas(ruta_archivo)
+                self.guardar_version_local(version)
+                return len(filas)
+
+        cabeceras = APIClient.guardar_descarga(
+            f"{API_BASE_URL}/descargar-requerimientos", ruta_archivo, RANGO_REQUERIMIENTOS
+        )
+        if ExcelUtils.ordenar_excel_por_fecha(ruta_archivo) is not None:
+            ExcelUtils.ajustar_columnas(ruta_archivo)
+        version = APIClient.version_desde_cabeceras(cabeceras)
+        self.guardar_version_local(version)
+        if not version:
+            return 0
+        # Con el mismo registro, las líneas nuevas son las del archivo que no se conocían
+        if local and local['registro'] == version['registro']:
+            return max(0, version['lineas'] - max(conocidas, version['desde']))
+        return version['lineas'] - version['desde']
+
+    def descargar_lineas_nuevas(self, local):
+        """Descarga las líneas posteriores a la versión local.
+
+        Devuelve (columnas, filas, versión), o None si hay que descargar el libro completo
+        (registro reconstruido o saldos modificados mientras tanto).
+        """
+        filas = []
+        cursor = local['lineas']
+        while cursor is not None:
+            params = {"cursor": cursor, "registro": local['registro']}
+            try:
+                pagina, _ = APIClient.consultar_json(f"{API_BASE_URL}/lineas", params)
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code == 409:
+                    return None
+                raise
+            if pagina['saldos'] != local['saldos']:
+                return None
+            filas.extend(pagina['filas'])
+            cursor = pagina['siguiente_cursor']
+
+        version = {"lineas": pagina['lineas'], "desde": local.get('desde', 0),
+                   "registro": pagina['registro'], "saldos": pagina['saldos']}
+        return pagina['columnas'], filas, version
+
+    def mostrar_aviso(self, texto):
+        """Muestra un aviso en la esquina de la ventana que se cierra solo, sin bloquear la interfaz."""
+        aviso = tk.Toplevel(self.root)
+        aviso.overrideredirect(True)
+        aviso.attributes('-topmost', True)
+        ttk.Label(
+            aviso, text=texto, padding=(15, 10),
+            background="#333333", foreground="white", font=("Helvetica", 11)
+        ).pack()
+
+        aviso.update_idletasks()
+        x = self.root.winfo_rootx() + self.root.winfo_width() - aviso.winfo_reqwidth() - 20
+        y = self.root.winfo_rooty() + self.root.winfo_height() - aviso.winfo_reqheight() - 20
+        aviso.geometry(f"+{x}+{y}")
+        aviso.after(AVISO_DURACION_MS, aviso.destroy)
+
     def abrir_carpeta_descargas(self):
         """Abre la carpeta de descargas."""
         ruta_descargas = FileUtils.crear_carpeta_descargas()
@@ -544,6 +1184,7 @@ def main():
     global app
     app = SyaLogisticaApp(root)
     root.mainloop()
+    cliente_http.cerrar()
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,33 @@
 # sya_operaciones_server.py
 import os
+import re
+import abc
+import io
+import sys
+import json
+import math
+import time
+import bisect
+import collections
+import uuid
+import hashlib
+import functools
+import gzip
+import zlib
+import queue
+import atexit
+import shutil
+import sqlite3
 import logging
+import logging.handlers
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-import pandas as pd
-import openpyxl
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, g, has_request_context
 import zipfile
+import click
 from flask_cors import CORS
+import sya_exportacion
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -23,6 +44,11 @@ PERSONAL_CSV_PATH = os.path.join(BASE_DIR, "operaciones_personal.csv")
 # Archivo Excel y directorio para registros de choferes
 REGISTROS_CHOFERES_EXCEL = os.path.join(BASE_DIR, "registros_choferes.xlsx")
 FOTOS_VEHICULOS_DIR = os.path.join(BASE_DIR, "fotos_vehiculos")
+FOTOS_BLOBS_DIR = os.path.join(BASE_DIR, "fotos_blobs")
+REFERENCIAS_FOTOS = "referencias.json"
+SUBIDAS_DIR = os.path.join(BASE_DIR, "subidas")
+SUBIDAS_TAMANO_MAX = int(os.environ.get("SYA_SUBIDAS_TAMANO_MAX", str(50 * 1024 * 1024)))
+SUBIDAS_VIGENCIA_HORAS = float(os.environ.get("SYA_SUBIDAS_VIGENCIA_HORAS", "48"))
 
 # Ruta al archivo CSV de conductores y vehiculos
 CONDUCTORES_CSV_PATH = os.path.join(BASE_DIR, "aem_conductores.csv")
@@ -32,109 +58,559 @@ VEHICULOS_INFO_CSV_PATH = os.path.join(BASE_DIR, "aem_vehiculos.csv")
 LOGISTICA_EXCEL_FILE = os.path.join(BASE_DIR, "sya_logistica_requerimientos.xlsx")
 LOGISTICA_MATERIALES_CSV_PATH = os.path.join(BASE_DIR, "logistica_materiales.csv")
 
-# Configuración de logging
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
-
-def inicializar_excel():
-    """Inicializa los archivos Excel si no existen."""
-    # Inicializar Excel de Reporte Diario
-    if not os.path.exists(EXCEL_FILE):
-        logging.info(f"Creando archivo Excel de reporte diario en: {EXCEL_FILE}")
-        wb = openpyxl.Workbook()
-        ws1 = wb.active
-        ws1.title = "Reporte Principal"
-        headers_reporte = [
-            "Fecha", "Código Obra", "Nombre Ingeniero",
-            "Nombre Supervisor", "Actividad Principal",
-            "Supervisor Presente", "Avance Diario",
-            "Incidentes", "Plan Siguiente Día", "Observaciones"
-        ]
-        ws1.append(headers_reporte)
-        ws2 = wb.create_sheet(title="Materiales Usados")
-        headers_materiales = ["Fecha", "Código Obra", "Nombre Ingeniero"]
-        ws2.append(headers_materiales)
-        ws3 = wb.create_sheet(title="Equipos Usados")
-        headers_equipos = ["Fecha", "Código Obra", "Nombre Ingeniero"]
-        ws3.append(headers_equipos)
-        ws4 = wb.create_sheet(title="Vehículos Usados")
-        headers_vehiculos = ["Fecha", "Código Obra", "Nombre Ingeniero"]
-        ws4.append(headers_vehiculos)
-        ws5 = wb.create_sheet(title="Personal de Campo")
-        headers_personal = ["Fecha", "Código Obra", "Nombre Ingeniero"]
-        ws5.append(headers_personal)
-        wb.save(EXCEL_FILE)
-    else:
-        logging.info(f"El archivo Excel de reporte diario ya existe en: {EXCEL_FILE}")
-
-    # Inicializar Excel de Requerimientos
-    if not os.path.exists(REQUERIMIENTOS_EXCEL_FILE):
-        logging.info(f"Creando archivo Excel de requerimientos en: {REQUERIMIENTOS_EXCEL_FILE}")
-        wb_req = openpyxl.Workbook()
-        ws_req = wb_req.active
-        ws_req.title = "Requerimientos"
-        headers_requerimientos_inicial = ["Fecha", "Código Obra", "Nombre Ingeniero"]
-        ws_req.append(headers_requerimientos_inicial)
-        wb_req.save(REQUERIMIENTOS_EXCEL_FILE)
-    else:
-        logging.info(f"El archivo Excel de requerimientos ya existe en: {REQUERIMIENTOS_EXCEL_FILE}")
+# Índices y agregados derivados de los archivos Excel
+INDICES_DIR = os.path.join(BASE_DIR, "indices")
+INDICE_REPORTES_FILE = os.path.join(INDICES_DIR, "reportes.jsonl")
+AGREGADOS_OBRA_FILE = os.path.join(INDICES_DIR, "agregados_obra.json")
+LINEAS_LOGISTICA_FILE = os.path.join(INDICES_DIR, "logistica_lineas.jsonl")
+ADQUISICIONES_LOGISTICA_FILE = os.path.join(INDICES_DIR, "logistica_adquisiciones.jsonl")
+CONSOLIDADO_LOGISTICA_FILE = os.path.join(INDICES_DIR, "logistica_consolidado.json")
+VIAJES_CHOFERES_FILE = os.path.join(INDICES_DIR, "viajes_choferes.jsonl")
+ANALITICA_VIAJES_FILE = os.path.join(INDICES_DIR, "analitica_viajes.json")
+MANIFIESTO_FOTOS_FILE = os.path.join(INDICES_DIR, "manifiesto_fotos.jsonl")
+MANIFIESTO_COMPACTAR_LINEAS = int(os.environ.get("SYA_MANIFIESTO_COMPACTAR_LINEAS", "5000"))
+
+# Claves de idempotencia de los envíos (Idempotency-Key)
+IDEMPOTENCIA_FILE = os.path.join(INDICES_DIR, "idempotencia.sqlite3")
+IDEMPOTENCIA_MAX_CLAVES = int(os.environ.get("SYA_IDEMPOTENCIA_MAX_CLAVES", "10000"))
+IDEMPOTENCIA_TTL_HORAS = float(os.environ.get("SYA_IDEMPOTENCIA_TTL_HORAS", "48"))
+IDEMPOTENCIA_EN_CURSO_SEGUNDOS = 300  # Una reserva más antigua se considera abandonada
+IDEMPOTENCIA_PURGA_CADA = 100  # Altas entre cada limpieza de claves vencidas
+
+# Control de admisión de las rutas de escritura: (solicitudes simultáneas, solicitudes en espera)
+# por recurso. Los libros Excel admiten un solo escritor; se ajusta con SYA_ADMISION="recurso=n:cola,..."
+ADMISION_LIMITES_DEFECTO = {
+    "reportes": (1, 30),
+    "requerimientos_obra": (1, 30),
+    "logistica": (1, 30),
+    "choferes": (1, 30),
+    "catalogo_logistica": (1, 2),
+    "subidas": (4, 16),
+}
+ADMISION_ESPERA_MAX_SEGUNDOS = float(os.environ.get("SYA_ADMISION_ESPERA_MAX_SEGUNDOS", "20"))
+
+# Tamaño máximo del cuerpo por ruta (los archivos grandes van por /api/subidas)
+CUERPO_MAX_JSON = int(os.environ.get("SYA_CUERPO_MAX_JSON", str(1024 * 1024)))
+CUERPO_MAX_FORMULARIO_FOTOS = int(os.environ.get("SYA_CUERPO_MAX_FORMULARIO_FOTOS", str(40 * 1024 * 1024)))
+CUERPO_MAX_CSV = int(os.environ.get("SYA_CUERPO_MAX_CSV", str(20 * 1024 * 1024)))
+CUERPO_MAX_POR_RUTA = {
+    "recibir_datos": CUERPO_MAX_JSON,
+    "recibir_requerimientos_route": CUERPO_MAX_JSON,
+    "recibir_requerimientos_logistica": CUERPO_MAX_JSON,
+    "registrar_adquisiciones_logistica": CUERPO_MAX_JSON,
+    "crear_subida": CUERPO_MAX_JSON,
+    "recibir_datos_choferes": CUERPO_MAX_FORMULARIO_FOTOS,
+    "subir_bdd_logistica": CUERPO_MAX_CSV,
+    "recibir_parte_subida": SUBIDAS_TAMANO_MAX,
+}
+
+# Configuración del log del servidor ("texto" o "estructurado")
+LOG_MODO = os.environ.get("SYA_LOG_MODO", "texto")
+SERVER_LOG_FILE = os.path.join(BASE_DIR, "server_log.jsonl")
+LOG_MAX_BYTES = int(os.environ.get("SYA_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("SYA_LOG_BACKUPS", "10"))
+LOG_COLA_MAX = int(os.environ.get("SYA_LOG_COLA_MAX", "10000"))
+LOG_TEXTO_MAX = 120
+
+# Particionado mensual de los libros Excel (p. ej. registros_trabajo_2026-10.xlsx)
+PARTICIONADO_MENSUAL = os.environ.get("SYA_PARTICIONADO_MENSUAL", "1") == "1"
+CACHE_PARTICION_CERRADA_SEGUNDOS = 24 * 60 * 60
+PERIODO_HISTORICO = "historico"  # Libro anterior al particionado (sin sufijo de periodo)
+PERIODO_INICIAL = "0000-00"  # Como inicio de rango, incluye el libro sin particionar
+
+# Inicio diferido: los archivos se crean al primer uso en lugar de al importar el módulo
+INICIO_DIFERIDO = os.environ.get("SYA_INICIO_DIFERIDO", "0") == "1"
+
+# Archivo de trazas de solicitudes lentas
+TRAZAS_LENTAS_FILE = os.path.join(BASE_DIR, "trazas_lentas.jsonl")
+UMBRAL_TRAZA_LENTA_MS = float(os.environ.get("SYA_UMBRAL_TRAZA_LENTA_MS", "1000"))
+TRAZAS_MAX_BYTES = int(os.environ.get("SYA_TRAZAS_MAX_BYTES", str(5 * 1024 * 1024)))
+TRAZAS_BACKUPS = int(os.environ.get("SYA_TRAZAS_BACKUPS", "5"))
+
+# Compresión de respuestas JSON (gzip o deflate según Accept-Encoding)
+COMPRESION_MIN_BYTES = int(os.environ.get("SYA_COMPRESION_MIN_BYTES", "1024"))
+COMPRESION_NIVEL = int(os.environ.get("SYA_COMPRESION_NIVEL", "6"))
+
+# Flujo de eventos (Server-Sent Events) de envíos nuevos
+EVENTOS_OYENTES_MAX = int(os.environ.get("SYA_EVENTOS_OYENTES_MAX", "20"))
+EVENTOS_HISTORIAL = int(os.environ.get("SYA_EVENTOS_HISTORIAL", "500"))
+EVENTOS_COLA_OYENTE = 100
+EVENTOS_LATIDO_SEGUNDOS = 15
+EVENTOS_DURACION_MAX_SEGUNDOS = 10 * 60
+EVENTOS_REINTENTO_MS = 3000
+
+class FormateadorJSON(logging.Formatter):
+    """Formatea cada registro de log como una línea JSON."""
+    def format(self, record):
+        registro = {
+            "fecha": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+            "hilo": record.threadName
+        }
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id:
+            registro["trace_id"] = trace_id
+        if record.exc_info:
+            registro["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+class FiltroTraza(logging.Filter):
+    """Adjunta el id de traza de la solicitud actual al registro de log."""
+    def filter(self, record):
+        if has_request_context() and hasattr(g, 'traza'):
+            record.trace_id = g.traza['id']
+        return True
 
-    # Inicializar Excel de Registros de Choferes
-    if not os.path.exists(REGISTROS_CHOFERES_EXCEL):
-        logging.info(f"Creando archivo Excel de registros de choferes en: {REGISTROS_CHOFERES_EXCEL}")
-        wb_choferes = openpyxl.Workbook()
-        ws_choferes = wb_choferes.active
-        ws_choferes.title = "Registros"
-        headers_choferes = [
-            "Fecha", "Nombre del Chofer", "Vehículo", "Placa", "Fecha de Salida",
-            "Hora de Salida", "Ubicación Inicial", "Kilometraje Inicial",
-            "Observaciones Salida", "Fecha de Llegada", "Hora de Retorno",
-            "Ubicación Final", "Kilometraje Final", "Observaciones Llegada"
-        ]
-        ws_choferes.append(headers_choferes)
-        wb_choferes.save(REGISTROS_CHOFERES_EXCEL)
-    else:
-        logging.info(f"El archivo Excel de registros de choferes ya existe en: {REGISTROS_CHOFERES_EXCEL}")
-
-    # Inicializar Excel de Logística
-    if not os.path.exists(LOGISTICA_EXCEL_FILE):
-        logging.info(f"Creando archivo Excel de logística en: {LOGISTICA_EXCEL_FILE}")
-        wb_logistica = openpyxl.Workbook()
-        ws_logistica = wb_logistica.active
-        ws_logistica.title = "Requerimientos"
-
-        # Definir cabeceras
-        cabeceras = [
-            "Fecha", "Solicitante", "Orden de Trabajo", "Cliente",
-            "Producto", "Unidad", "Cantidad", "Stock", "Adquirido",
-            "Saldo", "Observaciones"
-        ]
+class ColaLogHandler(logging.handlers.QueueHandler):
+    """Encola registros sin bloquear; si la cola está llena el registro se descarta y se cuenta.
 
-        for col_num, header in enumerate(cabeceras, 1):
-            ws_logistica.cell(row=1, column=col_num).value = header
+    Cuando la cola vuelve a tener lugar se encola primero un aviso con los descartes
+    acumulados, así quedan en el mismo log que los registros perdidos.
+    """
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+        self._avisados = 0
 
-        wb_logistica.save(LOGISTICA_EXCEL_FILE)
-        logging.info(f"Archivo Excel de logística creado exitosamente")
-    else:
-        logging.info(f"El archivo Excel de logística ya existe en: {LOGISTICA_EXCEL_FILE}")
+    def enqueue(self, record):
+        try:
+            if self.descartados > self._avisados:
+                nuevos = self.descartados - self._avisados
+                aviso = logging.LogRecord(
+                    record.name, logging.WARNING, __file__, 0,
+                    f"Se descartaron {nuevos} registros de log por cola llena ({self.descartados} en total)", None, None
+                )
+                self.queue.put_nowait(aviso)
+                self._avisados = self.descartados
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+def _nombre_rotado_gz(nombre):
+    """Nombre de un archivo de log rotado (comprimido)."""
+    return nombre + ".gz"
+
+def _rotar_comprimiendo(origen, destino):
+    """Comprime el archivo de log rotado con gzip y elimina el original."""
+    with open(origen, 'rb') as f_in, gzip.open(destino, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(origen)
+
+def _crear_rotativo(ruta, max_bytes, backups, formatter):
+    """Crea un handler de archivo rotativo por tamaño que comprime los archivos rotados."""
+    handler = logging.handlers.RotatingFileHandler(
+        ruta, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True
+    )
+    handler.namer = _nombre_rotado_gz
+    handler.rotator = _rotar_comprimiendo
+    handler.setFormatter(formatter)
+    return handler
+
+_log_listeners = []
+_colas_log = {}  # Nombre del logger -> ColaLogHandler, para informar los descartes
+
+def _en_segundo_plano(logger, *handlers):
+    """Conecta el logger a una cola drenada por un hilo que escribe en los handlers dados."""
+    cola = queue.Queue(LOG_COLA_MAX)
+    cola_handler = ColaLogHandler(cola)
+    cola_handler.addFilter(FiltroTraza())
+    listener = logging.handlers.QueueListener(cola, *handlers, respect_handler_level=True)
+    listener.start()
+    _log_listeners.append(listener)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(cola_handler)
+    _colas_log[logger.name] = cola_handler
+    return cola_handler
+
+def _detener_logging():
+    """Vacía las colas de log pendientes al terminar el proceso."""
+    while _log_listeners:
+        _log_listeners.pop().stop()
+
+def configurar_logging():
+    """Configura el log del servidor según SYA_LOG_MODO."""
+    trazas_logger = logging.getLogger("sya.trazas")
+    trazas_logger.setLevel(logging.INFO)
+    trazas_logger.propagate = False
+    trazas_handler = _crear_rotativo(TRAZAS_LENTAS_FILE, TRAZAS_MAX_BYTES, TRAZAS_BACKUPS,
+                                     logging.Formatter('%(message)s'))
+
+    if LOG_MODO != "estructurado":
+        logging.basicConfig(level=logging.INFO,
+                            format='%(asctime)s - %(levelname)s - %(message)s')
+        trazas_logger.addHandler(trazas_handler)
+        return trazas_logger
+
+    # Modo estructurado: JSON por línea, escrito desde un hilo en segundo plano
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    archivo_handler = _crear_rotativo(SERVER_LOG_FILE, LOG_MAX_BYTES, LOG_BACKUPS, FormateadorJSON())
+    consola_handler = logging.StreamHandler()
+    consola_handler.setLevel(logging.WARNING)
+    consola_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    _en_segundo_plano(root_logger, archivo_handler, consola_handler)
+    _en_segundo_plano(trazas_logger, trazas_handler)
+    atexit.register(_detener_logging)
+    return trazas_logger
 
-    # Inicializar CSV de Logística Materiales
-    if not os.path.exists(LOGISTICA_MATERIALES_CSV_PATH):
-        logging.info(f"Creando archivo CSV de materiales de logística en: {LOGISTICA_MATERIALES_CSV_PATH}")
+# Configuración de logging
+trazas_logger = configurar_logging()
+
+def resumir_payload(datos, profundidad=0):
+    """Resume un payload para el log: listas como cantidad de elementos y textos truncados."""
+    if isinstance(datos, dict):
+        if profundidad > 1:
+            return f"<{len(datos)} campos>"
+        return {k: resumir_payload(v, profundidad + 1) for k, v in datos.items()}
+    if isinstance(datos, (list, tuple)):
+        return f"<{len(datos)} elementos>"
+    if isinstance(datos, str) and len(datos) > LOG_TEXTO_MAX:
+        return datos[:LOG_TEXTO_MAX] + "…"
+    return datos
+
+@contextmanager
+def medir_span(nombre):
+    """Mide la duración de un paso interno y la registra en la traza de la solicitud actual."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context() and hasattr(g, 'traza'):
+            g.traza['spans'].append({
+                "nombre": nombre,
+                "inicio_ms": round((inicio - g.traza['inicio']) * 1000, 2),
+                "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2)
+            })
+
+@app.before_request
+def iniciar_traza():
+    """Asigna un identificador de traza a la solicitud entrante."""
+    g.traza = {
+        "id": (request.headers.get("X-Trace-Id") or uuid.uuid4().hex)[:64],
+        "inicio": time.perf_counter(),
+        "spans": []
+    }
+
+@app.before_request
+def limitar_cuerpo():
+    """Rechaza con 413 los cuerpos que superan el máximo de la ruta antes de leerlos."""
+    maximo = CUERPO_MAX_POR_RUTA.get(request.endpoint)
+    if maximo is None:
+        return None
+    request.max_content_length = maximo
+    if request.content_length is not None and request.content_length > maximo:
+        logging.warning(f"Cuerpo de {request.content_length} bytes rechazado en {request.path} (máximo {maximo})")
+        return jsonify({"error": f"El cuerpo supera el máximo de {maximo} bytes"}), 413
+    return None
+
+@app.after_request
+def finalizar_traza(response):
+    """Devuelve el id de traza y guarda la traza si la solicitud fue lenta."""
+    traza = getattr(g, 'traza', None)
+    if traza is None:
+        return response
+    duracion_ms = (time.perf_counter() - traza['inicio']) * 1000
+    response.headers["X-Trace-Id"] = traza['id']
+    if duracion_ms >= UMBRAL_TRAZA_LENTA_MS:
         try:
-            # Crear un DataFrame vacío con las cabeceras esperadas
-            df_materiales_logistica = pd.DataFrame(columns=['material', 'unidad'])
-            df_materiales_logistica.to_csv(LOGISTICA_MATERIALES_CSV_PATH, index=False)
-            logging.info(f"Archivo CSV de materiales de logística creado exitosamente con cabeceras.")
+            trazas_logger.info(json.dumps({
+                "trace_id": traza['id'],
+                "fecha": datetime.now().isoformat(timespec='seconds'),
+                "metodo": request.method,
+                "ruta": request.path,
+                "estado": response.status_code,
+                "duracion_ms": round(duracion_ms, 2),
+                "spans": traza['spans']
+            }, ensure_ascii=False))
         except Exception as e:
-            logging.error(f"No se pudo crear el archivo CSV de materiales de logística: {e}")
-    else:
-        logging.info(f"El archivo CSV de materiales de logística ya existe en: {LOGISTICA_MATERIALES_CSV_PATH}")
+            logging.error(f"Error al guardar traza lenta {traza['id']}: {str(e)}")
+    return response
+
+@app.after_request
+def comprimir_respuesta(response):
+    """Comprime las respuestas JSON con gzip o deflate si el cliente lo acepta."""
+    if (response.mimetype != "application/json" or response.direct_passthrough
+            or response.status_code < 200 or response.status_code == 204
+            or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    codificacion = request.accept_encodings.best_match(["gzip", "deflate"])
+    cuerpo = response.get_data()
+    if codificacion is None or len(cuerpo) < COMPRESION_MIN_BYTES:
+        return response
+    with medir_span("comprimir_respuesta"):
+        if codificacion == "gzip":
+            comprimido = gzip.compress(cuerpo, compresslevel=COMPRESION_NIVEL)
+        else:
+            comprimido = zlib.compress(cuerpo, COMPRESION_NIVEL)
+    response.set_data(comprimido)
+    response.headers["Content-Encoding"] = codificacion
+    return response
+
+# Cabeceras iniciales de cada archivo Excel
+CABECERAS_REPORTE = [
+    "Fecha", "Código Obra", "Nombre Ingeniero",
+    "Nombre Supervisor", "Actividad Principal",
+    "Supervisor Presente", "Avance Diario",
+    "Incidentes", "Plan Siguiente Día", "Observaciones"
+]
+CABECERAS_BASE_OBRA = ["Fecha", "Código Obra", "Nombre Ingeniero"]
+HOJAS_ITEMS_REPORTE = ["Materiales Usados", "Equipos Usados", "Vehículos Usados", "Personal de Campo"]
+CABECERAS_CHOFERES = [
+    "Fecha", "Nombre del Chofer", "Vehículo", "Placa", "Fecha de Salida",
+    "Hora de Salida", "Ubicación Inicial", "Kilometraje Inicial",
+    "Observaciones Salida", "Fecha de Llegada", "Hora de Retorno",
+    "Ubicación Final", "Kilometraje Final", "Observaciones Llegada"
+]
+CABECERAS_LOGISTICA = [
+    "Fecha", "Solicitante", "Orden de Trabajo", "Cliente",
+    "Producto", "Unidad", "Cantidad", "Stock", "Adquirido",
+    "Saldo", "Observaciones"
+]
+
+def crear_excel_reporte_diario(ruta):
+    """Crea el archivo Excel de reporte diario con sus cinco hojas."""
+    import openpyxl
+    logging.info(f"Creando archivo Excel de reporte diario en: {ruta}")
+    wb = openpyxl.Workbook()
+    ws1 = wb.active
+    ws1.title = "Reporte Principal"
+    ws1.append(CABECERAS_REPORTE)
+    for titulo in HOJAS_ITEMS_REPORTE:
+        ws = wb.create_sheet(title=titulo)
+        ws.append(CABECERAS_BASE_OBRA)
+    wb.save(ruta)
+
+def crear_excel_requerimientos(ruta):
+    """Crea el archivo Excel de requerimientos de obra."""
+    import openpyxl
+    logging.info(f"Creando archivo Excel de requerimientos en: {ruta}")
+    wb_req = openpyxl.Workbook()
+    ws_req = wb_req.active
+    ws_req.title = "Requerimientos"
+    ws_req.append(CABECERAS_BASE_OBRA)
+    wb_req.save(ruta)
+
+def crear_excel_choferes(ruta):
+    """Crea el archivo Excel de registros de choferes."""
+    import openpyxl
+    logging.info(f"Creando archivo Excel de registros de choferes en: {ruta}")
+    wb_choferes = openpyxl.Workbook()
+    ws_choferes = wb_choferes.active
+    ws_choferes.title = "Registros"
+    ws_choferes.append(CABECERAS_CHOFERES)
+    wb_choferes.save(ruta)
+
+def crear_excel_logistica(ruta):
+    """Crea el archivo Excel de requerimientos de logística."""
+    import openpyxl
+    logging.info(f"Creando archivo Excel de logística en: {ruta}")
+    wb_logistica = openpyxl.Workbook()
+    ws_logistica = wb_logistica.active
+    ws_logistica.title = "Requerimientos"
+    for col_num, header in enumerate(CABECERAS_LOGISTICA, 1):
+        ws_logistica.cell(row=1, column=col_num).value = header
+    wb_logistica.save(ruta)
+    logging.info("Archivo Excel de logística creado exitosamente")
+
+def crear_csv_logistica_materiales(ruta):
+    """Crea el CSV de materiales de logística vacío, solo con cabeceras."""
+    logging.info(f"Creando archivo CSV de materiales de logística en: {ruta}")
+    try:
+        import pandas as pd
+        df_materiales_logistica = pd.DataFrame(columns=['material', 'unidad'])
+        df_materiales_logistica.to_csv(ruta, index=False)
+        logging.info("Archivo CSV de materiales de logística creado exitosamente con cabeceras.")
+    except Exception as e:
+        logging.error(f"No se pudo crear el archivo CSV de materiales de logística: {e}")
+
+def crear_directorio(ruta):
+    """Crea un directorio de almacenamiento (fotos, índices)."""
+    os.makedirs(ruta, exist_ok=True)
+    logging.info(f"Directorio creado: {ruta}")
+
+# Archivos de almacenamiento y la función que los crea
+INICIALIZADORES = {
+    EXCEL_FILE: crear_excel_reporte_diario,
+    REQUERIMIENTOS_EXCEL_FILE: crear_excel_requerimientos,
+    REGISTROS_CHOFERES_EXCEL: crear_excel_choferes,
+    LOGISTICA_EXCEL_FILE: crear_excel_logistica,
+    LOGISTICA_MATERIALES_CSV_PATH: crear_csv_logistica_materiales,
+    FOTOS_VEHICULOS_DIR: crear_directorio,
+    FOTOS_BLOBS_DIR: crear_directorio,
+    SUBIDAS_DIR: crear_directorio,
+    INDICES_DIR: crear_directorio,
+}
+_archivos_listos = set()
+_inicializacion_lock = threading.Lock()
+
+# Libros Excel que se dividen en una partición por mes
+LIBROS_PARTICIONADOS = (EXCEL_FILE, REQUERIMIENTOS_EXCEL_FILE, REGISTROS_CHOFERES_EXCEL, LOGISTICA_EXCEL_FILE)
+_PATRON_PARTICION = re.compile(r"^(?P<raiz>.+)_(?P<periodo>\d{4}-\d{2})(?P<ext>\.xlsx)$")
+
+def periodo_actual():
+    """Devuelve el periodo mensual en curso (AAAA-MM)."""
+    return datetime.now().strftime("%Y-%m")
+
+def ruta_particion(ruta_base, periodo=None):
+    """Devuelve la ruta de la partición mensual de un libro (la del mes en curso por defecto)."""
+    if not PARTICIONADO_MENSUAL or ruta_base not in LIBROS_PARTICIONADOS:
+        return ruta_base
+    raiz, ext = os.path.splitext(ruta_base)
+    return f"{raiz}_{periodo or periodo_actual()}{ext}"
+
+def ruta_base_de(ruta):
+    """Devuelve el libro base al que pertenece una ruta de partición."""
+    coincidencia = _PATRON_PARTICION.match(ruta)
+    if coincidencia and coincidencia.group("raiz") + coincidencia.group("ext") in LIBROS_PARTICIONADOS:
+        return coincidencia.group("raiz") + coincidencia.group("ext")
+    return ruta
+
+def listar_particiones(ruta_base):
+    """Lista las particiones existentes de un libro como (periodo, ruta), ordenadas por periodo.
+
+    El libro anterior al particionado, si existe, aparece primero con periodo None.
+    """
+    directorio = os.path.dirname(ruta_base)
+    raiz, ext = os.path.splitext(os.path.basename(ruta_base))
+    particiones = []
+    for nombre in os.listdir(directorio):
+        coincidencia = _PATRON_PARTICION.match(nombre)
+        if coincidencia and coincidencia.group("raiz") == raiz and coincidencia.group("ext") == ext:
+            particiones.append((coincidencia.group("periodo"), os.path.join(directorio, nombre)))
+    particiones.sort()
+    if os.path.exists(ruta_base):
+        particiones.insert(0, (None, ruta_base))
+    return particiones
+
+def parsear_periodo(texto):
+    """Convierte 'AAAA-MM', 'AAAA-MM-DD' o 'DD/MM/AAAA' en un periodo mensual 'AAAA-MM'."""
+    for formato in ("%Y-%m", "%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(texto.strip(), formato).strftime("%Y-%m")
+        except ValueError:
+            continue
+    raise ValueError(f"Periodo no válido: '{texto}'. Use AAAA-MM o AAAA-MM-DD.")
+
+def particiones_en_rango(ruta_base, desde=None, hasta=None):
+    """Devuelve las particiones (periodo, ruta) necesarias para cubrir el rango [desde, hasta].
+
+    Sin rango devuelve todas, igual que la descarga del libro único antes del particionado.
+    """
+    if not PARTICIONADO_MENSUAL:
+        return [(None, asegurar_archivo(ruta_base))]
+    # La partición del mes en curso siempre forma parte de la descarga, aunque aún esté vacía
+    asegurar_archivo(ruta_particion(ruta_base))
+
+    particiones = listar_particiones(ruta_base)
+    primer_periodo = next((p for p, _ in particiones if p is not None), None)
+    seleccionadas = []
+    for periodo, ruta in particiones:
+        if periodo is None:
+            # El libro sin particionar contiene la historia previa a la primera partición
+            if desde is None or primer_periodo is None or desde < primer_periodo:
+                seleccionadas.append((periodo, ruta))
+        elif (desde is None or periodo >= desde) and (hasta is None or periodo <= hasta):
+            seleccionadas.append((periodo, ruta))
+    return seleccionadas
+
+def asegurar_archivo(ruta):
+    """Crea el archivo de almacenamiento la primera vez que se usa; luego no vuelve a consultar el disco."""
+    if ruta in _archivos_listos:
+        return ruta
+    with _inicializacion_lock:
+        if ruta not in _archivos_listos:
+            if not os.path.exists(ruta):
+                INICIALIZADORES[ruta_base_de(ruta)](ruta)
+            _archivos_listos.add(ruta)
+    return ruta
 
-    # Crear directorio de fotos si no existe
-    if not os.path.exists(FOTOS_VEHICULOS_DIR):
-        os.makedirs(FOTOS_VEHICULOS_DIR)
-        logging.info(f"Directorio de fotos creado: {FOTOS_VEHICULOS_DIR}")
+def inicializar_excel():
+    """Inicializa los archivos Excel si no existen."""
+    for ruta_base in INICIALIZADORES:
+        ruta = ruta_particion(ruta_base)
+        if os.path.exists(ruta):
+            logging.info(f"El archivo ya existe en: {ruta}")
+        asegurar_archivo(ruta)
+
+def combinar_particiones(particiones, completar_fila=None):
+    """Combina varias particiones de un libro en un único libro, fila por fila.
+
+    Las hojas con columnas de ítems dinámicas toman la cabecera más ancha, que siempre
+    contiene a las demás porque las cabeceras solo crecen. Si se indica completar_fila,
+    se llama con (periodo, hoja, número de fila, valores) y devuelve los valores a escribir,
+    o None para omitir la fila.
+
+    Las particiones se leen en modo read_only y el libro se genera con sya_exportacion como
+    un flujo de bytes: la respuesta empieza antes de terminar de armarlo y la memoria no
+    crece con el número de filas. Devuelve el generador de esos bytes.
+
+    Si el libro tiene varias hojas y no hay completar_fila, cada hoja se genera antes en un
+    proceso aparte; si eso falla se usa la exportación secuencial.
+    """
+    import openpyxl
+    # Primera pasada: solo las cabeceras, porque en write_only no se puede reescribir una fila
+    cabeceras = {}
+    for _, ruta in particiones:
+        wb = openpyxl.load_workbook(ruta, read_only=True)
+        for ws in wb.worksheets:
+            cabecera = list(next(ws.iter_rows(max_row=1, values_only=True), ()))
+            if len(cabecera) >= len(cabeceras.get(ws.title, ())):
+                cabeceras[ws.title] = cabecera
+        wb.close()
+
+    if completar_fila is None and len(cabeceras) >= sya_exportacion.HOJAS_MINIMAS and sya_exportacion.disponible():
+        try:
+            with medir_span("exportar_en_paralelo"):
+                return sya_exportacion.exportar_libro(cabeceras, particiones, paralelo=True)
+        except Exception as e:
+            logging.exception(f"Error en la exportación en paralelo; se usa la secuencial: {str(e)}")
+            sya_exportacion.reiniciar_ejecutor()
+    return sya_exportacion.exportar_libro(cabeceras, particiones, completar_fila)
+
+def enviar_libro_particionado(ruta_base, nombre_descarga, completar_fila=None, desde=None, cabeceras_de=None):
+    """Envía las particiones de un libro que cubren el rango ?desde=&hasta= de la solicitud.
+
+    Con completar_fila el libro siempre se regenera (ver combinar_particiones). Si se indica
+    desde (un periodo AAAA-MM ya validado), reemplaza al ?desde= de la solicitud. cabeceras_de,
+    si se indica, recibe las particiones elegidas y devuelve cabeceras extra de la respuesta
+    (el libro se envía por flujo, así que no se pueden agregar después).
+    """
+    try:
+        if desde is None and request.args.get('desde'):
+            desde = parsear_periodo(request.args['desde'])
+        hasta = parsear_periodo(request.args['hasta']) if request.args.get('hasta') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    particiones = particiones_en_rango(ruta_base, desde, hasta)
+    if not particiones:
+        return jsonify({"error": "No hay datos para el rango solicitado"}), 404
+
+    raiz, ext = os.path.splitext(nombre_descarga)
+    if len(particiones) == 1 and completar_fila is None:
+        periodo, ruta = particiones[0]
+        # Las particiones de meses cerrados ya no cambian y pueden cachearse
+        cerrada = periodo is not None and periodo < periodo_actual()
+        return send_file(
+            ruta, as_attachment=True,
+            download_name=f"{raiz}_{periodo}{ext}" if periodo else nombre_descarga,
+            max_age=CACHE_PARTICION_CERRADA_SEGUNDOS if cerrada else None
+        )
+
+    periodos = [p for p, _ in particiones if p is not None]
+    sufijo = f"_{periodos[0]}_{periodos[-1]}" if periodos else ""
+    with medir_span("combinar_particiones"):
+        flujo = combinar_particiones(particiones, completar_fila)
+    # El tamaño final no se conoce: la respuesta va por partes (chunked) a medida que se genera
+    respuesta = Response(flujo, mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    respuesta.headers.set("Content-Disposition", "attachment", filename=f"{raiz}{sufijo}{ext}")
+    if cabeceras_de:
+        respuesta.headers.update(cabeceras_de(particiones))
+    return respuesta
 
 def actualizar_cabeceras_materiales(ws, num_materiales):
     """Actualiza las cabeceras de la hoja de materiales."""
@@ -257,10 +733,1173 @@ def actualizar_cabeceras_requerimientos(ws, num_items):
         num_headers_actuales += 3
 
 
+# Índice de reportes diarios para consultas filtradas sin leer el Excel
+CAMPOS_ITEMS_REPORTE = {
+    "Materiales Usados": ("Material", "Unidad", "Cantidad"),
+    "Equipos Usados": ("Equipo", "Cantidad", "Propiedad"),
+    "Vehículos Usados": ("Vehículo", "Placa", "Propiedad"),
+    "Personal de Campo": ("Personal", "Categoría", "Horas extras"),
+}
+ALIAS_HOJAS_REPORTE = {
+    "principal": "Reporte Principal",
+    "materiales": "Materiales Usados",
+    "equipos": "Equipos Usados",
+    "vehiculos": "Vehículos Usados",
+    "personal": "Personal de Campo",
+}
+
+def _fecha_iso(valor, estricto=False):
+    """Convierte una fecha de Excel o del formulario a texto AAAA-MM-DD.
+
+    Un texto que no es una fecha se devuelve tal cual, salvo con estricto (parámetros de
+    consulta), en cuyo caso se lanza ValueError.
+    """
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    if isinstance(valor, str) and valor:
+        for formato in ("%d/%m/%Y", "%Y-%m-%d", "%Y/%m/%d"):
+            try:
+                return datetime.strptime(valor, formato).date().isoformat()
+            except ValueError:
+                continue
+    if estricto:
+        raise ValueError(f"Fecha no válida: '{valor}'. Use AAAA-MM-DD o DD/MM/AAAA.")
+    return str(valor) if valor is not None else ""
+
+def _valor_json(valor):
+    """Convierte un valor de celda a un tipo serializable en JSON (Excel guarda '' como celda vacía)."""
+    if isinstance(valor, datetime) or hasattr(valor, 'isoformat'):
+        return _fecha_iso(valor)
+    return None if valor == "" else valor
+
+def entrada_reporte(fila_reporte, filas_items):
+    """Arma la entrada del índice de un reporte a partir de sus filas en las cinco hojas.
+
+    filas_items contiene, en el orden de HOJAS_ITEMS_REPORTE, las filas con las tres
+    columnas base seguidas de los ítems en grupos de tres columnas.
+    """
+    principal = {cabecera: _valor_json(valor) for cabecera, valor in zip(CABECERAS_REPORTE, fila_reporte)}
+    hojas = {"Reporte Principal": principal}
+    for titulo, fila in zip(HOJAS_ITEMS_REPORTE, filas_items):
+        campos = CAMPOS_ITEMS_REPORTE[titulo]
+        valores = list(fila[len(CABECERAS_BASE_OBRA):]) if fila else []
+        items = []
+        for i in range(0, len(valores) - 2, 3):
+            grupo = valores[i:i + 3]
+            if any(v is not None and v != "" for v in grupo):
+                items.append({campo: _valor_json(v) for campo, v in zip(campos, grupo)})
+        hojas[titulo] = items
+    return {
+        "fecha": _fecha_iso(fila_reporte[0]),
+        "codigo_obra": str(fila_reporte[1] or ""),
+        "ingeniero": str(fila_reporte[2] or ""),
+        "hojas": hojas
+    }
+
+def _entero_de_consulta(nombre, defecto, minimo):
+    """Lee un parámetro entero de la consulta; lanza ValueError con un mensaje para el cliente."""
+    valor = request.args.get(nombre, '').strip()
+    if not valor:
+        return defecto
+    if not re.fullmatch(r'\d+', valor) or int(valor) < minimo:
+        raise ValueError(f"'{nombre}' debe ser un número entero mayor o igual a {minimo} (se recibió '{valor}').")
+    return int(valor)
+
+def leer_paginacion(limite_defecto=100, limite_maximo=1000):
+    """Lee ?limite=&cursor= de la solicitud; el cursor es la posición del primer resultado."""
+    limite = _entero_de_consulta('limite', limite_defecto, 1)
+    cursor = _entero_de_consulta('cursor', 0, 0)
+    return min(limite, limite_maximo), cursor
+
+def escribir_json_atomico(ruta, datos):
+    """Escribe un archivo JSON reemplazándolo de forma atómica."""
+    ruta_tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(ruta_tmp, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+    os.replace(ruta_tmp, ruta)
+
+class AlmacenIdempotencia:
+    """Respuestas ya enviadas por clave Idempotency-Key, en SQLite (compartido entre procesos).
+
+    Cada clave pasa por dos estados: en curso (reservada mientras se procesa) y completada
+    (con la respuesta guardada). Las claves vencen a las IDEMPOTENCIA_TTL_HORAS y, si se supera
+    IDEMPOTENCIA_MAX_CLAVES, se descartan las usadas hace más tiempo.
+    """
+    def __init__(self, ruta, max_claves, ttl_segundos, en_curso_segundos):
+        self.ruta = ruta
+        self.max_claves = max_claves
+        self.ttl_segundos = ttl_segundos
+        self.en_curso_segundos = en_curso_segundos
+        self._lock = threading.Lock()
+        self._preparado = False
+        self._altas = 0
+
+    @contextmanager
+    def _conexion(self):
+        conexion = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+        try:
+            if not self._preparado:
+                with self._lock:
+                    conexion.execute("PRAGMA journal_mode=WAL")
+                    conexion.execute(
+                        "CREATE TABLE IF NOT EXISTS respuestas ("
+                        "clave TEXT PRIMARY KEY, huella TEXT NOT NULL, completada INTEGER NOT NULL DEFAULT 0,"
+                        "codigo INTEGER, tipo TEXT, cuerpo BLOB, creada REAL NOT NULL, usada REAL NOT NULL)"
+                    )
+                    conexion.execute("CREATE INDEX IF NOT EXISTS respuestas_usada ON respuestas (usada)")
+                    self._preparado = True
+            yield conexion
+        finally:
+            conexion.close()
+
+    def reservar(self, clave, huella):
+        """Reserva la clave para procesarla.
+
+        Devuelve ("nueva", None), ("repetida", (codigo, tipo, cuerpo)), ("en_curso", None)
+        o ("distinta", None) si la clave ya se usó con otro contenido.
+        """
+        ahora = time.time()
+        with self._conexion() as conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                fila = conexion.execute(
+                    "SELECT huella, completada, codigo, tipo, cuerpo, creada FROM respuestas WHERE clave = ?", (clave,)
+                ).fetchone()
+                vencida = fila is not None and (
+                    fila[5] < ahora - self.ttl_segundos
+                    or (not fila[1] and fila[5] < ahora - self.en_curso_segundos)
+                )
+                if fila is None or vencida:
+                    conexion.execute(
+                        "INSERT OR REPLACE INTO respuestas (clave, huella, creada, usada) VALUES (?, ?, ?, ?)",
+                        (clave, huella, ahora, ahora)
+                    )
+                    resultado = ("nueva", None)
+                elif fila[0] != huella:
+                    resultado = ("distinta", None)
+                elif not fila[1]:
+                    resultado = ("en_curso", None)
+                else:
+                    conexion.execute("UPDATE respuestas SET usada = ? WHERE clave = ?", (ahora, clave))
+                    resultado = ("repetida", (fila[2], fila[3], fila[4]))
+                conexion.execute("COMMIT")
+            except Exception:
+                conexion.execute("ROLLBACK")
+                raise
+        if resultado[0] == "nueva":
+            self._purgar_cada_tanto()
+        return resultado
+
+    def completar(self, clave, codigo, tipo, cuerpo):
+        """Guarda la respuesta enviada para la clave."""
+        with self._conexion() as conexion:
+            conexion.execute(
+                "UPDATE respuestas SET completada = 1, codigo = ?, tipo = ?, cuerpo = ?, usada = ? WHERE clave = ?",
+                (codigo, tipo, cuerpo, time.time(), clave)
+            )
+
+    def liberar(self, clave):
+        """Libera una clave cuyo procesamiento falló, para que el reintento vuelva a procesarla."""
+        with self._conexion() as conexion:
+            conexion.execute("DELETE FROM respuestas WHERE clave = ? AND completada = 0", (clave,))
+
+    def _purgar_cada_tanto(self):
+        with self._lock:
+            self._altas += 1
+            if self._altas % IDEMPOTENCIA_PURGA_CADA:
+                return
+        self.purgar()
+
+    def purgar(self):
+        """Elimina las claves vencidas y, si sobran, las usadas hace más tiempo."""
+        with self._conexion() as conexion:
+            conexion.execute("DELETE FROM respuestas WHERE creada < ?", (time.time() - self.ttl_segundos,))
+            conexion.execute(
+                "DELETE FROM respuestas WHERE clave IN ("
+                "SELECT clave FROM respuestas ORDER BY usada DESC LIMIT -1 OFFSET ?)",
+                (self.max_claves,)
+            )
+
+almacen_idempotencia = AlmacenIdempotencia(
+    IDEMPOTENCIA_FILE, IDEMPOTENCIA_MAX_CLAVES, IDEMPOTENCIA_TTL_HORAS * 3600, IDEMPOTENCIA_EN_CURSO_SEGUNDOS
+)
+
+def huella_solicitud():
+    """Resume el contenido de la solicitud para detectar una clave reutilizada con otros datos.
+
+    En formularios multipart se usan los campos y el nombre y contenido de cada archivo; las
+    fotos se leen por bloques para no cargarlas enteras en memoria.
+    """
+    resumen = hashlib.sha256()
+    if request.mimetype == "multipart/form-data":
+        for campo, valor in sorted(request.form.items(multi=True)):
+            resumen.update(f"{campo}={valor}\n".encode("utf-8"))
+        for campo, archivo in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            resumen.update(f"{campo}:{archivo.filename}:".encode("utf-8"))
+            for bloque in iter(lambda: archivo.stream.read(1024 * 1024), b""):
+                resumen.update(bloque)
+            resumen.update(b"\n")
+            archivo.stream.seek(0)
+    else:
+        resumen.update(request.get_data())
+    return resumen.hexdigest()
+
+def idempotente(vista):
+    """Hace que una ruta de envío respete la cabecera Idempotency-Key.
+
+    Un reintento con la misma clave devuelve la respuesta original sin volver a escribir nada;
+    mientras el primer intento se procesa responde 409. Las respuestas 5xx y 429 no se guardan,
+    así el cliente puede reintentar un error o una saturación del servidor.
+    """
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        clave = request.headers.get("Idempotency-Key", "").strip()
+        if not clave:
+            return vista(*args, **kwargs)
+        if len(clave) > 200:
+            return jsonify({"error": "Idempotency-Key demasiado larga (máximo 200 caracteres)"}), 400
+
+        clave = f"{request.path}|{clave}"
+        asegurar_archivo(INDICES_DIR)
+        with medir_span("reservar_idempotencia"):
+            estado, guardada = almacen_idempotencia.reservar(clave, huella_solicitud())
+        if estado == "repetida":
+            codigo, tipo, cuerpo = guardada
+            logging.info(f"Solicitud repetida con Idempotency-Key; se devuelve la respuesta original ({codigo})")
+            respuesta = Response(cuerpo, status=codigo, mimetype=tipo)
+            respuesta.headers["Idempotency-Replayed"] = "true"
+            return respuesta
+        if estado == "en_curso":
+            respuesta = jsonify({"error": "La solicitud con esta Idempotency-Key aún se está procesando"})
+            respuesta.status_code = 409
+            respuesta.headers["Retry-After"] = "1"
+            return respuesta
+        if estado == "distinta":
+            return jsonify({"error": "Idempotency-Key ya usada con un contenido diferente"}), 422
+
+        try:
+            respuesta = app.make_response(vista(*args, **kwargs))
+        except Exception:
+            almacen_idempotencia.liberar(clave)
+            raise
+        if respuesta.status_code >= 500 or respuesta.status_code == 429:
+            almacen_idempotencia.liberar(clave)
+        else:
+            almacen_idempotencia.completar(clave, respuesta.status_code, respuesta.mimetype, respuesta.get_data())
+        return respuesta
+    return envoltura
+
+def leer_limites_admision(texto, defecto):
+    """Lee límites "recurso=concurrencia:cola,..." (p. ej. SYA_ADMISION="choferes=2:30") sobre los valores por defecto."""
+    limites = dict(defecto)
+    for parte in filter(None, (p.strip() for p in (texto or "").split(","))):
+        recurso, _, valores = parte.partition("=")
+        concurrencia, _, cola = valores.partition(":")
+        limites[recurso.strip()] = (int(concurrencia), int(cola or limites.get(recurso.strip(), (0, 0))[1]))
+    return limites
+
+class LimiteRecurso:
+    """Limita cuántas solicitudes usan un recurso a la vez y cuántas pueden esperar su turno.
+
+    Si la cola está llena, o la espera supera ADMISION_ESPERA_MAX_SEGUNDOS, la solicitud se
+    rechaza de inmediato en lugar de sumarse a la contención sobre el mismo archivo.
+    """
+    def __init__(self, nombre, concurrencia, cola_max):
+        self.nombre = nombre
+        self.concurrencia = concurrencia
+        self.cola_max = cola_max
+        self._semaforo = threading.BoundedSemaphore(concurrencia)
+        self._lock = threading.Lock()
+        self.en_curso = 0
+        self.esperando = 0
+        self.atendidas = 0
+        self.rechazadas = 0
+        self.duracion_media = 1.0  # Segundos, media móvil exponencial
+
+    def entrar(self, espera_max):
+        """Ocupa un lugar; devuelve False si hay que rechazar la solicitud."""
+        if not self._semaforo.acquire(blocking=False):
+            with self._lock:
+                if self.esperando >= self.cola_max:
+                    self.rechazadas += 1
+                    return False
+                self.esperando += 1
+            obtenido = self._semaforo.acquire(timeout=espera_max)
+            with self._lock:
+                self.esperando -= 1
+                if not obtenido:
+                    self.rechazadas += 1
+                    return False
+        with self._lock:
+            self.en_curso += 1
+        return True
+
+    def salir(self, duracion):
+        with self._lock:
+            self.en_curso -= 1
+            self.atendidas += 1
+            self.duracion_media = 0.8 * self.duracion_media + 0.2 * duracion
+        self._semaforo.release()
+
+    def segundos_reintento(self):
+        """Estimación de cuándo habrá lugar, para la cabecera Retry-After."""
+        with self._lock:
+            return max(1, math.ceil(self.duracion_media * (self.esperando + 1) / self.concurrencia))
+
+    def estado(self):
+        with self._lock:
+            return {
+                "concurrencia": self.concurrencia, "en_curso": self.en_curso,
+                "esperando": self.esperando, "cola_max": self.cola_max,
+                "atendidas": self.atendidas, "rechazadas": self.rechazadas,
+                "duracion_media_ms": round(self.duracion_media * 1000, 1)
+            }
+
+limites_admision = {
+    recurso: LimiteRecurso(recurso, concurrencia, cola)
+    for recurso, (concurrencia, cola) in leer_limites_admision(
+        os.environ.get("SYA_ADMISION"), ADMISION_LIMITES_DEFECTO).items()
+}
+
+def admitir(recurso):
+    """Aplica el límite de concurrencia y la cola de espera del recurso a una ruta de escritura."""
+    limite = limites_admision[recurso]
+
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            with medir_span(f"admision_{recurso}"):
+                admitida = limite.entrar(ADMISION_ESPERA_MAX_SEGUNDOS)
+            if not admitida:
+                reintento = limite.segundos_reintento()
+                logging.warning(f"Solicitud rechazada por saturación de {recurso}; reintentar en {reintento} s")
+                respuesta = jsonify({"error": "Servidor ocupado; reintente en unos segundos", "recurso": recurso})
+                respuesta.status_code = 429
+                respuesta.headers["Retry-After"] = str(reintento)
+                return respuesta
+            inicio = time.perf_counter()
+            try:
+                return vista(*args, **kwargs)
+            finally:
+                limite.salir(time.perf_counter() - inicio)
+        return envoltura
+    return decorador
+
+class RegistroJSONL:
+    """Registro de solo anexado en un archivo JSONL, compartido entre procesos.
+
+    Cada proceso mantiene las entradas en memoria y, antes de cada operación, lee solo
+    las líneas que otros procesos hayan anexado desde la última lectura. Las subclases
+    definen cómo indexar cada entrada y cómo regenerar el registro desde sus datos de origen.
+    """
+    # True si el origen ya incluye lo que se anexa: si el archivo aún no existe, agregar lo
+    # reconstruye en lugar de anexar (las entradas nuevas saldrían dos veces)
+    reconstruir_si_falta = False
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.RLock()
+        self._cargado = False
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self.entradas = []
+        self._offset = 0
+        self._inodo = None
+
+    def _indexar(self, entrada):
+        self.entradas.append(entrada)
+
+    def _generar_entradas(self):
+        """Genera las entradas a partir de los datos de origen (sin origen: registro vacío)."""
+        return iter(())
+
+    def _sincronizar(self):
+        """Carga las líneas del archivo que aún no están en memoria."""
+        if not os.path.exists(self.ruta):
+            if not self._cargado:
+                self.reconstruir()
+            return
+        estado = os.stat(self.ruta)
+        if self._inodo != estado.st_ino or estado.st_size < self._offset:
+            self._reiniciar()
+            self._inodo = estado.st_ino
+        if estado.st_size == self._offset:
+            return
+        with open(self.ruta, 'rb') as f:
+            f.seek(self._offset)
+            for linea in f:
+                if not linea.endswith(b"\n"):
+                    break  # Línea aún en escritura por otro proceso
+                self._offset += len(linea)
+                self._indexar(json.loads(linea))
+        self._cargado = True
+
+    def agregar(self, *entradas):
+        """Anexa entradas que ya fueron guardadas en el Excel de origen."""
+        with self._lock:
+            if self.reconstruir_si_falta and not self._cargado and not os.path.exists(self.ruta):
+                # La reconstrucción lee el origen ya guardado, que incluye estas entradas
+                self.reconstruir()
+                return
+            self._sincronizar()
+            with open(self.ruta, 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(e, ensure_ascii=False, default=str) + "\n" for e in entradas))
+            self._sincronizar()
+
+    def entradas_desde(self, posicion):
+        """Devuelve las entradas a partir de una posición y el identificador del archivo."""
+        with self._lock:
+            self._sincronizar()
+            return self.entradas[posicion:], self._inodo
+
+    def estado(self):
+        """Devuelve el identificador del archivo y la cantidad de entradas, sin copiarlas."""
+        with self._lock:
+            self._sincronizar()
+            return self._inodo, len(self.entradas)
+
+    def reconstruir(self):
+        """Regenera el archivo completo a partir de los datos de origen."""
+        with self._lock:
+            total = self._reescribir(self._generar_entradas())
+            logging.info(f"Registro {os.path.basename(self.ruta)} reconstruido con {total} entradas")
+            return total
+
+    def _reescribir(self, entradas):
+        """Reemplaza el archivo de forma atómica por las entradas dadas y lo vuelve a cargar."""
+        with self._lock:
+            asegurar_archivo(INDICES_DIR)
+            ruta_tmp = f"{self.ruta}.{os.getpid()}.tmp"
+            total = 0
+            with open(ruta_tmp, 'w', encoding='utf-8') as f:
+                for entrada in entradas:
+                    f.write(json.dumps(entrada, ensure_ascii=False, default=str) + "\n")
+                    total += 1
+            os.replace(ruta_tmp, self.ruta)
+            self._reiniciar()
+            self._cargado = True
+            self._sincronizar()
+            return total
+
+class IndiceReportes(RegistroJSONL):
+    """Índice por fecha y código de obra de los reportes diarios.
+
+    Mantiene en memoria listas ordenadas por (fecha, posición) para responder con
+    búsqueda binaria, global y por código de obra.
+    """
+    reconstruir_si_falta = True
+
+    def _reiniciar(self):
+        super()._reiniciar()
+        self._por_fecha = []
+        self._por_obra = {}
+
+    def _indexar(self, entrada):
+        posicion = len(self.entradas)
+        super()._indexar(entrada)
+        clave = (entrada["fecha"], posicion)
+        bisect.insort(self._por_fecha, clave)
+        bisect.insort(self._por_obra.setdefault(entrada["codigo_obra"].upper(), []), clave)
+
+    def _generar_entradas(self):
+        """Lee todas las particiones del Excel de reportes."""
+        import openpyxl
+        for _, ruta_libro in listar_particiones(EXCEL_FILE):
+            wb = openpyxl.load_workbook(ruta_libro, read_only=True)
+            filas_hojas = [wb[titulo].iter_rows(min_row=2, values_only=True)
+                           for titulo in ["Reporte Principal"] + HOJAS_ITEMS_REPORTE]
+            # Cada reporte agrega una fila en cada hoja, por lo que las filas están alineadas
+            for fila_reporte, *filas_items in zip(*filas_hojas):
+                if fila_reporte[0] is not None:
+                    yield entrada_reporte(fila_reporte, filas_items)
+            wb.close()
+
+    def consultar(self, codigo_obra=None, ingeniero=None, desde=None, hasta=None):
+        """Devuelve las entradas que cumplen los filtros, ordenadas por fecha."""
+        with self._lock:
+            self._sincronizar()
+            claves = self._por_obra.get(codigo_obra.upper(), []) if codigo_obra else self._por_fecha
+            inicio = bisect.bisect_left(claves, (desde, -1)) if desde else 0
+            fin = bisect.bisect_right(claves, (hasta, float('inf'))) if hasta else len(claves)
+            entradas = [self.entradas[posicion] for _, posicion in claves[inicio:fin]]
+        if ingeniero:
+            buscado = ingeniero.casefold()
+            entradas = [e for e in entradas if buscado in e["ingeniero"].casefold()]
+        return entradas
+
+indice_reportes = IndiceReportes(INDICE_REPORTES_FILE)
+
+def a_numero(valor):
+    """Convierte una cantidad del formulario a número; lo no numérico cuenta como 0."""
+    try:
+        return float(str(valor).replace(",", ".")) if valor not in (None, "") else 0.0
+    except ValueError:
+        return 0.0
+
+class AgregadosIncrementales(abc.ABC):
+    """Totales mantenidos de forma incremental sobre un RegistroJSONL.
+
+    Se aplican solo las entradas del registro posteriores a la última procesada, y el estado
+    se guarda en disco con esa posición para no recorrer la historia al reiniciar. Cada
+    subclase define GRUPOS y cómo suma una entrada en _aplicar.
+    """
+    GRUPOS = ()
+
+    def __init__(self, ruta, indice):
+        self.ruta = ruta
+        self.indice = indice
+        self._lock = threading.Lock()
+        self._estado = None
+
+    def _estado_vacio(self, inodo=None):
+        return {"posicion": 0, "indice_inodo": inodo, **{grupo: {} for grupo in self.GRUPOS}}
+
+    @abc.abstractmethod
+    def _aplicar(self, entrada):
+        """Suma una entrada del registro a los grupos de self._estado."""
+
+    def _cargar(self):
+        if self._estado is None:
+            try:
+                with open(self.ruta, encoding='utf-8') as f:
+                    self._estado = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._estado = self._estado_vacio()
+
+    def actualizar(self):
+        """Aplica las entradas del registro que aún no forman parte de los totales."""
+        with self._lock:
+            self._cargar()
+            inodo, total = self.indice.estado()
+            if self._estado["indice_inodo"] != inodo or self._estado["posicion"] > total:
+                # El registro fue reconstruido: se vuelve a calcular desde cero
+                self._estado = self._estado_vacio(inodo)
+            if self._estado["posicion"] == total:
+                return
+            # Solo se copian las entradas nuevas; si el registro se reconstruyó entre
+            # estado() y esta lectura, el inodo cambia y se recalcula en la próxima llamada
+            nuevas, inodo_leido = self.indice.entradas_desde(self._estado["posicion"])
+            if inodo_leido != inodo:
+                return
+            for entrada in nuevas:
+                self._aplicar(entrada)
+            self._estado["posicion"] += len(nuevas)
+            asegurar_archivo(INDICES_DIR)
+            escribir_json_atomico(self.ruta, self._estado)
+
+    def reconstruir(self):
+        """Recalcula todos los totales a partir del registro."""
+        with self._lock:
+            self._estado = self._estado_vacio()
+        self.actualizar()
+        return self._estado["posicion"]
+
+class AgregadosObra(AgregadosIncrementales):
+    """Totales de consumo por obra mantenidos de forma incremental sobre el índice de reportes."""
+    GRUPOS = ("materiales", "equipos", "vehiculos", "horas_extras")
+
+    def _aplicar(self, entrada):
+        obra = entrada["codigo_obra"].upper()
+        hojas = entrada["hojas"]
+        materiales = self._estado["materiales"].setdefault(obra, {})
+        for item in hojas.get("Materiales Usados", []):
+            clave = f"{item.get('Material')}|{item.get('Unidad')}".upper()
+            total = materiales.setdefault(clave, {"material": item.get("Material"), "unidad": item.get("Unidad"), "cantidad": 0.0})
+            total["cantidad"] += a_numero(item.get("Cantidad"))
+        equipos = self._estado["equipos"].setdefault(obra, {})
+        for item in hojas.get("Equipos Usados", []):
+            clave = str(item.get("Equipo")).upper()
+            total = equipos.setdefault(clave, {"equipo": item.get("Equipo"), "equipo_dias": 0.0, "reportes": 0})
+            total["equipo_dias"] += a_numero(item.get("Cantidad")) or 1.0
+            total["reportes"] += 1
+        vehiculos = self._estado["vehiculos"].setdefault(obra, {})
+        for item in hojas.get("Vehículos Usados", []):
+            clave = f"{item.get('Vehículo')}|{item.get('Placa')}".upper()
+            total = vehiculos.setdefault(clave, {"vehiculo": item.get("Vehículo"), "placa": item.get("Placa"), "dias": 0})
+            total["dias"] += 1
+        horas_mes = self._estado["horas_extras"].setdefault(entrada["fecha"][:7], {})
+        for item in hojas.get("Personal de Campo", []):
+            clave = str(item.get("Personal")).upper()
+            total = horas_mes.setdefault(clave, {"trabajador": item.get("Personal"), "categoria": item.get("Categoría"), "horas_extras": 0.0})
+            total["horas_extras"] += a_numero(item.get("Horas extras"))
+
+    def consultar(self, tipo, clave=None):
+        """Devuelve los totales de un tipo para una obra (o un mes, en horas extras)."""
+        self.actualizar()
+        with self._lock:
+            grupos = self._estado[tipo]
+            if clave is not None:
+                return list(grupos.get(clave.upper() if tipo != "horas_extras" else clave, {}).values())
+            return {k: list(v.values()) for k, v in grupos.items()}
+
+agregados_obra = AgregadosObra(AGREGADOS_OBRA_FILE, indice_reportes)
+
+# Motor de saldos de logística (Stock, Adquirido, Saldo y costos por línea y por orden)
+def linea_logistica(periodo, fila, valores):
+    """Arma la entrada de una línea de requerimiento a partir de los valores de su fila en el Excel."""
+    fecha, solicitante, orden_trabajo, cliente, producto, unidad, cantidad = (list(valores) + [None] * 7)[:7]
+    return {
+        "periodo": periodo, "fila": fila, "fecha": _valor_json(fecha),
+        "solicitante": solicitante, "orden_trabajo": orden_trabajo, "cliente": cliente,
+        "producto": producto, "unidad": unidad, "cantidad": a_numero(cantidad)
+    }
+
+class LineasLogistica(RegistroJSONL):
+    """Registro de las líneas de requerimientos de logística en orden de llegada."""
+    reconstruir_si_falta = True
+
+    def _generar_entradas(self):
+        """Lee todas las particiones del Excel de logística."""
+        import openpyxl
+        for periodo, ruta_libro in listar_particiones(LOGISTICA_EXCEL_FILE):
+            wb = openpyxl.load_workbook(ruta_libro, read_only=True)
+            for fila, valores in enumerate(wb["Requerimientos"].iter_rows(min_row=2, max_col=7, values_only=True), 2):
+                if any(v is not None for v in valores):
+                    yield linea_logistica(periodo, fila, valores)
+            wb.close()
+
+def clave_producto(producto, unidad):
+    """Clave normalizada de un producto para cruzar requerimientos, catálogo y adquisiciones."""
+    return f"{str(producto or '').strip().upper()}|{str(unidad or '').strip().upper()}"
+
+class MotorSaldos:
+    """Calcula Stock, Adquirido y Saldo de cada línea de requerimiento.
+
+    El stock del catálogo y lo adquirido se asignan a las líneas de cada producto en orden
+    de llegada (la primera línea pendiente se atiende primero). El cálculo es vectorizado
+    con pandas y se reutiliza mientras no cambien las líneas, las adquisiciones ni el catálogo;
+    si solo se anexaron entradas, se reasignan únicamente los productos que aparecen en ellas.
+    """
+    COLUMNAS_LINEA = ["periodo", "fila", "fecha", "solicitante", "orden_trabajo", "cliente", "producto", "unidad", "cantidad"]
+
+    def __init__(self, lineas, adquisiciones):
+        self.lineas = lineas
+        self.adquisiciones = adquisiciones
+        self._lock = threading.RLock()
+        self._version = None
+        self._resultado = None
+        self._lineas = None  # Líneas ya leídas del registro, con su clave de producto
+        self._adquirido = None  # Total adquirido por clave de producto
+
+    def calcular(self):
+        """Devuelve el DataFrame de líneas con sus saldos, recalculando solo si algo cambió."""
+        import pandas as pd
+        with self._lock:
+            version = self.version()
+            if version == self._version:
+                return self._resultado
+            anterior = self._version
+            if (anterior is None or anterior[0] != version[0] or anterior[2] != version[2]
+                    or anterior[4] != version[4] or anterior[1] > version[1] or anterior[3] > version[3]):
+                # Registro reconstruido o catálogo modificado: se recalcula todo
+                anterior = (None, 0, None, 0, None)
+                self._lineas = self._marco_lineas([], 0)
+                self._adquirido = pd.Series(dtype=float)
+
+            lineas, inodo_lineas = self.lineas.entradas_desde(anterior[1])
+            adquisiciones, inodo_adq = self.adquisiciones.entradas_desde(anterior[3])
+            if inodo_lineas != version[0] or inodo_adq != version[2]:
+                # Se reconstruyó un registro entre la consulta de la versión y la lectura
+                self._version = None
+                return self.calcular()
+
+            nuevas = self._marco_lineas(lineas, anterior[1])
+            adquirido_nuevo = self._adquirido_por_clave(adquisiciones)
+            self._lineas = pd.concat([self._lineas, nuevas]) if len(self._lineas) else nuevas
+            self._adquirido = self._adquirido.add(adquirido_nuevo, fill_value=0)
+
+            if anterior[0] is None:
+                self._resultado = self._asignar(self._lineas)
+            else:
+                afectadas = set(nuevas['clave']) | set(adquirido_nuevo.index)
+                recalculadas = self._asignar(self._lineas[self._lineas['clave'].isin(afectadas)])
+                conservadas = self._resultado[~self._resultado['clave'].isin(afectadas)]
+                self._resultado = pd.concat([conservadas, recalculadas]).sort_index()
+            self._version = (inodo_lineas, anterior[1] + len(lineas), inodo_adq,
+                             anterior[3] + len(adquisiciones), version[4])
+            return self._resultado
+
+    def _marco_lineas(self, lineas, inicio):
+        """Arma el DataFrame de líneas indexado por su posición en el registro."""
+        import pandas as pd
+        df = pd.DataFrame(lineas, columns=self.COLUMNAS_LINEA, index=pd.RangeIndex(inicio, inicio + len(lineas)))
+        df['clave'] = [clave_producto(p, u) for p, u in zip(df['producto'], df['unidad'])]
+        df['cantidad'] = pd.to_numeric(df['cantidad'], errors='coerce').fillna(0)
+        return df
+
+    @staticmethod
+    def _adquirido_por_clave(adquisiciones):
+        import pandas as pd
+        df_adq = pd.DataFrame(adquisiciones, columns=["producto", "unidad", "cantidad"])
+        df_adq['clave'] = [clave_producto(p, u) for p, u in zip(df_adq['producto'], df_adq['unidad'])]
+        df_adq['cantidad'] = pd.to_numeric(df_adq['cantidad'], errors='coerce').fillna(0)
+        return df_adq.groupby('clave')['cantidad'].sum()
+
+    def _asignar(self, df):
+        """Calcula Stock, Adquirido y Saldo de las líneas dadas (todas las de cada producto incluido)."""
+        df_cat = obtener_catalogo_logistica().por_clave.set_index('clave')
+        df = df.join(df_cat, on='clave')
+        df['adquirido_total'] = df['clave'].map(self._adquirido)
+        df['en_catalogo'] = df['stock_total'].notna()
+        df[['stock_total', 'costo_unitario', 'adquirido_total']] = df[['stock_total', 'costo_unitario', 'adquirido_total']].fillna(0)
+
+        # Asignación en orden de llegada: cada línea recibe lo que quede después de las anteriores
+        por_producto = df.groupby('clave', sort=False)
+        demanda_previa = por_producto['cantidad'].cumsum() - df['cantidad']
+        df['stock'] = (df['stock_total'] - demanda_previa).clip(lower=0).clip(upper=df['cantidad'])
+        restante = df['cantidad'] - df['stock']
+        restante_previo = restante.groupby(df['clave'], sort=False).cumsum() - restante
+        df['adquirido'] = (df['adquirido_total'] - restante_previo).clip(lower=0).clip(upper=restante)
+        df['saldo'] = restante - df['adquirido']
+        df['costo_total'] = df['cantidad'] * df['costo_unitario']
+        df['costo_pendiente'] = df['saldo'] * df['costo_unitario']
+        df['observaciones'] = 'Pendiente'
+        df.loc[df['saldo'] <= 0, 'observaciones'] = 'Atendido'
+        df.loc[~df['en_catalogo'], 'observaciones'] = 'No figura en el catálogo'
+
+        return df.drop(columns=['stock_total', 'adquirido_total', 'en_catalogo'])
+
+    def version(self):
+        """Versión de los datos de entrada, en el mismo formato que usa calcular, sin recalcular."""
+        ruta_catalogo = asegurar_archivo(LOGISTICA_MATERIALES_CSV_PATH)
+        return self.lineas.estado() + self.adquisiciones.estado() + (os.stat(ruta_catalogo).st_mtime_ns,)
+
+    def calcular_con_version(self):
+        """Devuelve el resultado de calcular junto con la versión de los datos que lo produjeron."""
+        with self._lock:
+            return self.calcular(), self._version
+
+    def primer_periodo_pendiente(self):
+        """Periodo de la línea más antigua con saldo pendiente, o el mes en curso si no hay ninguna.
+
+        Si esa línea está en el libro sin particionar devuelve PERIODO_INICIAL.
+        """
+        df = self.calcular()
+        pendientes = df.loc[df['saldo'] > 0, 'periodo']
+        if pendientes.empty:
+            return periodo_actual()
+        return min(periodo_actual(), pendientes.fillna(PERIODO_INICIAL).min())
+
+    @staticmethod
+    def por_fila(df):
+        """Indexa un resultado de calcular para el Excel exportado.
+
+        Devuelve {(periodo, fila): (posición en el registro, (stock, adquirido, saldo, observaciones))}.
+        """
+        return {
+            (periodo, fila): (posicion, (stock, adquirido, saldo, observaciones))
+            for posicion, periodo, fila, stock, adquirido, saldo, observaciones in zip(
+                df.index, df['periodo'], df['fila'], df['stock'], df['adquirido'], df['saldo'], df['observaciones'])
+        }
+
+def describir_version_logistica(version):
+    """Resume una versión de MotorSaldos para los clientes que sincronizan el libro de logística.
+
+    Las líneas solo se anexan y la asignación es en orden de llegada, así que mientras no
+    cambien el registro ni los saldos basta con pedir las líneas a partir de la cantidad conocida.
+    """
+    inodo_lineas, total_lineas, inodo_adq, total_adq, mtime_catalogo = version
+    return {
+        "lineas": total_lineas,
+        "registro": str(inodo_lineas),
+        "saldos": f"{inodo_adq}-{total_adq}-{mtime_catalogo}"
+    }
+
+lineas_logistica = LineasLogistica(LINEAS_LOGISTICA_FILE)
+adquisiciones_logistica = RegistroJSONL(ADQUISICIONES_LOGISTICA_FILE)
+motor_saldos = MotorSaldos(lineas_logistica, adquisiciones_logistica)
+
+AGRUPACIONES_CONSOLIDADO = ("producto", "orden_trabajo", "cliente")
+
+def acumular_consolidado(estado, linea, cantidad):
+    """Suma una línea de requerimiento en cada agrupación del consolidado."""
+    clave = clave_producto(linea["producto"], linea["unidad"])
+    orden_trabajo = str(linea.get("orden_trabajo") or "")
+    solicitante = str(linea.get("solicitante") or "")
+    for agrupacion in AGRUPACIONES_CONSOLIDADO:
+        if agrupacion == "producto":
+            valor, grupo = linea["producto"], clave
+        else:
+            valor = linea.get(agrupacion) or ""
+            grupo = str(valor).strip().upper()
+        productos = estado[agrupacion].setdefault(grupo, {"valor": valor, "productos": {}})["productos"]
+        item = productos.setdefault(clave, {"producto": linea["producto"], "unidad": linea["unidad"],
+                                            "cantidad": 0.0, "lineas": 0, "ordenes": {}, "solicitantes": {}})
+        item["cantidad"] += cantidad
+        item["lineas"] += 1
+        item["ordenes"][orden_trabajo] = item["ordenes"].get(orden_trabajo, 0.0) + cantidad
+        item["solicitantes"][solicitante] = item["solicitantes"].get(solicitante, 0) + 1
+
+def consolidar_pendientes(df, agrupar):
+    """Agrupa los saldos pendientes del motor con la misma forma que acumular_consolidado.
+
+    Las sumas se hacen con groupby; en Python solo se recorren los grupos resultantes.
+    """
+    p = df.loc[df['saldo'] > 0, ["producto", "unidad", "orden_trabajo", "cliente", "solicitante", "clave", "saldo"]]
+    if agrupar == "producto":
+        valor, grupo = p['producto'], p['clave']
+    else:
+        valor = p[agrupar].where(p[agrupar].notna(), "")
+        grupo = valor.astype(str).str.strip().str.upper()
+    p = p.assign(valor=valor, grupo=grupo,
+                 orden=p['orden_trabajo'].fillna("").astype(str), quien=p['solicitante'].fillna("").astype(str))
+
+    totales = p.groupby(['grupo', 'clave'], sort=False)['saldo'].agg(['sum', 'size'])
+    totales = dict(zip(totales.index, zip(totales['sum'], totales['size'])))
+    ordenes = p.groupby(['grupo', 'clave', 'orden'], sort=False)['saldo'].sum()
+    solicitantes = p.groupby(['grupo', 'clave', 'quien'], sort=False).size()
+
+    primeras = p.drop_duplicates('grupo')
+    grupos = {g: {"valor": v, "productos": {}} for g, v in zip(primeras['grupo'], primeras['valor'])}
+    primeras = p.drop_duplicates(['grupo', 'clave'])
+    for g, clave, producto, unidad in zip(primeras['grupo'], primeras['clave'], primeras['producto'], primeras['unidad']):
+        cantidad, lineas = totales[(g, clave)]
+        grupos[g]["productos"][clave] = {"producto": producto, "unidad": unidad,
+                                         "cantidad": float(cantidad), "lineas": int(lineas),
+                                         "ordenes": {}, "solicitantes": {}}
+    for (g, clave, orden), cantidad in ordenes.items():
+        grupos[g]["productos"][clave]["ordenes"][orden] = float(cantidad)
+    for (g, clave, quien), lineas in solicitantes.items():
+        grupos[g]["productos"][clave]["solicitantes"][quien] = int(lineas)
+    return grupos
+
+def formatear_consolidado(grupos, agrupar):
+    """Convierte los grupos acumulados en la respuesta de /api/logistica/consolidado."""
+    def item_respuesta(item):
+        return dict(
+            item,
+            ordenes=[{"orden_trabajo": o, "cantidad": c} for o, c in sorted(item["ordenes"].items())],
+            solicitantes=sorted(item["solicitantes"])
+        )
+    if agrupar == "producto":
+        items = [item_respuesta(item) for grupo in grupos.values() for item in grupo["productos"].values()]
+        return sorted(items, key=lambda i: str(i["producto"]))
+    return [
+        {agrupar: grupo["valor"], "productos": [item_respuesta(i) for i in grupo["productos"].values()]}
+        for _, grupo in sorted(grupos.items())
+    ]
+
+class ConsolidadoLogistica(AgregadosIncrementales):
+    """Cantidades requeridas sumadas por producto, orden de trabajo y cliente.
+
+    El total histórico se mantiene de forma incremental sobre el registro de líneas; lo
+    pendiente depende del stock y las adquisiciones, y se consolida con groupby a partir del
+    resultado del motor de saldos, una vez por agrupación y por cada resultado nuevo.
+    """
+    GRUPOS = AGRUPACIONES_CONSOLIDADO
+
+    def __init__(self, ruta, indice, motor):
+        super().__init__(ruta, indice)
+        self.motor = motor
+        self._pendiente = (None, {})
+
+    def _aplicar(self, entrada):
+        acumular_consolidado(self._estado, entrada, a_numero(entrada["cantidad"]))
+
+    def consultar(self, agrupar, estado="pendiente"):
+        """Devuelve el consolidado de todas las líneas o solo de los saldos pendientes."""
+        if estado == "todos":
+            self.actualizar()
+            with self._lock:
+                return formatear_consolidado(self._estado[agrupar], agrupar)
+
+        df = self.motor.calcular()
+        with self._lock:
+            resultado, consolidado = self._pendiente
+            if resultado is not df:
+                consolidado = {}
+                self._pendiente = (df, consolidado)
+            if agrupar not in consolidado:
+                consolidado[agrupar] = consolidar_pendientes(df, agrupar)
+            return formatear_consolidado(consolidado[agrupar], agrupar)
+
+consolidado_logistica = ConsolidadoLogistica(CONSOLIDADO_LOGISTICA_FILE, lineas_logistica, motor_saldos)
+
+# Analítica de viajes de choferes (kilometraje, duración y viajes abiertos)
+def evento_salida(periodo, fila, valores):
+    """Arma el evento de salida de un viaje a partir de su fila en el Excel de choferes."""
+    valores = (list(valores) + [None] * 14)[:14]
+    return {
+        "tipo": "salida", "periodo": periodo, "fila": fila,
+        "chofer": valores[1], "vehiculo": valores[2], "placa": valores[3],
+        "fecha_salida": _valor_json(valores[4]), "hora_salida": _valor_json(valores[5]),
+        "km_inicial": _valor_json(valores[7])
+    }
+
+def evento_llegada(periodo, fila, valores):
+    """Arma el evento de llegada de un viaje a partir de su fila en el Excel de choferes."""
+    valores = (list(valores) + [None] * 14)[:14]
+    return {
+        "tipo": "llegada", "periodo": periodo, "fila": fila,
+        "fecha_llegada": _valor_json(valores[9]), "hora_retorno": _valor_json(valores[10]),
+        "km_final": _valor_json(valores[12])
+    }
+
+class ViajesChoferes(RegistroJSONL):
+    """Registro de eventos de salida y llegada de los viajes de choferes."""
+    reconstruir_si_falta = True
+
+    def _generar_entradas(self):
+        """Lee todas las particiones del Excel de choferes."""
+        import openpyxl
+        for periodo, ruta_libro in listar_particiones(REGISTROS_CHOFERES_EXCEL):
+            wb = openpyxl.load_workbook(ruta_libro, read_only=True)
+            for fila, valores in enumerate(wb.active.iter_rows(min_row=2, max_col=14, values_only=True), 2):
+                if not any(v is not None for v in valores):
+                    continue
+                yield evento_salida(periodo, fila, valores)
+                if any(v is not None for v in valores[9:14]):
+                    yield evento_llegada(periodo, fila, valores)
+            wb.close()
+
+def _kilometraje(valor):
+    """Convierte un kilometraje a número; devuelve None si falta o no es numérico."""
+    try:
+        return float(str(valor).replace(",", "")) if valor not in (None, "") else None
+    except ValueError:
+        return None
+
+def _momento(fecha, hora):
+    """Combina una fecha AAAA-MM-DD y una hora del formulario; None si alguna no es válida."""
+    if not fecha:
+        return None
+    for formato in ("%H:%M", "%H:%M:%S", "%I:%M %p"):
+        try:
+            return datetime.combine(datetime.strptime(str(fecha)[:10], "%Y-%m-%d").date(),
+                                    datetime.strptime(str(hora).strip(), formato).time())
+        except ValueError:
+            continue
+    return None
+
+class AnaliticaViajes(AgregadosIncrementales):
+    """Totales por placa y por chofer (km, viajes, horas fuera y viajes abiertos) y anomalías.
+
+    Las salidas quedan como viajes abiertos hasta que llega su evento de llegada, que
+    cierra el viaje y suma su recorrido y duración.
+    """
+    GRUPOS = ("abiertos", "vehiculos", "choferes", "anomalias")
+
+    def _anomalia(self, viaje, motivo, **detalle):
+        clave = f"{viaje['periodo'] or ''}|{viaje['fila']}"
+        self._estado["anomalias"].setdefault(clave, []).append({
+            "periodo": viaje["periodo"], "fila": viaje["fila"], "placa": viaje.get("placa"),
+            "chofer": viaje.get("chofer"), "motivo": motivo, **detalle
+        })
+
+    def _totales(self, viaje):
+        vehiculo = self._estado["vehiculos"].setdefault(str(viaje["placa"]).upper(), {
+            "placa": viaje["placa"], "vehiculo": viaje["vehiculo"], "km": 0.0, "viajes": 0,
+            "viajes_abiertos": 0, "horas_fuera": 0.0, "ultimo_km": None
+        })
+        chofer = self._estado["choferes"].setdefault(str(viaje["chofer"]).upper(), {
+            "chofer": viaje["chofer"], "km": 0.0, "viajes": 0, "viajes_abiertos": 0, "horas_fuera": 0.0
+        })
+        return vehiculo, chofer
+
+    def _aplicar(self, entrada):
+        clave = f"{entrada['periodo'] or ''}|{entrada['fila']}"
+        if entrada["tipo"] == "salida":
+            vehiculo, chofer = self._totales(entrada)
+            km_inicial = _kilometraje(entrada["km_inicial"])
+            if km_inicial is None:
+                self._anomalia(entrada, "Kilometraje inicial faltante o no numérico", km_inicial=entrada["km_inicial"])
+            elif vehiculo["ultimo_km"] is not None and km_inicial < vehiculo["ultimo_km"]:
+                self._anomalia(entrada, "Kilometraje inicial menor que el último registrado para la placa",
+                               km_inicial=km_inicial, ultimo_km=vehiculo["ultimo_km"])
+            if km_inicial is not None:
+                vehiculo["ultimo_km"] = max(km_inicial, vehiculo["ultimo_km"] or km_inicial)
+            vehiculo["viajes_abiertos"] += 1
+            chofer["viajes_abiertos"] += 1
+            self._estado["abiertos"][clave] = entrada
+            return
+
+        viaje = self._estado["abiertos"].pop(clave, None)
+        if viaje is None:
+            self._anomalia(dict(entrada, placa=None, chofer=None), "Llegada sin salida registrada")
+            return
+        vehiculo, chofer = self._totales(viaje)
+        for totales in (vehiculo, chofer):
+            totales["viajes_abiertos"] -= 1
+            totales["viajes"] += 1
+
+        km_inicial, km_final = _kilometraje(viaje["km_inicial"]), _kilometraje(entrada["km_final"])
+        if km_final is None:
+            self._anomalia(viaje, "Kilometraje final faltante o no numérico", km_final=entrada["km_final"])
+        elif km_inicial is not None and km_final < km_inicial:
+            self._anomalia(viaje, "Kilometraje final menor que el inicial", km_inicial=km_inicial, km_final=km_final)
+        elif km_inicial is not None:
+            vehiculo["km"] += km_final - km_inicial
+            chofer["km"] += km_final - km_inicial
+        if km_final is not None:
+            vehiculo["ultimo_km"] = max(km_final, vehiculo["ultimo_km"] or km_final)
+
+        salida = _momento(viaje["fecha_salida"], viaje["hora_salida"])
+        llegada = _momento(entrada["fecha_llegada"], entrada["hora_retorno"])
+        if salida and llegada:
+            horas = (llegada - salida).total_seconds() / 3600
+            if horas < 0:
+                self._anomalia(viaje, "Llegada anterior a la salida", salida=salida.isoformat(), llegada=llegada.isoformat())
+            else:
+                vehiculo["horas_fuera"] += horas
+                chofer["horas_fuera"] += horas
+
+    def consultar(self, tipo, clave=None):
+        """Devuelve los totales por placa o chofer, los viajes abiertos o las anomalías."""
+        self.actualizar()
+        with self._lock:
+            grupos = self._estado[tipo]
+            if tipo == "anomalias":
+                return [a for anomalias in grupos.values() for a in anomalias]
+            if tipo == "abiertos":
+                return list(grupos.values())
+            if clave is not None:
+                return [grupos[clave.upper()]] if clave.upper() in grupos else []
+            return list(grupos.values())
+
+viajes_choferes = ViajesChoferes(VIAJES_CHOFERES_FILE)
+analitica_viajes = AnaliticaViajes(ANALITICA_VIAJES_FILE, viajes_choferes)
+
+class OyenteEventos:
+    """Cola acotada de un cliente conectado a /api/eventos."""
+    def __init__(self, tamano):
+        self.cola = queue.Queue(maxsize=tamano)
+        self.desbordado = False
+
+class CentralEventos:
+    """Reparte los eventos de envíos nuevos entre los oyentes SSE conectados.
+
+    Guarda los últimos eventos en un buffer circular para retomar con Last-Event-ID y acota
+    tanto la cantidad de oyentes como la cola de cada uno: un oyente que no da abasto se
+    desconecta (y retoma desde el buffer) en lugar de frenar la publicación. Los ids parten
+    de la hora de inicio en milisegundos, así un id de antes de un reinicio se detecta como hueco.
+    """
+    def __init__(self, max_oyentes, tamano_historial, tamano_cola):
+        self.max_oyentes = max_oyentes
+        self.tamano_cola = tamano_cola
+        self._lock = threading.Lock()
+        self._historial = collections.deque(maxlen=tamano_historial)
+        self._oyentes = set()
+        self._siguiente_id = int(time.time() * 1000)
+
+    def publicar(self, tipo, **resumen):
+        """Registra un evento y lo entrega sin bloquear a todos los oyentes conectados."""
+        with self._lock:
+            evento = {"id": self._siguiente_id, "tipo": tipo, **resumen}
+            self._siguiente_id += 1
+            self._historial.append(evento)
+            for oyente in list(self._oyentes):
+                try:
+                    oyente.cola.put_nowait(evento)
+                except queue.Full:
+                    oyente.desbordado = True
+                    self._oyentes.discard(oyente)
+            return evento
+
+    def suscribir(self, ultimo_id=None):
+        """Registra un oyente y devuelve (oyente, eventos pendientes), o None si no hay cupo."""
+        with self._lock:
+            if len(self._oyentes) >= self.max_oyentes:
+                return None
+            oyente = OyenteEventos(self.tamano_cola)
+            self._oyentes.add(oyente)
+            return oyente, self._pendientes(ultimo_id)
+
+    def _pendientes(self, ultimo_id):
+        """Eventos posteriores a ultimo_id; si hay un hueco, un evento "reinicio" para resincronizar."""
+        if ultimo_id is None:
+            return []
+        primero = self._historial[0]["id"] if self._historial else self._siguiente_id
+        if ultimo_id < primero - 1 or ultimo_id >= self._siguiente_id:
+            # Eventos perdidos (buffer superado o servidor reiniciado): el cliente debe volver a consultar
+            return [{"id": self._siguiente_id - 1, "tipo": "reinicio"}]
+        return [e for e in self._historial if e["id"] > ultimo_id]
+
+    def cancelar(self, oyente):
+        with self._lock:
+            self._oyentes.discard(oyente)
+
+    def cantidad_oyentes(self):
+        with self._lock:
+            return len(self._oyentes)
+
+central_eventos = CentralEventos(EVENTOS_OYENTES_MAX, EVENTOS_HISTORIAL, EVENTOS_COLA_OYENTE)
+
+def publicar_evento(tipo, registro=None, **resumen):
+    """Publica un evento para /api/eventos; un fallo aquí nunca afecta al envío ya guardado.
+
+    Con registro, el evento lleva como cursor la cantidad de entradas del registro.
+    """
+    try:
+        if registro is not None:
+            resumen["cursor"] = registro.estado()[1]
+        central_eventos.publicar(tipo, **resumen)
+    except Exception as e:
+        logging.exception(f"Error al publicar el evento {tipo}: {str(e)}")
+
+def formatear_evento_sse(evento):
+    """Serializa un evento en el formato de texto de Server-Sent Events."""
+    datos = json.dumps(evento, ensure_ascii=False, separators=(',', ':'), default=str)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+def flujo_eventos(oyente, pendientes):
+    """Generador del flujo SSE de un oyente: pendientes, eventos nuevos y latidos periódicos.
+
+    El flujo se cierra al alcanzar EVENTOS_DURACION_MAX_SEGUNDOS para liberar el hilo; el
+    cliente reconecta con Last-Event-ID sin perder eventos.
+    """
+    try:
+        yield f"retry: {EVENTOS_REINTENTO_MS}\n\n"
+        for evento in pendientes:
+            yield formatear_evento_sse(evento)
+        limite = time.monotonic() + EVENTOS_DURACION_MAX_SEGUNDOS
+        while not oyente.desbordado and time.monotonic() < limite:
+            try:
+                evento = oyente.cola.get(timeout=EVENTOS_LATIDO_SEGUNDOS)
+            except queue.Empty:
+                yield ": latido\n\n"
+                continue
+            yield formatear_evento_sse(evento)
+    finally:
+        central_eventos.cancelar(oyente)
+
+def registrar_eventos_viaje(*eventos):
+    """Anexa eventos de viaje ya guardados en el Excel, actualiza la analítica y avisa a los oyentes."""
+    try:
+        with medir_span("actualizar_viajes"):
+            viajes_choferes.agregar(*eventos)
+            analitica_viajes.actualizar()
+    except Exception as e:
+        logging.exception(f"Error al actualizar la analítica de viajes: {str(e)}")
+    publicar_evento(
+        "viaje", registro=viajes_choferes,
+        salidas=sum(e["tipo"] == "salida" for e in eventos),
+        llegadas=sum(e["tipo"] == "llegada" for e in eventos)
+    )
+
+def leer_fecha_envio(datos):
+    """Lee la fecha DD/MM/AAAA de un envío; lanza ValueError si falta o no es válida."""
+    if not isinstance(datos, dict):
+        raise ValueError("Se esperaba un objeto JSON")
+    try:
+        return datetime.strptime(str(datos.get('fecha', '')), '%d/%m/%Y').date()
+    except ValueError:
+        raise ValueError(f"Fecha no válida: '{datos.get('fecha', '')}'. Use DD/MM/AAAA.") from None
+
 def procesar_datos(datos):
-    """Procesa los datos del reporte diario."""
+    """Procesa los datos del reporte diario.
+
+    Lanza ValueError si los datos no son válidos y devuelve False si no se pudieron guardar
+    (libro bloqueado, error de disco...), para que la ruta responda 400 o 500 según el caso.
+    """
     try:
-        wb = openpyxl.load_workbook(EXCEL_FILE)
+        fecha = leer_fecha_envio(datos)
+        import openpyxl
+        ruta_libro = asegurar_archivo(ruta_particion(EXCEL_FILE))
+        with medir_span("cargar_libro"):
+            wb = openpyxl.load_workbook(ruta_libro)
         ws_reporte = wb["Reporte Principal"]
         ws_materiales = wb["Materiales Usados"]
         ws_equipos = wb["Equipos Usados"]
@@ -269,7 +1908,7 @@ def procesar_datos(datos):
 
         # Preparar fila de datos para "Reporte Principal"
         fila_reporte = [
-            datetime.strptime(datos.get('fecha', ''), '%d/%m/%Y').date(),
+            fecha,
             datos.get('codigo_obra', ''),
             datos.get('nombre_ingeniero', ''),
             datos.get('nombre_supervisor', ''),
@@ -286,7 +1925,7 @@ def procesar_datos(datos):
         materiales = datos.get('materiales_usados', [])
         actualizar_cabeceras_materiales(ws_materiales, len(materiales))
         fila_materiales = [
-            datetime.strptime(datos.get('fecha', ''), '%d/%m/%Y').date(),
+            fecha,
             datos.get('codigo_obra', ''),
             datos.get('nombre_ingeniero', '')
         ]
@@ -298,7 +1937,7 @@ def procesar_datos(datos):
         equipos = datos.get('equipos_usados', [])
         actualizar_cabeceras_equipos(ws_equipos, len(equipos))
         fila_equipos = [
-            datetime.strptime(datos.get('fecha', ''), '%d/%m/%Y').date(),
+            fecha,
             datos.get('codigo_obra', ''),
             datos.get('nombre_ingeniero', '')
         ]
@@ -310,7 +1949,7 @@ def procesar_datos(datos):
         vehiculos = datos.get('vehiculos_usados', [])
         actualizar_cabeceras_vehiculos(ws_vehiculos, len(vehiculos))
         fila_vehiculos = [
-            datetime.strptime(datos.get('fecha', ''), '%d/%m/%Y').date(),
+            fecha,
             datos.get('codigo_obra', ''),
             datos.get('nombre_ingeniero', '')
         ]
@@ -322,51 +1961,90 @@ def procesar_datos(datos):
         personal_campo = datos.get('personal_de_campo', [])
         actualizar_cabeceras_personal(ws_personal, len(personal_campo))
         fila_personal = [
-            datetime.strptime(datos.get('fecha', ''), '%d/%m/%Y').date(),
+            fecha,
             datos.get('codigo_obra', ''),
             datos.get('nombre_ingeniero', '')
         ]
         for personal in personal_campo:
             fila_personal.extend([personal['nombre_completo'], personal['categoria'], personal['horas_extras']])
         ws_personal.append(fila_personal)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Datos del reporte incompletos o no válidos: {str(e)}") from e
+    except Exception as e:
+        logging.exception(f"Error al procesar datos: {str(e)}")
+        return False
 
-        wb.save(EXCEL_FILE)
-        logging.info(f"Datos recibidos de {datos.get('nombre_ingeniero', 'Unknown')} procesados exitosamente")
+    try:
+        with medir_span("guardar_libro"):
+            wb.save(ruta_libro)
+    except Exception as e:
+        logging.exception(f"Error al guardar el reporte diario: {str(e)}")
+        return False
+    logging.info(f"Datos recibidos de {datos.get('nombre_ingeniero', 'Unknown')} procesados exitosamente")
 
+    # El reporte ya está guardado: un fallo desde aquí no debe provocar un reintento que lo duplique
+    try:
+        with medir_span("actualizar_indice"):
+            indice_reportes.agregar(entrada_reporte(
+                fila_reporte, [fila_materiales, fila_equipos, fila_vehiculos, fila_personal]
+            ))
+        with medir_span("actualizar_agregados"):
+            agregados_obra.actualizar()
     except Exception as e:
-        logging.error(f"Error al procesar datos: {str(e)}")
+        logging.exception(f"Error al actualizar el índice de reportes: {str(e)}")
+    publicar_evento(
+        "reporte_diario", registro=indice_reportes, codigo_obra=datos.get('codigo_obra', ''),
+        materiales=len(materiales), equipos=len(equipos),
+        vehiculos=len(vehiculos), personal=len(personal_campo)
+    )
+    return True
 
 def procesar_requerimientos(datos):
-    """Procesa los datos de requerimientos."""
-    logging.info("Datos de requerimientos recibidos:")
-    logging.info(datos)
+    """Procesa los datos de requerimientos.
+
+    Igual que procesar_datos: ValueError si los datos no son válidos, False si no se pudieron guardar.
+    """
+    logging.info(f"Datos de requerimientos recibidos: {resumir_payload(datos)}")
     try:
-        wb_req = openpyxl.load_workbook(REQUERIMIENTOS_EXCEL_FILE)
+        fecha = leer_fecha_envio(datos)
+        import openpyxl
+        ruta_libro = asegurar_archivo(ruta_particion(REQUERIMIENTOS_EXCEL_FILE))
+        with medir_span("cargar_libro"):
+            wb_req = openpyxl.load_workbook(ruta_libro)
         ws_requerimientos = wb_req["Requerimientos"]
 
         requerimientos = datos.get('requerimientos', [])
         actualizar_cabeceras_requerimientos(ws_requerimientos, len(requerimientos))
 
         fila_requerimientos = [
-            datetime.strptime(datos.get('fecha', ''), '%d/%m/%Y').date(),
+            fecha,
             datos.get('codigo_obra', ''),
             datos.get('nombre_ingeniero', '')
         ]
         for req in requerimientos:
             fila_requerimientos.extend([req['nombre'], req['unidad'], req['cantidad']])
         ws_requerimientos.append(fila_requerimientos)
-
-        wb_req.save(REQUERIMIENTOS_EXCEL_FILE)
-        logging.info(f"Requerimientos recibidos de {datos.get('nombre_ingeniero', 'Unknown')} procesados exitosamente")
-
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Datos de requerimientos incompletos o no válidos: {str(e)}") from e
     except Exception as e:
         logging.exception(f"Error al procesar requerimientos: {str(e)}")
+        return False
+
+    try:
+        with medir_span("guardar_libro"):
+            wb_req.save(ruta_libro)
+    except Exception as e:
+        logging.exception(f"Error al guardar los requerimientos: {str(e)}")
+        return False
+    logging.info(f"Requerimientos recibidos de {datos.get('nombre_ingeniero', 'Unknown')} procesados exitosamente")
+    publicar_evento("requerimientos_obra", codigo_obra=datos.get('codigo_obra', ''), items=len(requerimientos))
+    return True
 
 def descargar_excel_flask():
     """Descarga el archivo Excel principal."""
     try:
         logging.info(f"Intentando enviar archivo: {EXCEL_FILE}")
-        return send_file(EXCEL_FILE, as_attachment=True)
+        return enviar_libro_particionado(EXCEL_FILE, 'registros_trabajo.xlsx')
     except Exception as e:
         logging.error(f"Error al generar descarga de Excel: {str(e)}")
         return str(e), 500
@@ -375,7 +2053,7 @@ def descargar_requerimientos_excel_flask():
     """Descarga el archivo Excel de requerimientos."""
     try:
         logging.info(f"Intentando enviar archivo de requerimientos: {REQUERIMIENTOS_EXCEL_FILE}")
-        return send_file(REQUERIMIENTOS_EXCEL_FILE, as_attachment=True, download_name='requerimientos_obra.xlsx')
+        return enviar_libro_particionado(REQUERIMIENTOS_EXCEL_FILE, 'requerimientos_obra.xlsx')
     except Exception as e:
         logging.error(f"Error al generar descarga de Excel de requerimientos: {str(e)}")
         return str(e), 500
@@ -383,28 +2061,12 @@ def descargar_requerimientos_excel_flask():
 def procesar_logistica_requerimientos(datos):
     """Procesa los datos de requerimientos de logística y los guarda en el Excel."""
     try:
-        # Asegurar que el archivo Excel existe
-        if not os.path.exists(LOGISTICA_EXCEL_FILE):
-            logging.info(f"Creando archivo Excel de logística: {LOGISTICA_EXCEL_FILE}")
-            wb_logistica = openpyxl.Workbook()
-            ws_logistica = wb_logistica.active
-            ws_logistica.title = "Requerimientos"
-
-            # Definir cabeceras
-            cabeceras = [
-                "Fecha", "Solicitante", "Orden de Trabajo", "Cliente",
-                "Producto", "Unidad", "Cantidad", "Stock", "Adquirido",
-                "Saldo", "Observaciones"
-            ]
-
-            for col_num, header in enumerate(cabeceras, 1):
-                ws_logistica.cell(row=1, column=col_num).value = header
-
-            wb_logistica.save(LOGISTICA_EXCEL_FILE)
-            logging.info("Archivo Excel de logística creado exitosamente")
+        import openpyxl
 
         # Cargar el archivo Excel existente
-        wb = openpyxl.load_workbook(LOGISTICA_EXCEL_FILE)
+        ruta_libro = asegurar_archivo(ruta_particion(LOGISTICA_EXCEL_FILE))
+        with medir_span("cargar_libro"):
+            wb = openpyxl.load_workbook(ruta_libro)
         ws = wb["Requerimientos"]
 
         # Obtener la última fila con datos
@@ -418,6 +2080,7 @@ def procesar_logistica_requerimientos(datos):
 
         # Procesar cada producto en la lista
         productos = datos.get('productos', [])
+        primera_fila = ultima_fila + 1
         for producto in productos:
             # Incrementar el número de fila
             ultima_fila += 1
@@ -433,18 +2096,75 @@ def procesar_logistica_requerimientos(datos):
             # Las columnas 8, 9, 10 y 11 (Stock, Adquirido, Saldo y Observaciones) se dejan vacías
 
         # Guardar el archivo Excel
-        wb.save(LOGISTICA_EXCEL_FILE)
+        with medir_span("guardar_libro"):
+            wb.save(ruta_libro)
         logging.info(f"Requerimientos de logística recibidos de {solicitante} procesados exitosamente")
+
+        try:
+            periodo = periodo_actual() if ruta_libro != LOGISTICA_EXCEL_FILE else None
+            with medir_span("actualizar_lineas"):
+                lineas_logistica.agregar(*(
+                    linea_logistica(periodo, fila, [c.value for c in ws[fila][:7]])
+                    for fila in range(primera_fila, ultima_fila + 1)
+                ))
+            with medir_span("actualizar_consolidado"):
+                consolidado_logistica.actualizar()
+        except Exception as e:
+            logging.exception(f"Error al actualizar las líneas de logística: {str(e)}")
+        # El cursor coincide con el de /api/logistica/lineas: las líneas nuevas son las últimas "lineas"
+        publicar_evento(
+            "logistica", registro=lineas_logistica, orden_trabajo=orden_trabajo, lineas=len(productos)
+        )
         return True
     except Exception as e:
         logging.exception(f"Error al procesar requerimientos de logística: {str(e)}")
         return False
 
 def descargar_logistica_excel_flask():
-    """Descarga el archivo Excel de logística."""
+    """Descarga el archivo Excel de logística.
+
+    ?desde=pendientes empieza en el mes de la línea más antigua que aún tiene saldo, para
+    que los pendientes de meses anteriores no desaparezcan al cambiar de mes.
+
+    El libro trae exactamente las líneas del registro en [X-Lineas-Desde, X-Lineas): las que
+    llegan mientras se arma se omiten, y el cliente las pide luego a /api/logistica/lineas
+    con X-Lineas como cursor.
+    """
     try:
         logging.info(f"Intentando enviar archivo de logística: {LOGISTICA_EXCEL_FILE}")
-        return send_file(LOGISTICA_EXCEL_FILE, as_attachment=True, download_name='sya_logistica_requerimientos.xlsx')
+        # Saldos y versión salen del mismo cálculo, así que describen las mismas líneas
+        df, version = motor_saldos.calcular_con_version()
+        version = describir_version_logistica(version)
+        saldos = motor_saldos.por_fila(df)
+
+        def completar_saldos(periodo, hoja, numero_fila, fila):
+            if hoja != "Requerimientos":
+                return fila
+            if (periodo, numero_fila) not in saldos:
+                # Fila vacía o línea posterior a la versión informada
+                return None
+            _, valores = saldos[(periodo, numero_fila)]
+            # Columnas H a K: Stock, Adquirido, Saldo y Observaciones
+            fila = (fila + [None] * 11)[:max(len(fila), 11)]
+            fila[7:11] = valores
+            return fila
+
+        def cabeceras_version(particiones):
+            # Se calcula antes de enviar: la primera línea es la más antigua de las particiones elegidas
+            periodos = {periodo for periodo, _ in particiones}
+            posiciones = [posicion for (periodo, _), (posicion, _) in saldos.items() if periodo in periodos]
+            return {
+                'X-Lineas': str(version['lineas']),
+                'X-Lineas-Desde': str(min(posiciones, default=version['lineas'])),
+                'X-Registro': version['registro'],
+                'X-Saldos': version['saldos'],
+            }
+
+        desde = motor_saldos.primer_periodo_pendiente() if request.args.get('desde') == 'pendientes' else None
+        return enviar_libro_particionado(
+            LOGISTICA_EXCEL_FILE, 'sya_logistica_requerimientos.xlsx', completar_saldos,
+            desde=desde, cabeceras_de=cabeceras_version
+        )
     except Exception as e:
         logging.error(f"Error al generar descarga de Excel de logística: {str(e)}")
         return str(e), 500
@@ -452,6 +2172,7 @@ def descargar_logistica_excel_flask():
 def descargar_bdd_logistica_flask():
     """Descarga el archivo CSV de la base de datos de materiales de logística."""
     try:
+        asegurar_archivo(LOGISTICA_MATERIALES_CSV_PATH)
         if not os.path.exists(LOGISTICA_MATERIALES_CSV_PATH):
             logging.error(f"Archivo BDD logística no encontrado: {LOGISTICA_MATERIALES_CSV_PATH}")
             return jsonify({"error": "Archivo BDD de logística no encontrado en el servidor."}), 404
@@ -465,6 +2186,7 @@ def descargar_bdd_logistica_flask():
 def agregar_nuevo_material_csv(nombre_material, unidad):
     """Agrega un nuevo material al archivo CSV."""
     try:
+        import pandas as pd
         df = pd.read_csv(MATERIALES_CSV_PATH)
         nuevo_material = pd.DataFrame([{'nombre_material': nombre_material, 'unidad': unidad}])
         df = pd.concat([df, nuevo_material], ignore_index=True)
@@ -478,6 +2200,7 @@ def agregar_nuevo_material_csv(nombre_material, unidad):
 def agregar_nuevo_equipo_csv(nombre_equipo, propiedad):
     """Agrega un nuevo equipo al archivo CSV."""
     try:
+        import pandas as pd
         df = pd.read_csv(EQUIPOS_CSV_PATH)
         nuevo_equipo = pd.DataFrame([{'nombre_equipo': nombre_equipo, 'propiedad': propiedad}])
         df = pd.concat([df, nuevo_equipo], ignore_index=True)
@@ -491,6 +2214,7 @@ def agregar_nuevo_equipo_csv(nombre_equipo, propiedad):
 def agregar_nuevo_vehiculo_csv(nombre_vehiculo, placa, propiedad):
     """Agrega un nuevo vehículo al archivo CSV."""
     try:
+        import pandas as pd
         df = pd.read_csv(VEHICULOS_CSV_PATH)
         nuevo_vehiculo = pd.DataFrame([{'nombre_vehiculo': nombre_vehiculo, 'placa': placa, 'propiedad': propiedad}])
         df = pd.concat([df, nuevo_vehiculo], ignore_index=True)
@@ -504,6 +2228,7 @@ def agregar_nuevo_vehiculo_csv(nombre_vehiculo, placa, propiedad):
 def agregar_nuevo_personal_csv(apellido_paterno, apellido_materno, nombres, categoria):
     """Agrega un nuevo personal al archivo CSV."""
     try:
+        import pandas as pd
         df = pd.read_csv(PERSONAL_CSV_PATH)
         nuevo_personal = pd.DataFrame([{
             'AP. PATERNO': apellido_paterno,
@@ -520,19 +2245,197 @@ def agregar_nuevo_personal_csv(apellido_paterno, apellido_materno, nombres, cate
         return False
 
 
-# Inicializar Excel al inicio
-inicializar_excel()
+# Inicializar Excel al inicio (salvo en modo de inicio diferido)
+if not INICIO_DIFERIDO:
+    inicializar_excel()
+
+class CacheCatalogos:
+    """Catálogos CSV leídos una sola vez y reutilizados mientras el archivo no cambie.
+
+    Cada fila lleva en la columna _modificado la fecha en que apareció con su contenido
+    actual: se identifica por el hash de sus valores, y una fila nueva o modificada toma la
+    fecha de modificación del archivo. Las marcas se guardan en indices/ para conservarlas
+    entre reinicios y son las mismas en todos los procesos.
+
+    Los DataFrame publicados no se modifican: un cambio publica uno nuevo, así que la lectura
+    de un catálogo vigente no toma el lock.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalogos = {}
+
+    def obtener(self, ruta):
+        """Devuelve el DataFrame del catálogo con la columna _modificado."""
+        estado = os.stat(ruta)
+        firma = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+        en_cache = self._catalogos.get(ruta)
+        if en_cache and en_cache[0] == firma:
+            return en_cache[1]
+        with self._lock:
+            en_cache = self._catalogos.get(ruta)
+            if en_cache and en_cache[0] == firma:
+                return en_cache[1]
+            import pandas as pd
+            return self._publicar(ruta, pd.read_csv(ruta, encoding='utf-8-sig'), estado)
+
+    def publicar(self, ruta, df):
+        """Publica un catálogo ya leído y validado que acaba de instalarse en ruta, sin releerlo."""
+        with self._lock:
+            return self._publicar(ruta, df, os.stat(ruta))
+
+    def _publicar(self, ruta, df, estado):
+        """Asigna las marcas _modificado y deja el DataFrame como catálogo vigente (con el lock tomado)."""
+        import pandas as pd
+        hashes = pd.util.hash_pandas_object(df, index=False).astype(str)
+        ruta_marcas = os.path.join(asegurar_archivo(INDICES_DIR), f"catalogo_{os.path.basename(ruta)}.json")
+        try:
+            with open(ruta_marcas, encoding='utf-8') as f:
+                marcas = json.load(f)
+        except (FileNotFoundError, ValueError):
+            marcas = {}
+        modificado = datetime.fromtimestamp(estado.st_mtime).isoformat(timespec="seconds")
+        marcas_actuales = {h: marcas.get(h, modificado) for h in hashes}
+        if marcas_actuales != marcas:
+            escribir_json_atomico(ruta_marcas, marcas_actuales)
+        df["_modificado"] = hashes.map(marcas_actuales)
+        self._catalogos[ruta] = ((estado.st_ino, estado.st_mtime_ns, estado.st_size), df)
+        return df
+
+cache_catalogos = CacheCatalogos()
+
+class CatalogoLogistica:
+    """Vista inmutable del catálogo de logística, preparada una vez por versión del CSV.
+
+    Incluye las filas, el texto normalizado para ?buscar=, los totales por producto que usa
+    MotorSaldos y el cuerpo JSON de la consulta sin parámetros, ya codificado.
+    """
+    def __init__(self, df):
+        import pandas as pd
+        self.df = df
+        self.busqueda = df['material'].fillna('').astype(str).str.strip().str.upper()
+
+        por_clave = df.drop(columns=['_modificado'])
+        for columna in ('stock', 'costo_unitario'):
+            if columna not in por_clave.columns:
+                por_clave[columna] = 0
+        por_clave['clave'] = [clave_producto(m, u) for m, u in zip(por_clave['material'], por_clave['unidad'])]
+        por_clave['stock'] = pd.to_numeric(por_clave['stock'], errors='coerce').fillna(0)
+        por_clave['costo_unitario'] = pd.to_numeric(por_clave['costo_unitario'], errors='coerce').fillna(0)
+        self.por_clave = por_clave.groupby('clave', as_index=False).agg(
+            stock_total=('stock', 'sum'), costo_unitario=('costo_unitario', 'first'))
+
+        basicas = df[['material', 'unidad']].astype(object).where(df[['material', 'unidad']].notna(), None)
+        self.total = len(df)
+        self.marca = df['_modificado'].max() if len(df) else None
+        self.cuerpo_json = app.json.dumps(basicas.to_dict(orient='records')) + "\n"
+
+_catalogo_logistica = None
+
+def obtener_catalogo_logistica():
+    """Devuelve la vista vigente del catálogo de logística, rehaciéndola si el CSV cambió."""
+    global _catalogo_logistica
+    df = cache_catalogos.obtener(asegurar_archivo(LOGISTICA_MATERIALES_CSV_PATH))
+    catalogo = _catalogo_logistica
+    if catalogo is None or catalogo.df is not df:
+        catalogo = CatalogoLogistica(df)
+        _catalogo_logistica = catalogo
+    return catalogo
+
+def validar_catalogo_logistica(df):
+    """Devuelve los problemas que impiden publicar un catálogo de logística (lista vacía si es válido)."""
+    import pandas as pd
+    faltantes = [c for c in ('material', 'unidad') if c not in df.columns]
+    if faltantes:
+        return [f"faltan las columnas: {', '.join(faltantes)}"]
+    if df.empty:
+        return ["el archivo no tiene filas"]
+    problemas = []
+    # Número de fila tal como se ve en el archivo (la 1 es la cabecera)
+    incompletas = df.index[(df['material'].fillna('').astype(str).str.strip() == '')
+                           | (df['unidad'].fillna('').astype(str).str.strip() == '')]
+    if len(incompletas):
+        problemas.append(f"filas sin material o unidad: {', '.join(str(i + 2) for i in incompletas[:10])}")
+    for columna in ('stock', 'costo_unitario'):
+        if columna in df.columns:
+            no_numericas = df.index[pd.to_numeric(df[columna], errors='coerce').isna() & df[columna].notna()]
+            if len(no_numericas):
+                problemas.append(f"valores no numéricos en {columna}: filas {', '.join(str(i + 2) for i in no_numericas[:10])}")
+    return problemas
+
+def respuesta_catalogo(df, escalar=None):
+    """Responde un catálogo aplicando los parámetros comunes de la solicitud.
+
+    - ?modificado_desde=AAAA-MM-DD[THH:MM:SS]: solo filas nuevas o modificadas desde esa fecha.
+    - ?campos=a,b: solo esas columnas.
+    - ?limite=&cursor=: paginación; X-Total y X-Siguiente-Cursor van en las cabeceras
+      para que el cuerpo conserve su forma.
+    - ?formato=columnar: {"columnas": [...], "filas": [[...], ...]}, con los nombres una sola vez.
+    Con escalar, el cuerpo es la lista de valores de esa columna.
+    X-Modificado-Hasta indica la marca más reciente, para usarla en la siguiente consulta.
+    """
+    disponibles = [c for c in df.columns if c != "_modificado"]
+    try:
+        if request.args.get('modificado_desde'):
+            desde = datetime.fromisoformat(request.args['modificado_desde']).isoformat(timespec="seconds")
+            df = df[df["_modificado"] >= desde]
+        columnas = disponibles
+        if request.args.get('campos') and escalar is None:
+            columnas = [c.strip() for c in request.args['campos'].split(',') if c.strip()]
+            desconocidos = [c for c in columnas if c not in disponibles]
+            if desconocidos:
+                raise ValueError(f"campos desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(disponibles)}")
+        total = len(df)
+        siguiente = None
+        if request.args.get('limite') or request.args.get('cursor'):
+            limite, cursor = leer_paginacion(limite_defecto=total or 1, limite_maximo=max(total, 1))
+            df = df.iloc[cursor:cursor + limite]
+            siguiente = cursor + limite if cursor + limite < total else None
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros no válidos: {str(e)}"}), 400
+
+    marca = df["_modificado"].max() if len(df) else None
+    if escalar is not None:
+        respuesta = jsonify(df[escalar].tolist())
+    elif request.args.get('formato') == 'columnar':
+        valores = df[columnas].astype(object).where(df[columnas].notna(), None)
+        respuesta = jsonify({"columnas": [str(c) for c in columnas], "filas": valores.values.tolist()})
+    else:
+        respuesta = jsonify(df[columnas].to_dict(orient='records'))
+    respuesta.headers["X-Total"] = str(total)
+    if siguiente is not None:
+        respuesta.headers["X-Siguiente-Cursor"] = str(siguiente)
+    if marca:
+        respuesta.headers["X-Modificado-Hasta"] = marca
+    return respuesta
 
 # Rutas de la API
+@app.route('/api/salud/listo', methods=['GET'])
+def salud_listo():
+    """Indica si el proceso está listo para recibir tráfico."""
+    escribible = os.access(BASE_DIR, os.W_OK)
+    estado = {
+        "status": "listo" if escribible else "no_listo",
+        "inicio_diferido": INICIO_DIFERIDO,
+        "archivos_inicializados": len(_archivos_listos),
+        "archivos_totales": len(INICIALIZADORES),
+        "pandas_cargado": 'pandas' in sys.modules,
+        "openpyxl_cargado": 'openpyxl' in sys.modules,
+        "log_descartados": {nombre: handler.descartados for nombre, handler in _colas_log.items()}
+    }
+    return jsonify(estado), 200 if escribible else 503
+
+@app.route('/api/salud/admision', methods=['GET'])
+def salud_admision():
+    """Informa, por recurso, las solicitudes en curso, en espera y rechazadas por saturación."""
+    return jsonify({recurso: limite.estado() for recurso, limite in limites_admision.items()})
+
 @app.route('/api/materiales', methods=['GET'])
 def get_materiales():
     """Obtiene la lista de materiales."""
     try:
         if not os.path.exists(MATERIALES_CSV_PATH):
             return jsonify({"error": f"No se encontró el archivo de materiales en {MATERIALES_CSV_PATH}"}), 404
-        df = pd.read_csv(MATERIALES_CSV_PATH)
-        materiales = df.to_dict(orient='records')
-        return jsonify(materiales)
+        return respuesta_catalogo(cache_catalogos.obtener(MATERIALES_CSV_PATH))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -542,9 +2445,7 @@ def get_equipos():
     try:
         if not os.path.exists(EQUIPOS_CSV_PATH):
              return jsonify({"error": f"No se encontró el archivo de equipos en {EQUIPOS_CSV_PATH}"}), 404
-        df = pd.read_csv(EQUIPOS_CSV_PATH)
-        equipos = df.to_dict(orient='records')
-        return jsonify(equipos)
+        return respuesta_catalogo(cache_catalogos.obtener(EQUIPOS_CSV_PATH))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -554,9 +2455,7 @@ def get_vehiculos():
     try:
         if not os.path.exists(VEHICULOS_CSV_PATH):
             return jsonify({"error": f"No se encontró el archivo de vehículos en {VEHICULOS_CSV_PATH}"}), 404
-        df = pd.read_csv(VEHICULOS_CSV_PATH)
-        vehiculos = df.to_dict(orient='records')
-        return jsonify(vehiculos)
+        return respuesta_catalogo(cache_catalogos.obtener(VEHICULOS_CSV_PATH))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -566,9 +2465,7 @@ def get_personal():
     try:
         if not os.path.exists(PERSONAL_CSV_PATH):
             return jsonify({"error": f"No se encontró el archivo de personal en {PERSONAL_CSV_PATH}"}), 404
-        df = pd.read_csv(PERSONAL_CSV_PATH)
-        personal = df.to_dict(orient='records')
-        return jsonify(personal)
+        return respuesta_catalogo(cache_catalogos.obtener(PERSONAL_CSV_PATH))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -631,20 +2528,108 @@ def new_personal():
 
 
 @app.route('/recibir-datos', methods=['POST'])
+@idempotente
+@admitir("reportes")
 def recibir_datos():
     """Recibe los datos del reporte diario."""
     datos = request.json
-    procesar_datos(datos)
+    try:
+        guardado = procesar_datos(datos)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if not guardado:
+        return jsonify({"status": "error", "message": "No se pudo guardar el reporte; reintente"}), 500
     return jsonify({"status": "success"})
 
 @app.route('/recibir-requerimientos', methods=['POST'])
+@idempotente
+@admitir("requerimientos_obra")
 def recibir_requerimientos_route():
     """Recibe los datos de requerimientos."""
     datos = request.json
-    print("Datos recibidos en /recibir-requerimientos:", datos)
-    procesar_requerimientos(datos)
+    try:
+        guardado = procesar_requerimientos(datos)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if not guardado:
+        return jsonify({"status": "error", "message": "No se pudieron guardar los requerimientos; reintente"}), 500
     return jsonify({"status": "success"})
 
+@app.route('/api/reportes', methods=['GET'])
+def consultar_reportes():
+    """Consulta los reportes diarios por obra, ingeniero, rango de fechas y hoja."""
+    try:
+        limite, cursor = leer_paginacion()
+        desde = _fecha_iso(request.args['desde'].strip(), estricto=True) if request.args.get('desde') else None
+        hasta = _fecha_iso(request.args['hasta'].strip(), estricto=True) if request.args.get('hasta') else None
+        hoja = request.args.get('hoja')
+        if hoja:
+            hoja = ALIAS_HOJAS_REPORTE.get(hoja.lower(), hoja)
+            if hoja not in ALIAS_HOJAS_REPORTE.values():
+                return jsonify({"error": f"Hoja no válida. Opciones: {', '.join(ALIAS_HOJAS_REPORTE)}"}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros no válidos: {str(e)}"}), 400
+
+    try:
+        asegurar_archivo(INDICES_DIR)
+        entradas = indice_reportes.consultar(
+            codigo_obra=request.args.get('codigo_obra'),
+            ingeniero=request.args.get('ingeniero'),
+            desde=desde,
+            hasta=hasta
+        )
+        pagina = entradas[cursor:cursor + limite]
+        if hoja:
+            pagina = [dict(e, hojas={hoja: e["hojas"].get(hoja)}) for e in pagina]
+        siguiente = cursor + limite if cursor + limite < len(entradas) else None
+        return jsonify({
+            "total": len(entradas),
+            "cursor": cursor,
+            "siguiente_cursor": siguiente,
+            "resultados": pagina
+        })
+    except Exception as e:
+        logging.exception(f"Error al consultar reportes: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/agregados/<tipo>', methods=['GET'])
+def consultar_agregados(tipo):
+    """Totales acumulados por obra: materiales, equipos, vehículos y horas extras por mes."""
+    tipos = {"materiales": "materiales", "equipos": "equipos", "vehiculos": "vehiculos", "horas-extras": "horas_extras"}
+    if tipo not in tipos:
+        return jsonify({"error": f"Tipo de agregado no válido. Opciones: {', '.join(tipos)}"}), 400
+    try:
+        asegurar_archivo(INDICES_DIR)
+        if tipo == "horas-extras":
+            mes = parsear_periodo(request.args['mes']) if request.args.get('mes') else periodo_actual()
+            totales = agregados_obra.consultar("horas_extras", mes)
+            trabajador = request.args.get('trabajador')
+            if trabajador:
+                totales = [t for t in totales if trabajador.casefold() in str(t["trabajador"]).casefold()]
+            return jsonify({"mes": mes, "horas_extras": totales})
+        codigo_obra = request.args.get('codigo_obra')
+        return jsonify({"codigo_obra": codigo_obra, tipo: agregados_obra.consultar(tipos[tipo], codigo_obra)})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.exception(f"Error al consultar agregados de {tipo}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.cli.command("reconstruir-agregados")
+@click.option("--desde-excel", is_flag=True, help="Reconstruye también el índice de reportes desde los archivos Excel.")
+def reconstruir_agregados_cli(desde_excel):
+    """Recalcula los agregados por obra (backfill)."""
+    if desde_excel:
+        indice_reportes.reconstruir()
+    total = agregados_obra.reconstruir()
+    print(f"Agregados reconstruidos a partir de {total} reportes")
+
+@app.cli.command("reconstruir-indice-reportes")
+def reconstruir_indice_reportes_cli():
+    """Reconstruye el índice de reportes a partir de los archivos Excel."""
+    total = indice_reportes.reconstruir()
+    print(f"Índice de reportes reconstruido: {total} reportes")
+
 @app.route('/descargar-excel', methods=['GET'])
 def descargar_excel_route():
     """Descarga el archivo Excel principal."""
@@ -655,17 +2640,318 @@ def descargar_requerimientos_excel_route():
     """Descarga el archivo Excel de requerimientos."""
     return descargar_requerimientos_excel_flask()
 
+# Almacenamiento de fotos por contenido: cada foto se guarda una sola vez en fotos_blobs
+# con su hash SHA-256 como nombre, y las carpetas de viaje solo guardan referencias
+_referencias_lock = threading.Lock()
+
+def ruta_blob(digest):
+    """Devuelve la ruta de un blob de foto a partir de su hash."""
+    return os.path.join(FOTOS_BLOBS_DIR, digest[:2], digest)
+
+def leer_referencias(carpeta_path):
+    """Devuelve las referencias {nombre de archivo: {sha256, bytes}} de una carpeta de viaje."""
+    try:
+        with open(os.path.join(carpeta_path, REFERENCIAS_FOTOS), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def guardar_foto(archivo, carpeta_path, nombre_archivo):
+    """Guarda una foto subida en el almacén por contenido y la referencia en la carpeta del viaje.
+
+    El hash se calcula sobre el flujo recibido antes de escribir en disco: si el blob ya
+    existe no se vuelve a escribir, y si la carpeta ya lo referencia no se escribe nada.
+    Devuelve True si la foto era nueva en el almacén.
+    """
+    hash_foto = hashlib.sha256()
+    total = 0
+    archivo.stream.seek(0)
+    for bloque in iter(lambda: archivo.stream.read(1024 * 1024), b""):
+        hash_foto.update(bloque)
+        total += len(bloque)
+    digest = hash_foto.hexdigest()
+
+    destino = ruta_blob(digest)
+    nuevo = not os.path.exists(destino)
+    if nuevo:
+        asegurar_archivo(FOTOS_BLOBS_DIR)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        ruta_tmp = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+        archivo.stream.seek(0)
+        with open(ruta_tmp, 'wb') as f:
+            shutil.copyfileobj(archivo.stream, f, 1024 * 1024)
+        os.replace(ruta_tmp, destino)
+
+    if not registrar_referencia_foto(carpeta_path, nombre_archivo, digest, total) and not nuevo:
+        logging.info(f"Foto {nombre_archivo} ya registrada en {carpeta_path}; reenvío ignorado")
+    return nuevo
+
+def registrar_referencia_foto(carpeta_path, nombre_archivo, digest, total):
+    """Apunta un nombre de archivo de la carpeta a un blob; devuelve False si ya apuntaba a él."""
+    with _referencias_lock:
+        referencias = leer_referencias(carpeta_path)
+        if referencias.get(nombre_archivo, {}).get("sha256") == digest:
+            return False
+        referencias[nombre_archivo] = {"sha256": digest, "bytes": total}
+        escribir_json_atomico(os.path.join(carpeta_path, REFERENCIAS_FOTOS), referencias)
+        return True
+
+def archivos_carpeta_fotos(carpeta_path):
+    """Devuelve {nombre: ruta en disco} de las fotos de una carpeta, resolviendo referencias.
+
+    Incluye los archivos guardados antes del almacén por contenido; una referencia con el
+    mismo nombre que un archivo tiene prioridad porque es la subida más reciente.
+    """
+    archivos = {
+        nombre: os.path.join(carpeta_path, nombre) for nombre in os.listdir(carpeta_path)
+        if nombre != REFERENCIAS_FOTOS and os.path.isfile(os.path.join(carpeta_path, nombre))
+    }
+    for nombre, referencia in leer_referencias(carpeta_path).items():
+        archivos[nombre] = ruta_blob(referencia["sha256"])
+    return archivos
+
+def agregar_carpeta_a_zip(zipf, carpeta_path, prefijo):
+    """Agrega las fotos de una carpeta al ZIP; las fotos ya están comprimidas y se guardan sin deflate."""
+    for nombre, ruta in sorted(archivos_carpeta_fotos(carpeta_path).items()):
+        if os.path.exists(ruta):
+            zipf.write(ruta, os.path.join(prefijo, nombre), compress_type=zipfile.ZIP_STORED)
+        else:
+            logging.warning(f"Blob faltante para {prefijo}/{nombre}: {ruta}")
+
+_PATRON_CARPETA_VIAJE = re.compile(r"^(?P<fecha>\d{8})_(?P<chofer>.+)_(?P<placa>[^_]+)$")
+
+def estado_carpeta_fotos(nombre_carpeta, chofer=None, placa=None):
+    """Calcula la entrada del manifiesto de una carpeta de viaje (fotos, bytes, fecha, chofer, placa)."""
+    carpeta_path = os.path.join(FOTOS_VEHICULOS_DIR, nombre_carpeta)
+    referencias = leer_referencias(carpeta_path)
+    archivos = archivos_carpeta_fotos(carpeta_path)
+    total_bytes = 0
+    for nombre, ruta in archivos.items():
+        total_bytes += referencias[nombre]["bytes"] if nombre in referencias else os.path.getsize(ruta)
+    coincidencia = _PATRON_CARPETA_VIAJE.match(nombre_carpeta)
+    fecha = None
+    if coincidencia:
+        fecha = f"{coincidencia['fecha'][:4]}-{coincidencia['fecha'][4:6]}-{coincidencia['fecha'][6:]}"
+        # Sin los datos del formulario, se usan los del nombre de la carpeta
+        chofer = chofer or coincidencia['chofer'].replace("-", " ")
+        placa = placa or coincidencia['placa']
+    return {
+        "carpeta": nombre_carpeta, "fotos": len(archivos), "bytes": total_bytes,
+        "fecha": fecha, "chofer": chofer, "placa": placa,
+        "modificado": datetime.fromtimestamp(os.path.getmtime(carpeta_path)).isoformat(timespec="seconds")
+    }
+
+class ManifiestoFotos(RegistroJSONL):
+    """Manifiesto de las carpetas de fotos de viajes.
+
+    Cada vez que se guardan fotos se anexa el estado nuevo de la carpeta; en memoria queda
+    solo el último estado de cada una. Cuando las líneas superan MANIFIESTO_COMPACTAR_LINEAS
+    y duplican a las carpetas, el archivo se reescribe con el último estado de cada carpeta.
+    La reconstrucción, en cambio, recorre el disco.
+    """
+    reconstruir_si_falta = True  # Las carpetas en disco ya tienen las fotos recién guardadas
+
+    def _reiniciar(self):
+        super()._reiniciar()
+        self.carpetas = {}
+        self.lineas = 0
+
+    def _indexar(self, entrada):
+        self.carpetas[entrada["carpeta"]] = entrada
+        self.lineas += 1
+
+    def compactar(self):
+        """Reescribe el archivo con una línea por carpeta (el último estado de cada una)."""
+        with self._lock:
+            self._sincronizar()
+            antes = self.lineas
+            total = self._reescribir(list(self.carpetas.values()))
+            logging.info(f"Manifiesto de fotos compactado: {antes} líneas -> {total}")
+            return total
+
+    def _generar_entradas(self):
+        """Recorre las carpetas de fotos en disco."""
+        for nombre in sorted(os.listdir(asegurar_archivo(FOTOS_VEHICULOS_DIR))):
+            if os.path.isdir(os.path.join(FOTOS_VEHICULOS_DIR, nombre)):
+                yield estado_carpeta_fotos(nombre)
+
+    def actualizar_carpeta(self, carpeta_path, chofer=None, placa=None):
+        """Registra el estado actual de una carpeta después de guardar fotos en ella."""
+        with self._lock:
+            # Se carga primero para anexar con los datos del formulario y no solo reconstruir
+            self._sincronizar()
+            self.agregar(estado_carpeta_fotos(os.path.basename(carpeta_path), chofer, placa))
+            if self.lineas > max(MANIFIESTO_COMPACTAR_LINEAS, 2 * len(self.carpetas)):
+                self.compactar()
+
+    def consultar(self, desde=None, hasta=None, chofer=None, placa=None):
+        """Devuelve las carpetas que cumplen los filtros, de la más reciente a la más antigua."""
+        with self._lock:
+            self._sincronizar()
+            carpetas = list(self.carpetas.values())
+        if desde:
+            carpetas = [c for c in carpetas if c["fecha"] and c["fecha"] >= desde]
+        if hasta:
+            carpetas = [c for c in carpetas if c["fecha"] and c["fecha"] <= hasta]
+        if chofer:
+            carpetas = [c for c in carpetas if chofer.lower() in str(c["chofer"]).lower()]
+        if placa:
+            placa_normalizada = placa.replace(" ", "-").upper()
+            carpetas = [c for c in carpetas if str(c["placa"]).replace(" ", "-").upper() == placa_normalizada]
+        return sorted(carpetas, key=lambda c: (c["fecha"] or "", c["carpeta"]), reverse=True)
+
+manifiesto_fotos = ManifiestoFotos(MANIFIESTO_FOTOS_FILE)
+
+def guardar_fotos_formulario(data, files, prefijo, carpeta_path, nombre_base, etapa):
+    """Guarda las fotos {prefijo}_1 a _4 del formulario.
+
+    Cada foto puede venir en el cuerpo multipart o como id de una subida reanudable ya
+    confirmada en el campo {prefijo}_{i}_subida.
+    """
+    guardadas = 0
+    for i in range(1, 5):
+        foto_key = f"{prefijo}_{i}"
+        foto = files.get(foto_key)
+        id_subida = data.get(f"{foto_key}_subida")
+        with medir_span(f"guardar_foto_{etapa}_{i}"):
+            if foto:
+                extension = os.path.splitext(foto.filename)[1] if foto.filename else ".jpg"
+                nombre_archivo = f"{nombre_base}_{i}{extension}"
+                guardar_foto(foto, carpeta_path, nombre_archivo)
+            elif id_subida:
+                subida = leer_subida(id_subida)
+                nombre_archivo = f"{nombre_base}_{i}{os.path.splitext(subida['nombre'])[1] or '.jpg'}"
+                registrar_referencia_foto(carpeta_path, nombre_archivo, subida["sha256"], subida["bytes"])
+            else:
+                continue
+        guardadas += 1
+        logging.info(f"Foto {foto_key} guardada en {os.path.join(carpeta_path, nombre_archivo)}")
+
+    if guardadas:
+        try:
+            with medir_span("actualizar_manifiesto"):
+                manifiesto_fotos.actualizar_carpeta(carpeta_path, data.get("nombre_chofer"), data.get("placa"))
+        except Exception as e:
+            logging.exception(f"Error al actualizar el manifiesto de fotos: {str(e)}")
+
+# Subidas reanudables: la foto se envía por partes a un archivo temporal y al confirmarla
+# pasa al almacén por contenido; el formulario solo envía el id de la subida
+_PATRON_ID_SUBIDA = re.compile(r"^[0-9a-f]{32}$")
+_subidas_lock = threading.Lock()
+_locks_por_subida = {}
+
+def lock_subida(id_subida):
+    """Devuelve el lock de una subida, para que sus partes se escriban de a una."""
+    with _subidas_lock:
+        return _locks_por_subida.setdefault(id_subida, threading.Lock())
+
+def ruta_subida(id_subida, extension):
+    """Devuelve la ruta de los metadatos (.json) o los datos (.parte) de una subida."""
+    if not _PATRON_ID_SUBIDA.match(id_subida or ""):
+        raise ValueError("Id de subida inválido")
+    return os.path.join(SUBIDAS_DIR, f"{id_subida}{extension}")
+
+def leer_subida(id_subida):
+    """Devuelve los metadatos de una subida o None si no existe."""
+    try:
+        with open(ruta_subida(id_subida, ".json"), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def offset_subida(id_subida):
+    """Cantidad de bytes recibidos de una subida."""
+    try:
+        return os.path.getsize(ruta_subida(id_subida, ".parte"))
+    except FileNotFoundError:
+        return 0
+
+def limpiar_subidas_vencidas():
+    """Elimina las subidas sin actividad durante la vigencia configurada.
+
+    La actividad es la última modificación de los metadatos o de los datos recibidos, así que
+    se eliminan también las sesiones que nunca recibieron bytes y las ya confirmadas (cuyo
+    formulario ya no se enviará). Se descarta además el lock en memoria de cada subida eliminada.
+    """
+    limite = time.time() - SUBIDAS_VIGENCIA_HORAS * 3600
+    ids = {os.path.splitext(nombre)[0] for nombre in os.listdir(asegurar_archivo(SUBIDAS_DIR))
+           if nombre.endswith((".json", ".parte"))}
+    for id_subida in ids:
+        if not _PATRON_ID_SUBIDA.match(id_subida):
+            continue
+        rutas = [ruta_subida(id_subida, ".json"), ruta_subida(id_subida, ".parte")]
+        try:
+            ultima_actividad = max(os.path.getmtime(ruta) for ruta in rutas if os.path.exists(ruta))
+        except ValueError:
+            continue  # Eliminada por otra solicitud mientras tanto
+        if ultima_actividad >= limite:
+            continue
+        with _subidas_lock:
+            lock = _locks_por_subida.get(id_subida)
+        if lock is not None and not lock.acquire(blocking=False):
+            continue  # Hay una parte escribiéndose en este momento
+        try:
+            for ruta in rutas:
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+            with _subidas_lock:
+                _locks_por_subida.pop(id_subida, None)
+        finally:
+            if lock is not None:
+                lock.release()
+        logging.info(f"Subida vencida eliminada: {id_subida}")
+
+def validar_subidas_formulario(data):
+    """Devuelve un mensaje de error si el formulario referencia subidas inexistentes o sin confirmar."""
+    for campo, id_subida in data.items():
+        if campo.startswith("foto_km_") and campo.endswith("_subida") and id_subida:
+            try:
+                subida = leer_subida(id_subida)
+            except ValueError:
+                subida = None
+            if subida is None or not subida.get("confirmada"):
+                return f"La subida {id_subida} de {campo[:-len('_subida')]} no existe o no fue confirmada."
+    return None
+
 # Funciones y rutas para la app de choferes
+def cargar_libro_choferes(periodo):
+    """Carga la partición de registros de choferes del periodo dado; devuelve (wb, ruta) o (None, ruta).
+
+    Con PERIODO_HISTORICO carga el libro sin particionar, si existe.
+    """
+    import openpyxl
+    ruta_libro = REGISTROS_CHOFERES_EXCEL if periodo == PERIODO_HISTORICO else ruta_particion(REGISTROS_CHOFERES_EXCEL, periodo)
+    if periodo == PERIODO_HISTORICO:
+        if not os.path.exists(ruta_libro):
+            return None, ruta_libro
+    elif periodo == periodo_actual():
+        asegurar_archivo(ruta_libro)
+    elif not os.path.exists(ruta_libro):
+        return None, ruta_libro
+    with medir_span("cargar_libro"):
+        return openpyxl.load_workbook(ruta_libro), ruta_libro
+
 def procesar_datos_choferes(data, files):
     """Procesa los datos del formulario de choferes o solo guarda fotos si se proporciona un row_idx."""
     try:
-        wb_choferes = openpyxl.load_workbook(REGISTROS_CHOFERES_EXCEL)
-        ws_choferes = wb_choferes.active
+        asegurar_archivo(FOTOS_VEHICULOS_DIR)
 
         nombre_chofer = data.get("nombre_chofer")
         placa = data.get("placa")
         tipo_formulario = data.get("tipo_formulario")
         row_idx = data.get("row_idx")  # Identificador de fila (opcional)
+        periodo_libro = data.get("periodo") or periodo_actual()  # Partición mensual del registro
+
+        error_subidas = validar_subidas_formulario(data)
+        if error_subidas:
+            return False, error_subidas
+
+        wb_choferes, ruta_libro = cargar_libro_choferes(periodo_libro)
+        if wb_choferes is None:
+            return False, "Periodo de registro inválido."
+        ws_choferes = wb_choferes.active
 
         # Función para generar el nombre de la subcarpeta
         def generar_nombre_subcarpeta(fecha_salida, nombre_chofer, placa):
@@ -698,15 +2984,8 @@ def procesar_datos_choferes(data, files):
                     logging.info(f"Subcarpeta creada: {subcarpeta_path}")
 
                 # Guardar las fotos de llegada en la subcarpeta
-                for i in range(1, 5):
-                    foto_key = f"foto_km_final_{i}"
-                    foto_fin = files.get(foto_key)
-                    if foto_fin:
-                        original_extension = os.path.splitext(foto_fin.filename)[1] if foto_fin.filename else ".jpg"
-                        filename_fin = f"{subcarpeta_nombre}_llegada_{i}{original_extension}"
-                        path_fin = os.path.join(subcarpeta_path, filename_fin)
-                        foto_fin.save(path_fin)
-                        logging.info(f"Foto de fin {i} guardada en {path_fin} para fila {row_idx}")
+                guardar_fotos_formulario(data, files, "foto_km_final", subcarpeta_path,
+                                         f"{subcarpeta_nombre}_llegada", "llegada")
                 return True, "Fotos de llegada guardadas correctamente."
             except ValueError:
                 return False, "Índice de fila debe ser un número entero."
@@ -714,6 +2993,7 @@ def procesar_datos_choferes(data, files):
         # Lógica para formulario de salida
         if tipo_formulario == "salida":
             fecha_salida = data.get("fecha_salida")
+            fecha_salida_date = datetime.strptime(fecha_salida or "", "%Y-%m-%d").date()
             # Generar el nombre de la subcarpeta
             subcarpeta_nombre = generar_nombre_subcarpeta(fecha_salida, nombre_chofer, placa)
             subcarpeta_path = os.path.join(FOTOS_VEHICULOS_DIR, subcarpeta_nombre)
@@ -724,18 +3004,10 @@ def procesar_datos_choferes(data, files):
                 logging.info(f"Subcarpeta creada: {subcarpeta_path}")
 
             # Guardar las fotos de salida en la subcarpeta
-            for i in range(1, 5):
-                foto_key = f"foto_km_inicial_{i}"
-                foto_inicio = files.get(foto_key)
-                if foto_inicio:
-                    original_extension = os.path.splitext(foto_inicio.filename)[1] if foto_inicio.filename else ".jpg"
-                    filename_inicio = f"{subcarpeta_nombre}_salida_{i}{original_extension}"
-                    path_inicio = os.path.join(subcarpeta_path, filename_inicio)
-                    foto_inicio.save(path_inicio)
-                    logging.info(f"Foto de inicio {i} guardada en {path_inicio}")
+            guardar_fotos_formulario(data, files, "foto_km_inicial", subcarpeta_path,
+                                     f"{subcarpeta_nombre}_salida", "salida")
 
             # Guardar los datos en el Excel
-            fecha_salida_date = datetime.strptime(fecha_salida, "%Y-%m-%d").date()
             fila_salida = [
                 fecha_salida_date,  # Fecha
                 nombre_chofer,
@@ -749,18 +3021,44 @@ def procesar_datos_choferes(data, files):
                 None, None, None, None, None
             ]
             ws_choferes.append(fila_salida)
-            wb_choferes.save(REGISTROS_CHOFERES_EXCEL)
+            with medir_span("guardar_libro"):
+                wb_choferes.save(ruta_libro)
             logging.info(f"Datos de salida guardados en nueva fila.")
+            periodo_evento = periodo_libro if ruta_libro != REGISTROS_CHOFERES_EXCEL else None
+            registrar_eventos_viaje(evento_salida(periodo_evento, ws_choferes.max_row, fila_salida))
             return True, "Datos de salida guardados correctamente."
 
         # Lógica para formulario de llegada
         elif tipo_formulario == "llegada":
             ultimo_registro = None
-            for row_idx in range(ws_choferes.max_row, 1, -1):
-                if (ws_choferes.cell(row=row_idx, column=2).value == nombre_chofer and
-                    ws_choferes.cell(row=row_idx, column=4).value == placa):
-                    ultimo_registro = row_idx
-                    break
+            with medir_span("buscar_registro"):
+                for row_idx in range(ws_choferes.max_row, 1, -1):
+                    if (ws_choferes.cell(row=row_idx, column=2).value == nombre_chofer and
+                        ws_choferes.cell(row=row_idx, column=4).value == placa):
+                        ultimo_registro = row_idx
+                        break
+
+            # Un viaje que salió en un mes anterior tiene su registro en esa partición (o en el
+            # libro histórico): se revisan de la más nueva a la más antigua hasta encontrarlo
+            if not ultimo_registro and PARTICIONADO_MENSUAL and periodo_libro != PERIODO_HISTORICO:
+                anteriores = [periodo or PERIODO_HISTORICO
+                              for periodo, _ in reversed(listar_particiones(REGISTROS_CHOFERES_EXCEL))
+                              if periodo is None or periodo < periodo_libro]
+                for periodo_busqueda in anteriores:
+                    wb_anterior, ruta_anterior = cargar_libro_choferes(periodo_busqueda)
+                    if wb_anterior is None:
+                        continue
+                    ws_anterior = wb_anterior.active
+                    with medir_span("buscar_registro_anterior"):
+                        for row_idx in range(ws_anterior.max_row, 1, -1):
+                            if (ws_anterior.cell(row=row_idx, column=2).value == nombre_chofer and
+                                ws_anterior.cell(row=row_idx, column=4).value == placa):
+                                ultimo_registro = row_idx
+                                break
+                    if ultimo_registro:
+                        wb_choferes, ws_choferes, ruta_libro = wb_anterior, ws_anterior, ruta_anterior
+                        periodo_libro = periodo_busqueda
+                        break
 
             if ultimo_registro:
                 if (ws_choferes.cell(row=ultimo_registro, column=10).value is None and
@@ -774,8 +3072,13 @@ def procesar_datos_choferes(data, files):
                     ws_choferes.cell(row=ultimo_registro, column=12).value = data.get("ubicacion_final")
                     ws_choferes.cell(row=ultimo_registro, column=13).value = data.get("km_final")
                     ws_choferes.cell(row=ultimo_registro, column=14).value = data.get("observaciones_llegada")
-                    wb_choferes.save(REGISTROS_CHOFERES_EXCEL)
+                    with medir_span("guardar_libro"):
+                        wb_choferes.save(ruta_libro)
                     logging.info(f"Datos de llegada actualizados en fila {ultimo_registro}.")
+                    periodo_evento = periodo_libro if ruta_libro != REGISTROS_CHOFERES_EXCEL else None
+                    registrar_eventos_viaje(evento_llegada(
+                        periodo_evento, ultimo_registro, [c.value for c in ws_choferes[ultimo_registro][:14]]
+                    ))
 
                     # Obtener la fecha de salida desde el Excel (columna 5: Fecha de Salida)
                     fecha_salida_excel = ws_choferes.cell(row=ultimo_registro, column=5).value
@@ -794,34 +3097,37 @@ def procesar_datos_choferes(data, files):
                         logging.info(f"Subcarpeta creada: {subcarpeta_path}")
 
                     # Guardar las fotos de llegada en la subcarpeta
-                    for i in range(1, 5):
-                        foto_key = f"foto_km_final_{i}"
-                        foto_fin = files.get(foto_key)
-                        if foto_fin:
-                            original_extension = os.path.splitext(foto_fin.filename)[1] if foto_fin.filename else ".jpg"
-                            filename_fin = f"{subcarpeta_nombre}_llegada_{i}{original_extension}"
-                            path_fin = os.path.join(subcarpeta_path, filename_fin)
-                            foto_fin.save(path_fin)
-                            logging.info(f"Foto de fin {i} guardada en {path_fin} para fila {ultimo_registro}")
-
-                    return True, "Datos de llegada actualizados correctamente.", ultimo_registro
+                    guardar_fotos_formulario(data, files, "foto_km_final", subcarpeta_path,
+                                             f"{subcarpeta_nombre}_llegada", "llegada")
+
+                    return True, "Datos de llegada actualizados correctamente.", ultimo_registro, periodo_libro
                 else:
                     return False, "El último registro ya tiene datos de llegada. No puedes actualizarlo."
             else:
                 return False, "No has enviado el Formulario de Datos de Salida correspondiente."
 
+    except ValueError as e:
+        # Fechas u otros campos con formato incorrecto: error del formulario, no del servidor
+        logging.warning(f"Datos de choferes no válidos: {str(e)}")
+        return False, f"Datos no válidos: {str(e)}"
     except Exception as e:
-        logging.error(f"Error al procesar datos de choferes: {str(e)}")
-        return False, f"Error al procesar datos: {str(e)}"
+        logging.exception(f"Error al procesar datos de choferes: {str(e)}")
+        raise
 
 @app.route('/api/recibir_datos_choferes', methods=['POST'])
+@idempotente
+@admitir("choferes")
 def recibir_datos_choferes():
     """Recibe datos o fotos del formulario de choferes."""
-    result = procesar_datos_choferes(request.form, request.files)
-    if len(result) == 3:  # Caso con row_idx
-        success, message, row_idx = result
+    try:
+        result = procesar_datos_choferes(request.form, request.files)
+    except Exception as e:
+        # 5xx: la clave de idempotencia se libera y el reintento vuelve a procesar el envío
+        return jsonify({"status": "error", "message": f"Error al procesar datos: {str(e)}"}), 500
+    if len(result) == 4:  # Caso con row_idx
+        success, message, row_idx, periodo = result
         if success:
-            return jsonify({"status": "success", "message": message, "row_idx": row_idx}), 200
+            return jsonify({"status": "success", "message": message, "row_idx": row_idx, "periodo": periodo}), 200
         else:
             return jsonify({"status": "error", "message": message}), 400
     else:  # Caso sin row_idx
@@ -831,6 +3137,137 @@ def recibir_datos_choferes():
         else:
             return jsonify({"status": "error", "message": message}), 400
 
+@app.route('/api/subidas', methods=['POST'])
+def crear_subida():
+    """Crea una subida reanudable; el cuerpo JSON indica nombre, tamano (bytes) y opcionalmente sha256."""
+    datos = request.get_json(silent=True) or {}
+    try:
+        tamano = int(datos['tamano']) if datos.get('tamano') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "tamano debe ser un número entero de bytes"}), 400
+    if tamano is not None and not 0 < tamano <= SUBIDAS_TAMANO_MAX:
+        return jsonify({"error": f"tamano debe estar entre 1 y {SUBIDAS_TAMANO_MAX} bytes"}), 413
+    try:
+        limpiar_subidas_vencidas()
+        id_subida = uuid.uuid4().hex
+        subida = {
+            "id": id_subida, "nombre": os.path.basename(str(datos.get('nombre') or "foto.jpg")),
+            "tamano": tamano, "sha256": datos.get('sha256'), "confirmada": False,
+            "creada": datetime.now().isoformat(timespec="seconds")
+        }
+        open(ruta_subida(id_subida, ".parte"), 'wb').close()
+        escribir_json_atomico(ruta_subida(id_subida, ".json"), subida)
+        logging.info(f"Subida creada: {id_subida} ({subida['nombre']}, {tamano} bytes)")
+        respuesta = jsonify({"id": id_subida, "offset": 0})
+        respuesta.headers["Location"] = f"/api/subidas/{id_subida}"
+        return respuesta, 201
+    except Exception as e:
+        logging.exception(f"Error al crear subida: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/subidas/<id_subida>', methods=['HEAD', 'GET'])
+def estado_subida(id_subida):
+    """Devuelve cuántos bytes de la subida recibió el servidor (cabecera Upload-Offset)."""
+    try:
+        subida = leer_subida(id_subida)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if subida is None:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    offset = subida["bytes"] if subida["confirmada"] else offset_subida(id_subida)
+    respuesta = jsonify(dict(subida, offset=offset))
+    respuesta.headers["Upload-Offset"] = str(offset)
+    return respuesta
+
+@app.route('/api/subidas/<id_subida>', methods=['PUT', 'PATCH'])
+@admitir("subidas")
+def recibir_parte_subida(id_subida):
+    """Anexa una parte a la subida; la posición va en Upload-Offset o Content-Range.
+
+    La parte se copia del flujo de la solicitud al disco por bloques, sin cargarla en memoria.
+    Si la posición no coincide con lo ya recibido se responde 409 con el offset actual.
+    """
+    try:
+        subida = leer_subida(id_subida)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if subida is None:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    if subida["confirmada"]:
+        return jsonify({"error": "La subida ya fue confirmada"}), 409
+
+    rango = re.match(r"bytes (\d+)-\d+/(?:\d+|\*)", request.headers.get("Content-Range", ""))
+    offset_pedido = request.headers.get("Upload-Offset") or (rango.group(1) if rango else None) or request.args.get("offset")
+    if offset_pedido is None or not str(offset_pedido).isdigit():
+        return jsonify({"error": "Falta la posición de la parte (Upload-Offset o Content-Range)"}), 400
+
+    try:
+        with lock_subida(id_subida):
+            offset = offset_subida(id_subida)
+            if int(offset_pedido) != offset:
+                respuesta = jsonify({"error": "La posición no coincide con lo recibido", "offset": offset})
+                respuesta.headers["Upload-Offset"] = str(offset)
+                return respuesta, 409
+            limite = min(subida["tamano"] or SUBIDAS_TAMANO_MAX, SUBIDAS_TAMANO_MAX)
+            with open(ruta_subida(id_subida, ".parte"), 'ab') as f:
+                for bloque in iter(lambda: request.stream.read(256 * 1024), b""):
+                    if offset + len(bloque) > limite:
+                        f.truncate(offset)
+                        return jsonify({"error": f"La subida excede {limite} bytes", "offset": offset}), 413
+                    f.write(bloque)
+                    offset += len(bloque)
+        respuesta = jsonify({"id": id_subida, "offset": offset})
+        respuesta.headers["Upload-Offset"] = str(offset)
+        return respuesta
+    except Exception as e:
+        logging.exception(f"Error al recibir parte de la subida {id_subida}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/subidas/<id_subida>/confirmar', methods=['POST'])
+def confirmar_subida(id_subida):
+    """Verifica tamaño y hash de la subida completa y la mueve al almacén de fotos."""
+    try:
+        subida = leer_subida(id_subida)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if subida is None:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    if subida["confirmada"]:
+        return jsonify(subida)
+
+    try:
+        with lock_subida(id_subida):
+            ruta_parte = ruta_subida(id_subida, ".parte")
+            recibido = offset_subida(id_subida)
+            if recibido == 0 or (subida["tamano"] is not None and recibido != subida["tamano"]):
+                return jsonify({"error": "La subida está incompleta", "offset": recibido, "tamano": subida["tamano"]}), 409
+            hash_foto = hashlib.sha256()
+            with open(ruta_parte, 'rb') as f:
+                for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                    hash_foto.update(bloque)
+            digest = hash_foto.hexdigest()
+            if subida["sha256"] and subida["sha256"].lower() != digest:
+                os.remove(ruta_parte)
+                open(ruta_parte, 'wb').close()
+                return jsonify({"error": "El hash no coincide; la subida se reinició", "offset": 0}), 422
+
+            destino = ruta_blob(digest)
+            if os.path.exists(destino):
+                os.remove(ruta_parte)
+            else:
+                asegurar_archivo(FOTOS_BLOBS_DIR)
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                os.replace(ruta_parte, destino)
+            subida.update(confirmada=True, sha256=digest, bytes=recibido)
+            escribir_json_atomico(ruta_subida(id_subida, ".json"), subida)
+        with _subidas_lock:
+            _locks_por_subida.pop(id_subida, None)
+        logging.info(f"Subida confirmada: {id_subida} ({recibido} bytes, sha256 {digest[:12]})")
+        return jsonify(subida)
+    except Exception as e:
+        logging.exception(f"Error al confirmar la subida {id_subida}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 
 @app.route('/api/conductores', methods=['GET'])
 def get_conductores():
@@ -839,13 +3276,13 @@ def get_conductores():
         if not os.path.exists(CONDUCTORES_CSV_PATH):
             return jsonify({"error": f"No se encontró el archivo de conductores"}), 404
 
-        df = pd.read_csv(CONDUCTORES_CSV_PATH)
+        df = cache_catalogos.obtener(CONDUCTORES_CSV_PATH)
         if 'conductor' in df.columns:
-            conductores = df['conductor'].dropna().astype(str).tolist()
+            df = df.dropna(subset=['conductor']).astype({'conductor': str})
+            return respuesta_catalogo(df, escalar='conductor')
         else:
-            conductores = []
             logging.warning(f"La columna 'conductor' no se encontró en {CONDUCTORES_CSV_PATH}")
-        return jsonify(conductores)
+            return jsonify([])
 
     except Exception as e:
         logging.error(f"Error al leer el archivo de conductores: {str(e)}")
@@ -857,10 +3294,10 @@ def get_vehiculos_info():
     try:
         if not os.path.exists(VEHICULOS_INFO_CSV_PATH):
             return jsonify({"error": f"No se encontró el archivo de vehículos"}), 404
-        df = pd.read_csv(VEHICULOS_INFO_CSV_PATH)
+        df = cache_catalogos.obtener(VEHICULOS_INFO_CSV_PATH)
         if 'tipo_vehiculo' in df.columns and 'placa' in df.columns:
-            vehiculos = df[['tipo_vehiculo', 'placa']].dropna().astype(str).to_dict('records')
-            return jsonify(vehiculos)
+            df = df[['tipo_vehiculo', 'placa', '_modificado']].dropna().astype(str)
+            return respuesta_catalogo(df)
         else:
             missing_cols = []
             if 'tipo_vehiculo' not in df.columns:
@@ -879,22 +3316,67 @@ def descargar_registro_rutas():
     """Descarga el archivo Excel de registros de choferes."""
     try:
         logging.info(f"Intentando enviar archivo de registro de rutas: {REGISTROS_CHOFERES_EXCEL}")
-        return send_file(REGISTROS_CHOFERES_EXCEL, as_attachment=True, download_name='registros_choferes.xlsx')
+        return enviar_libro_particionado(REGISTROS_CHOFERES_EXCEL, 'registros_choferes.xlsx')
     except Exception as e:
         logging.error(f"Error al generar descarga de Excel de registros de choferes: {str(e)}")
         return str(e), 500
 
+@app.route('/api/viajes/<tipo>', methods=['GET'])
+def consultar_viajes(tipo):
+    """Analítica de viajes: totales por vehículo o chofer, viajes abiertos y anomalías."""
+    tipos = {"vehiculos": ("vehiculos", "placa"), "choferes": ("choferes", "chofer"),
+             "abiertos": ("abiertos", None), "anomalias": ("anomalias", None)}
+    if tipo not in tipos:
+        return jsonify({"error": f"Tipo de consulta no válido. Opciones: {', '.join(tipos)}"}), 400
+    try:
+        asegurar_archivo(INDICES_DIR)
+        grupo, parametro = tipos[tipo]
+        clave = request.args.get(parametro) if parametro else None
+        resultados = analitica_viajes.consultar(grupo, clave)
+        placa = request.args.get('placa')
+        if placa and tipo in ("abiertos", "anomalias"):
+            resultados = [r for r in resultados if str(r.get("placa")).upper() == placa.upper()]
+        return jsonify({"tipo": tipo, "total": len(resultados), "resultados": resultados})
+    except Exception as e:
+        logging.exception(f"Error al consultar la analítica de viajes: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.cli.command("reconstruir-viajes")
+def reconstruir_viajes_cli():
+    """Reconstruye los eventos de viaje desde los archivos Excel y recalcula la analítica."""
+    total = viajes_choferes.reconstruir()
+    print(f"Eventos de viaje reconstruidos: {total}")
+    analitica_viajes.reconstruir()
+    print("Analítica de viajes recalculada")
+
 @app.route('/api/listar-carpetas-fotos', methods=['GET'])
 def listar_carpetas_fotos():
-    """Devuelve la lista de carpetas con el número de fotos en cada una."""
+    """Devuelve las carpetas de fotos desde el manifiesto.
+
+    Sin parámetros responde {carpeta: número de fotos}; con filtros (desde, hasta, chofer,
+    placa) o paginación (limite, cursor) responde las entradas completas del manifiesto.
+    """
+    filtros = ('desde', 'hasta', 'chofer', 'placa', 'limite', 'cursor')
+    try:
+        limite, cursor = leer_paginacion()
+        desde = _fecha_iso(request.args['desde'].strip(), estricto=True) if request.args.get('desde') else None
+        hasta = _fecha_iso(request.args['hasta'].strip(), estricto=True) if request.args.get('hasta') else None
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros no válidos: {str(e)}"}), 400
+
     try:
-        carpetas = {}
-        for nombre in os.listdir(FOTOS_VEHICULOS_DIR):
-            carpeta_path = os.path.join(FOTOS_VEHICULOS_DIR, nombre)
-            if os.path.isdir(carpeta_path):
-                num_fotos = len([f for f in os.listdir(carpeta_path) if os.path.isfile(os.path.join(carpeta_path, f))])
-                carpetas[nombre] = num_fotos
-        return jsonify(carpetas)
+        asegurar_archivo(FOTOS_VEHICULOS_DIR)
+        asegurar_archivo(INDICES_DIR)
+        carpetas = manifiesto_fotos.consultar(desde, hasta, request.args.get('chofer'), request.args.get('placa'))
+        if not any(request.args.get(f) for f in filtros):
+            return jsonify({c["carpeta"]: c["fotos"] for c in carpetas})
+        siguiente = cursor + limite if cursor + limite < len(carpetas) else None
+        return jsonify({
+            "total": len(carpetas),
+            "cursor": cursor,
+            "siguiente_cursor": siguiente,
+            "resultados": carpetas[cursor:cursor + limite]
+        })
     except Exception as e:
         logging.error(f"Error al listar carpetas de fotos: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -909,11 +3391,7 @@ def descargar_carpeta_fotos_especifica(nombre_carpeta):
 
         zip_file_path = os.path.join(BASE_DIR, f"{nombre_carpeta}.zip")
         with zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(carpeta_path):
-                for file in files:
-                    zipf.write(os.path.join(root, file),
-                              os.path.relpath(os.path.join(root, file),
-                                             os.path.join(carpeta_path, '..')))
+            agregar_carpeta_a_zip(zipf, carpeta_path, nombre_carpeta)
 
         # Enviar el archivo ZIP al cliente
         response = send_file(zip_file_path, as_attachment=True, download_name=f"{nombre_carpeta}.zip")
@@ -933,27 +3411,68 @@ def descargar_carpeta_fotos():
     try:
         zip_file_path = os.path.join(BASE_DIR, "fotos_vehiculos.zip")
         with zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(FOTOS_VEHICULOS_DIR):
-                for file in files:
-                    zipf.write(os.path.join(root, file),
-                               os.path.relpath(os.path.join(root, file),
-                                               os.path.join(FOTOS_VEHICULOS_DIR, '..')))
+            for nombre in sorted(os.listdir(asegurar_archivo(FOTOS_VEHICULOS_DIR))):
+                carpeta_path = os.path.join(FOTOS_VEHICULOS_DIR, nombre)
+                if os.path.isdir(carpeta_path):
+                    agregar_carpeta_a_zip(zipf, carpeta_path, os.path.join("fotos_vehiculos", nombre))
         logging.info(f"Intentando enviar carpeta de fotos comprimida: {zip_file_path}")
         return send_file(zip_file_path, as_attachment=True, download_name='fotos_vehiculos.zip')
     except Exception as e:
         logging.error(f"Error al comprimir o descargar la carpeta de fotos: {str(e)}")
         return str(e), 500
 
+@app.cli.command("reconstruir-manifiesto-fotos")
+def reconstruir_manifiesto_fotos_cli():
+    """Reconstruye el manifiesto de carpetas de fotos recorriendo el disco."""
+    total = manifiesto_fotos.reconstruir()
+    print(f"Manifiesto de fotos reconstruido: {total} carpetas")
+
+@app.cli.command("deduplicar-fotos")
+def deduplicar_fotos_cli():
+    """Mueve las fotos guardadas como archivos al almacén por contenido y deja referencias."""
+    from werkzeug.datastructures import FileStorage
+    movidas = liberados = 0
+    for nombre_carpeta in sorted(os.listdir(asegurar_archivo(FOTOS_VEHICULOS_DIR))):
+        carpeta_path = os.path.join(FOTOS_VEHICULOS_DIR, nombre_carpeta)
+        if not os.path.isdir(carpeta_path):
+            continue
+        for nombre in sorted(os.listdir(carpeta_path)):
+            ruta = os.path.join(carpeta_path, nombre)
+            if nombre == REFERENCIAS_FOTOS or not os.path.isfile(ruta):
+                continue
+            with open(ruta, 'rb') as f:
+                if not guardar_foto(FileStorage(f, filename=nombre), carpeta_path, nombre):
+                    liberados += os.path.getsize(ruta)
+            os.remove(ruta)
+            movidas += 1
+    manifiesto_fotos.reconstruir()
+    print(f"Fotos movidas al almacén: {movidas}; bytes duplicados liberados: {liberados}")
+
 
 # API endpoints para el sistema de logística
 @app.route('/api/logistica/materiales', methods=['GET'])
 def obtener_materiales_logistica():
-    """Devuelve la lista de materiales desde el archivo CSV de logística."""
+    """Devuelve la lista de materiales desde el archivo CSV de logística.
+
+    ?buscar= filtra por texto contenido en el nombre del material (sin distinguir mayúsculas).
+    """
     try:
+        asegurar_archivo(LOGISTICA_MATERIALES_CSV_PATH)
         if os.path.exists(LOGISTICA_MATERIALES_CSV_PATH):
-            df = pd.read_csv(LOGISTICA_MATERIALES_CSV_PATH)
-            materiales = df[['material', 'unidad']].to_dict('records')
-            return jsonify(materiales)
+            catalogo = obtener_catalogo_logistica()
+            if not request.args:
+                respuesta = app.response_class(catalogo.cuerpo_json, mimetype="application/json")
+                respuesta.headers["X-Total"] = str(catalogo.total)
+                if catalogo.marca:
+                    respuesta.headers["X-Modificado-Hasta"] = catalogo.marca
+                return respuesta
+            df = catalogo.df
+            if request.args.get('buscar', '').strip():
+                df = df[catalogo.busqueda.str.contains(request.args['buscar'].strip().upper(), regex=False)]
+            if not request.args.get('campos'):
+                # Por defecto solo lo que usa el formulario; el resto de columnas con ?campos=
+                df = df[['material', 'unidad', '_modificado']]
+            return respuesta_catalogo(df)
         else:
             return jsonify({"error": "Archivo de materiales de logística no encontrado"}), 404
     except Exception as e:
@@ -961,11 +3480,13 @@ def obtener_materiales_logistica():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/logistica/enviar-requerimientos', methods=['POST'])
+@idempotente
+@admitir("logistica")
 def recibir_requerimientos_logistica():
     """Recibe los datos de requerimientos desde la app Android de logística."""
     try:
         datos = request.json
-        logging.info(f"Datos de logística recibidos: {datos}")
+        logging.info(f"Datos de logística recibidos: {resumir_payload(datos)}")
 
         if procesar_logistica_requerimientos(datos):
             return jsonify({"status": "success", "message": "Requerimientos procesados correctamente"}), 200
@@ -975,6 +3496,178 @@ def recibir_requerimientos_logistica():
         logging.exception(f"Error al recibir requerimientos de logística: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/logistica/adquisiciones', methods=['POST'])
+@idempotente
+@admitir("logistica")
+def registrar_adquisiciones_logistica():
+    """Registra cantidades adquiridas por producto; se asignan a los requerimientos pendientes."""
+    datos = request.json or {}
+    adquisiciones = datos.get('adquisiciones', [datos] if datos.get('producto') else [])
+    entradas = []
+    for adquisicion in adquisiciones:
+        cantidad = a_numero(adquisicion.get('cantidad'))
+        if not adquisicion.get('producto') or cantidad <= 0:
+            return jsonify({"error": "Cada adquisición requiere producto y una cantidad positiva"}), 400
+        entradas.append({
+            "fecha": adquisicion.get('fecha') or datetime.now().strftime("%Y-%m-%d"),
+            "producto": adquisicion['producto'],
+            "unidad": adquisicion.get('unidad', ''),
+            "cantidad": cantidad,
+            "proveedor": adquisicion.get('proveedor', '')
+        })
+    if not entradas:
+        return jsonify({"error": "No se recibieron adquisiciones"}), 400
+    try:
+        asegurar_archivo(INDICES_DIR)
+        adquisiciones_logistica.agregar(*entradas)
+        logging.info(f"Adquisiciones de logística registradas: {len(entradas)}")
+        return jsonify({"status": "success", "registradas": len(entradas)}), 200
+    except Exception as e:
+        logging.exception(f"Error al registrar adquisiciones de logística: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/logistica/saldos', methods=['GET'])
+def consultar_saldos_logistica():
+    """Stock, Adquirido, Saldo y costo de cada línea de requerimiento y totales por orden de trabajo."""
+    try:
+        limite, cursor = leer_paginacion()
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros no válidos: {str(e)}"}), 400
+    estado = request.args.get('estado', 'todos')
+    if estado not in ('todos', 'pendiente', 'atendido'):
+        return jsonify({"error": "Estado no válido. Opciones: todos, pendiente, atendido"}), 400
+
+    try:
+        asegurar_archivo(INDICES_DIR)
+        df = motor_saldos.calcular()
+        orden_trabajo = request.args.get('orden_trabajo')
+        if orden_trabajo:
+            df = df[df['orden_trabajo'].astype(str) == orden_trabajo]
+        if estado == 'pendiente':
+            df = df[df['saldo'] > 0]
+        elif estado == 'atendido':
+            df = df[df['saldo'] <= 0]
+
+        totales = df.groupby('orden_trabajo', sort=False).agg(
+            lineas=('cantidad', 'size'),
+            lineas_pendientes=('saldo', lambda s: int((s > 0).sum())),
+            cantidad=('cantidad', 'sum'), stock=('stock', 'sum'),
+            adquirido=('adquirido', 'sum'), saldo=('saldo', 'sum'),
+            costo_total=('costo_total', 'sum'), costo_pendiente=('costo_pendiente', 'sum')
+        ).reset_index()
+        pagina = df.iloc[cursor:cursor + limite].drop(columns=['clave'])
+        siguiente = cursor + limite if cursor + limite < len(df) else None
+        return jsonify({
+            "total": len(df),
+            "cursor": cursor,
+            "siguiente_cursor": siguiente,
+            "resultados": pagina.astype(object).where(pagina.notna(), None).to_dict('records'),
+            "ordenes": totales.to_dict('records')
+        })
+    except Exception as e:
+        logging.exception(f"Error al consultar saldos de logística: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/logistica/consolidado', methods=['GET'])
+def consultar_consolidado_logistica():
+    """Lista de materiales sumada por producto, orden de trabajo o cliente."""
+    estado = request.args.get('estado', 'pendiente')
+    agrupar = request.args.get('agrupar', 'producto')
+    if estado not in ('pendiente', 'todos'):
+        return jsonify({"error": "Estado no válido. Opciones: pendiente, todos"}), 400
+    if agrupar not in AGRUPACIONES_CONSOLIDADO:
+        return jsonify({"error": f"Agrupación no válida. Opciones: {', '.join(AGRUPACIONES_CONSOLIDADO)}"}), 400
+    try:
+        asegurar_archivo(INDICES_DIR)
+        grupos = consolidado_logistica.consultar(agrupar, estado)
+        return jsonify({"estado": estado, "agrupar": agrupar, "total": len(grupos), "resultados": grupos})
+    except Exception as e:
+        logging.exception(f"Error al consultar el consolidado de logística: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/eventos', methods=['GET'])
+def eventos():
+    """Flujo Server-Sent Events de los envíos nuevos (reportes, requerimientos, logística y viajes).
+
+    Acepta Last-Event-ID (o ?ultimo_id=) para retomar sin perder eventos.
+    """
+    ultimo = request.headers.get('Last-Event-ID') or request.args.get('ultimo_id')
+    try:
+        ultimo_id = int(ultimo) if ultimo else None
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID no válido"}), 400
+
+    suscripcion = central_eventos.suscribir(ultimo_id)
+    if suscripcion is None:
+        respuesta = jsonify({"error": "Demasiados clientes conectados a los eventos; intente más tarde"})
+        respuesta.status_code = 503
+        respuesta.headers['Retry-After'] = str(EVENTOS_REINTENTO_MS // 1000)
+        return respuesta
+
+    oyente, pendientes = suscripcion
+    logging.info(f"Oyente de eventos conectado ({central_eventos.cantidad_oyentes()}/{EVENTOS_OYENTES_MAX})")
+    return Response(
+        flujo_eventos(oyente, pendientes), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/logistica/version', methods=['GET'])
+def version_logistica():
+    """Versión actual de los requerimientos de logística (respuesta mínima para consultas periódicas)."""
+    try:
+        asegurar_archivo(INDICES_DIR)
+        version = describir_version_logistica(motor_saldos.version())
+        respuesta = jsonify(version)
+        respuesta.set_etag(f"{version['registro']}-{version['lineas']}-{version['saldos']}")
+        respuesta.headers['Cache-Control'] = 'no-cache'
+        return respuesta.make_conditional(request)
+    except Exception as e:
+        logging.exception(f"Error al consultar la versión de logística: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/logistica/lineas', methods=['GET'])
+def lineas_nuevas_logistica():
+    """Líneas de requerimiento a partir de ?cursor= (cantidad de líneas que ya tiene el cliente).
+
+    Con ?registro= se verifica que el registro no haya sido reconstruido; si lo fue, responde
+    409 y el cliente debe descargar el libro completo.
+    """
+    try:
+        limite, cursor = leer_paginacion(limite_defecto=1000, limite_maximo=5000)
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros no válidos: {str(e)}"}), 400
+
+    try:
+        asegurar_archivo(INDICES_DIR)
+        df, version = motor_saldos.calcular_con_version()
+        version = describir_version_logistica(version)
+        registro = request.args.get('registro')
+        if (registro and registro != version['registro']) or cursor > len(df):
+            return jsonify({"error": "El registro de líneas cambió; descargue el libro completo", **version}), 409
+
+        columnas = ["fecha", "solicitante", "orden_trabajo", "cliente", "producto", "unidad", "cantidad",
+                    "stock", "adquirido", "saldo", "observaciones"]
+        pagina = df.iloc[cursor:cursor + limite][columnas]
+        siguiente = cursor + limite if cursor + limite < len(df) else None
+        return jsonify({
+            **version,
+            "cursor": cursor,
+            "siguiente_cursor": siguiente,
+            "columnas": CABECERAS_LOGISTICA,
+            "filas": pagina.astype(object).where(pagina.notna(), None).values.tolist()
+        })
+    except Exception as e:
+        logging.exception(f"Error al consultar líneas nuevas de logística: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.cli.command("reconstruir-lineas-logistica")
+def reconstruir_lineas_logistica_cli():
+    """Reconstruye el registro de líneas de logística a partir de los archivos Excel."""
+    total = lineas_logistica.reconstruir()
+    print(f"Líneas de logística reconstruidas: {total}")
+    total = consolidado_logistica.reconstruir()
+    print(f"Consolidado de logística recalculado con {total} líneas")
+
 @app.route('/api/logistica/descargar-requerimientos', methods=['GET'])
 def descargar_requerimientos_logistica():
     """Descarga el archivo Excel de requerimientos de logística."""
@@ -986,6 +3679,7 @@ def descargar_bdd_logistica():
     return descargar_bdd_logistica_flask()
 
 @app.route('/api/logistica/subir-bdd', methods=['POST'])
+@admitir("catalogo_logistica")
 def subir_bdd_logistica():
     """Sube (actualiza) el archivo CSV de la base de datos de materiales de logística."""
     if 'file' not in request.files:
@@ -999,14 +3693,36 @@ def subir_bdd_logistica():
         return jsonify({"error": "Nombre de archivo vacío"}), 400
     
     if file and file.filename.endswith('.csv'):
+        # Se guarda aparte y solo reemplaza al vigente si es válido; el reemplazo es atómico,
+        # así que los lectores ven el catálogo anterior o el nuevo, nunca uno a medio escribir
+        ruta_tmp = f"{LOGISTICA_MATERIALES_CSV_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
         try:
-            # Guardar el archivo, sobrescribiendo el existente
-            file.save(LOGISTICA_MATERIALES_CSV_PATH)
-            logging.info(f"Archivo BDD de logística '{file.filename}' subido y guardado como '{LOGISTICA_MATERIALES_CSV_PATH}'")
-            return jsonify({"status": "success", "message": "Base de datos de materiales actualizada correctamente."}), 200
+            import pandas as pd
+            with medir_span("guardar_subida"):
+                file.save(ruta_tmp)
+            with medir_span("validar_catalogo"):
+                try:
+                    df = pd.read_csv(ruta_tmp, encoding='utf-8-sig')
+                    problemas = validar_catalogo_logistica(df)
+                except ValueError as e:
+                    problemas = [f"no se pudo leer el CSV: {str(e)}"]
+            if problemas:
+                logging.warning(f"Archivo BDD de logística '{file.filename}' rechazado: {'; '.join(problemas)}")
+                return jsonify({"error": "El archivo no es un catálogo válido; se mantiene el anterior",
+                                "problemas": problemas}), 422
+            with medir_span("publicar_catalogo"):
+                os.replace(ruta_tmp, LOGISTICA_MATERIALES_CSV_PATH)
+                cache_catalogos.publicar(LOGISTICA_MATERIALES_CSV_PATH, df)
+                obtener_catalogo_logistica()
+            logging.info(f"Archivo BDD de logística '{file.filename}' ({len(df)} filas) publicado como '{LOGISTICA_MATERIALES_CSV_PATH}'")
+            return jsonify({"status": "success", "message": "Base de datos de materiales actualizada correctamente.",
+                            "filas": len(df)}), 200
         except Exception as e:
             logging.error(f"Error al guardar el archivo BDD de logística subido: {str(e)}")
             return jsonify({"error": f"Error al guardar el archivo en el servidor: {str(e)}"}), 500
+        finally:
+            if os.path.exists(ruta_tmp):
+                os.remove(ruta_tmp)
     else:
         logging.warning(f"Archivo no válido o tipo incorrecto para subida de BDD: {file.filename}")
         return jsonify({"error": "Archivo no válido o tipo incorrecto. Se esperaba un archivo .csv"}), 400
@@ -0,0 +1,31 @@
+"""Fixtures compartidas: cada prueba usa una copia propia del servidor y de sus libros."""
+import glob
+import importlib
+import os
+import shutil
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULOS = ("sya_operaciones_server", "sya_exportacion")
+
+
+@pytest.fixture
+def servidor(tmp_path, monkeypatch):
+    """Importa el servidor desde una copia en tmp_path: sus libros e índices se crean junto al módulo."""
+    for ruta in glob.glob(os.path.join(RAIZ, "*.py")):
+        shutil.copy(ruta, tmp_path)
+    shutil.copy(os.path.join(RAIZ, "data", "logistica_materiales.csv"), tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for nombre in MODULOS:
+        sys.modules.pop(nombre, None)
+    modulo = importlib.import_module("sya_operaciones_server")
+    yield modulo
+    for nombre in MODULOS:
+        sys.modules.pop(nombre, None)
+
+
+@pytest.fixture
+def cliente(servidor):
+    return servidor.app.test_client()
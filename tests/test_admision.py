@@ -0,0 +1,53 @@
+"""Control de admisión de las rutas de escritura (429 con Retry-After) y límites de cuerpo por ruta (413)."""
+import io
+
+import pytest
+
+REQUERIMIENTO = {"fecha": "2026/10/19", "solicitante": "Ana", "orden_trabajo": "OT1", "cliente": "X",
+                 "productos": [{"producto": "CEMENTO", "unidad": "BOLSA", "cantidad": 1}]}
+
+
+@pytest.fixture
+def logistica_ocupada(servidor, monkeypatch):
+    """Ocupa todos los lugares del recurso de logística y deja la cola sin espacio."""
+    limite = servidor.limites_admision["logistica"]
+    monkeypatch.setattr(limite, "cola_max", 0)
+    for _ in range(limite.concurrencia):
+        assert limite.entrar(0)
+    yield limite
+    for _ in range(limite.en_curso):
+        limite.salir(0.5)
+
+
+def test_saturado_responde_429_con_retry_after(servidor, cliente, logistica_ocupada):
+    respuesta = cliente.post("/api/logistica/enviar-requerimientos", json=REQUERIMIENTO)
+    assert respuesta.status_code == 429
+    assert int(respuesta.headers["Retry-After"]) >= 1
+    assert respuesta.json["recurso"] == "logistica"
+    estado = cliente.get("/api/salud/admision").json["logistica"]
+    assert (estado["en_curso"], estado["rechazadas"]) == (logistica_ocupada.concurrencia, 1)
+    # Otros recursos siguen atendiendo
+    assert cliente.post("/recibir-datos", json={"fecha": "bad-date"}).status_code == 400
+
+
+def test_rechazo_por_saturacion_libera_la_clave_de_idempotencia(servidor, cliente, logistica_ocupada):
+    cabeceras = {"Idempotency-Key": "logistica-1"}
+    assert cliente.post("/api/logistica/enviar-requerimientos", json=REQUERIMIENTO, headers=cabeceras).status_code == 429
+    for _ in range(logistica_ocupada.concurrencia):
+        logistica_ocupada.salir(0.5)
+
+    reintento = cliente.post("/api/logistica/enviar-requerimientos", json=REQUERIMIENTO, headers=cabeceras)
+    assert reintento.status_code == 200
+    assert reintento.headers.get("Idempotency-Replayed") is None
+
+
+def test_limite_de_cuerpo_depende_de_la_ruta(servidor, cliente):
+    grande = b"x" * (servidor.CUERPO_MAX_JSON + 1)
+    respuesta = cliente.post("/recibir-datos", data=grande, content_type="application/json")
+    assert respuesta.status_code == 413
+    assert str(servidor.CUERPO_MAX_JSON) in respuesta.json["error"]
+
+    # El mismo tamaño entra en la subida del catálogo, que admite archivos más grandes
+    respuesta = cliente.post("/api/logistica/subir-bdd", content_type="multipart/form-data",
+                             data={"file": (io.BytesIO(grande), "bdd.csv")})
+    assert respuesta.status_code != 413
@@ -0,0 +1,62 @@
+"""Totales por obra mantenidos de forma incremental sobre el índice de reportes."""
+import pytest
+
+
+def reporte(fecha, obra, cemento, horas=2):
+    return {
+        "fecha": fecha, "codigo_obra": obra, "nombre_ingeniero": "Ana",
+        "materiales_usados": [{"nombre": "CEMENTO", "unidad": "BOLSA", "cantidad": cemento}],
+        "equipos_usados": [{"nombre": "Mezcladora", "cantidad": 2, "propiedad": "Propio"}],
+        "vehiculos_usados": [{"nombre": "Hilux", "placa": "X-1", "propiedad": "Propio"}],
+        "personal_de_campo": [{"nombre_completo": "Pedro", "categoria": "Operario", "horas_extras": horas}]
+    }
+
+
+def test_cada_reporte_suma_solo_su_delta(servidor, cliente):
+    cliente.post("/recibir-datos", json=reporte("10/09/2026", "OBRA-1", 3))
+    materiales = cliente.get("/api/agregados/materiales?codigo_obra=obra-1").json["materiales"]
+    assert materiales == [{"material": "CEMENTO", "unidad": "BOLSA", "cantidad": 3.0}]
+
+    aplicadas = []
+    aplicar = servidor.agregados_obra._aplicar
+
+    def registrar(entrada):
+        aplicadas.append(entrada["fecha"])
+        aplicar(entrada)
+
+    servidor.agregados_obra._aplicar = registrar
+    cliente.post("/recibir-datos", json=reporte("11/09/2026", "OBRA-1", "1,5", horas=3))
+    cliente.post("/recibir-datos", json=reporte("02/10/2026", "OBRA-2", 7))
+
+    materiales = cliente.get("/api/agregados/materiales?codigo_obra=OBRA-1").json["materiales"]
+    assert materiales[0]["cantidad"] == 4.5
+    assert aplicadas == ["2026-09-11", "2026-10-02"]
+
+    equipos = cliente.get("/api/agregados/equipos?codigo_obra=OBRA-1").json["equipos"]
+    assert equipos == [{"equipo": "Mezcladora", "equipo_dias": 4.0, "reportes": 2}]
+    assert cliente.get("/api/agregados/vehiculos?codigo_obra=OBRA-1").json["vehiculos"][0]["dias"] == 2
+    horas = cliente.get("/api/agregados/horas-extras?mes=2026-09&trabajador=ped").json["horas_extras"]
+    assert horas == [{"trabajador": "Pedro", "categoria": "Operario", "horas_extras": 5.0}]
+
+
+def test_el_estado_persiste_con_su_posicion(servidor, cliente):
+    cliente.post("/recibir-datos", json=reporte("10/09/2026", "OBRA-1", 3))
+    cliente.post("/recibir-datos", json=reporte("11/09/2026", "OBRA-1", 2))
+    assert servidor.agregados_obra.consultar("materiales", "OBRA-1")[0]["cantidad"] == 5.0
+
+    # Un proceso nuevo parte del archivo guardado y no vuelve a aplicar la historia
+    reiniciado = servidor.AgregadosObra(servidor.AGREGADOS_OBRA_FILE, servidor.indice_reportes)
+    reiniciado._aplicar = lambda entrada: pytest.fail("no debería volver a aplicar entradas ya sumadas")
+    assert reiniciado.consultar("materiales", "OBRA-1")[0]["cantidad"] == 5.0
+
+
+def test_reconstruir_recalcula_desde_el_registro(servidor, cliente):
+    cliente.post("/recibir-datos", json=reporte("10/09/2026", "OBRA-1", 3))
+    servidor.agregados_obra.consultar("materiales")
+    assert servidor.agregados_obra.reconstruir() == 1
+    assert servidor.agregados_obra.consultar("materiales", "OBRA-1")[0]["cantidad"] == 3.0
+
+
+def test_la_base_exige_implementar_aplicar(servidor):
+    with pytest.raises(TypeError):
+        servidor.AgregadosIncrementales(servidor.AGREGADOS_OBRA_FILE, servidor.indice_reportes)
@@ -0,0 +1,62 @@
+"""Subida del catálogo de logística: validación antes de publicar y reemplazo atómico."""
+import io
+import os
+
+import pytest
+
+CATALOGO = b"material,unidad,stock,costo_unitario\nA,UND,3,1\nB,KG,1,2\nC,UND,0,5\n"
+
+
+def subir(cliente, contenido):
+    return cliente.post("/api/logistica/subir-bdd", content_type="multipart/form-data",
+                        data={"file": (io.BytesIO(contenido), "bdd.csv")})
+
+
+@pytest.mark.parametrize("contenido, problema", [
+    (b"item,nombre\n1,x\n", "faltan las columnas: material, unidad"),
+    (b"material,unidad\n", "el archivo no tiene filas"),
+    (b"material,unidad,stock\nA,UND,3\n,UND,1\nB,UND,x\n", "valores no numéricos en stock: filas 4"),
+    (b"\xff\xfe\x00basura\n", "no se pudo leer el CSV"),
+])
+def test_catalogo_no_valido_mantiene_el_anterior(servidor, cliente, contenido, problema):
+    anterior = cliente.get("/api/logistica/materiales").data
+    with open(servidor.LOGISTICA_MATERIALES_CSV_PATH, "rb") as f:
+        archivo = f.read()
+
+    respuesta = subir(cliente, contenido)
+    assert respuesta.status_code == 422
+    assert any(p.startswith(problema) for p in respuesta.json["problemas"])
+    assert cliente.get("/api/logistica/materiales").data == anterior
+    with open(servidor.LOGISTICA_MATERIALES_CSV_PATH, "rb") as f:
+        assert f.read() == archivo
+    assert not [n for n in os.listdir(os.path.dirname(servidor.LOGISTICA_MATERIALES_CSV_PATH)) if n.endswith(".tmp")]
+
+
+def test_catalogo_valido_se_publica_sin_afectar_a_los_lectores(servidor, cliente):
+    vigente = servidor.obtener_catalogo_logistica()
+    filas_vigentes = len(vigente.df)
+
+    respuesta = subir(cliente, CATALOGO)
+    assert respuesta.status_code == 200
+    assert respuesta.json["filas"] == 3
+
+    # Quien ya tenía la vista anterior la conserva intacta; los nuevos lectores ven la nueva
+    assert len(vigente.df) == filas_vigentes
+    nuevo = servidor.obtener_catalogo_logistica()
+    assert nuevo is not vigente
+    assert nuevo.por_clave.to_dict("records") == [
+        {"clave": "A|UND", "stock_total": 3, "costo_unitario": 1},
+        {"clave": "B|KG", "stock_total": 1, "costo_unitario": 2},
+        {"clave": "C|UND", "stock_total": 0, "costo_unitario": 5}]
+    assert cliente.get("/api/logistica/materiales?campos=material,stock").json == [
+        {"material": "A", "stock": 3}, {"material": "B", "stock": 1}, {"material": "C", "stock": 0}]
+    assert cliente.get("/api/logistica/materiales?buscar=b").headers["X-Total"] == "1"
+
+
+def test_el_motor_de_saldos_usa_el_catalogo_nuevo(servidor, cliente):
+    subir(cliente, CATALOGO)
+    cliente.post("/api/logistica/enviar-requerimientos", json={
+        "fecha": "2026/10/19", "solicitante": "Ana", "orden_trabajo": "OT1", "cliente": "X",
+        "productos": [{"producto": "a", "unidad": "und", "cantidad": 5}]})
+    (linea,) = servidor.motor_saldos.calcular().to_dict("records")
+    assert (linea["stock"], linea["saldo"], linea["costo_total"]) == (3.0, 2.0, 5.0)
@@ -0,0 +1,48 @@
+"""Catálogos en formato columnar y compresión de las respuestas JSON."""
+import gzip
+import json
+import zlib
+
+import pytest
+
+
+@pytest.fixture
+def materiales(servidor):
+    with open(servidor.MATERIALES_CSV_PATH, "w", encoding="utf-8") as f:
+        f.write("material,unidad\n")
+        f.writelines(f"Material {i},{'bolsa' if i % 2 else 'kg'}\n" for i in range(200))
+    return servidor
+
+
+def test_formato_columnar_equivale_a_la_lista_de_registros(materiales, cliente):
+    registros = cliente.get("/api/materiales").json
+    columnar = cliente.get("/api/materiales?formato=columnar").json
+    assert columnar["columnas"] == ["material", "unidad"]
+    assert [dict(zip(columnar["columnas"], fila)) for fila in columnar["filas"]] == registros
+    assert len(json.dumps(columnar)) < len(json.dumps(registros))
+
+
+def test_comprime_por_encima_del_minimo(materiales, cliente):
+    plano = cliente.get("/api/materiales")
+    assert plano.headers.get("Content-Encoding") is None
+    assert "Accept-Encoding" in plano.headers["Vary"]
+    assert len(plano.data) >= materiales.COMPRESION_MIN_BYTES
+
+    con_gzip = cliente.get("/api/materiales", headers={"Accept-Encoding": "gzip, deflate"})
+    assert con_gzip.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(con_gzip.data)) == plano.json
+    con_deflate = cliente.get("/api/materiales", headers={"Accept-Encoding": "deflate"})
+    assert con_deflate.headers["Content-Encoding"] == "deflate"
+    assert json.loads(zlib.decompress(con_deflate.data)) == plano.json
+
+    rechazada = cliente.get("/api/materiales", headers={"Accept-Encoding": "gzip;q=0, deflate;q=0"})
+    assert rechazada.headers.get("Content-Encoding") is None
+
+
+def test_no_comprime_respuestas_pequenas_ni_archivos(materiales, cliente):
+    pequena = cliente.get("/api/materiales?limite=1", headers={"Accept-Encoding": "gzip"})
+    assert len(pequena.data) < materiales.COMPRESION_MIN_BYTES
+    assert pequena.headers.get("Content-Encoding") is None
+    archivo = cliente.get("/api/logistica/descargar-bdd", headers={"Accept-Encoding": "gzip"})
+    assert archivo.status_code == 200
+    assert archivo.headers.get("Content-Encoding") is None
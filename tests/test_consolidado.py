@@ -0,0 +1,50 @@
+"""Lista de materiales consolidada por producto, orden de trabajo y cliente."""
+import pytest
+
+
+@pytest.fixture
+def logistica(servidor, cliente):
+    with open(servidor.LOGISTICA_MATERIALES_CSV_PATH, "w", encoding="utf-8-sig") as f:
+        f.write("item,material,unidad,costo_unitario,stock\n1,CEMENTO,BOLSA,10,4\n2,ARENA,M3,50,0\n")
+    for orden, cliente_obra, solicitante, productos in (
+        ("OT1", "Minera", "Ana", [("CEMENTO", "BOLSA", 3), ("ARENA", "M3", 2)]),
+        ("OT2", "minera ", "Luis", [("CEMENTO", "BOLSA", 5)]),
+        ("OT1", "Minera", "Luis", [("ARENA", "M3", 1)]),
+    ):
+        datos = {"fecha": "2026-10-10", "solicitante": solicitante, "orden_trabajo": orden, "cliente": cliente_obra,
+                 "productos": [{"producto": p, "unidad": u, "cantidad": c} for p, u, c in productos]}
+        assert cliente.post("/api/logistica/enviar-requerimientos", json=datos).status_code == 200
+    return cliente
+
+
+def test_pendientes_por_producto(logistica):
+    respuesta = logistica.get("/api/logistica/consolidado").json
+    assert respuesta["resultados"] == [
+        {"producto": "ARENA", "unidad": "M3", "cantidad": 3.0, "lineas": 2, "solicitantes": ["Ana", "Luis"],
+         "ordenes": [{"orden_trabajo": "OT1", "cantidad": 3.0}]},
+        # El stock de 4 cubre la primera línea de cemento y una bolsa de la segunda
+        {"producto": "CEMENTO", "unidad": "BOLSA", "cantidad": 4.0, "lineas": 1, "solicitantes": ["Luis"],
+         "ordenes": [{"orden_trabajo": "OT2", "cantidad": 4.0}]},
+    ]
+
+
+def test_todas_las_lineas_por_cliente(logistica):
+    respuesta = logistica.get("/api/logistica/consolidado?estado=todos&agrupar=cliente").json
+    assert respuesta["total"] == 1
+    (grupo,) = respuesta["resultados"]
+    assert grupo["cliente"] == "Minera"
+    assert {p["producto"]: p["cantidad"] for p in grupo["productos"]} == {"CEMENTO": 8.0, "ARENA": 3.0}
+
+
+@pytest.mark.parametrize("agrupar", ["producto", "orden_trabajo", "cliente"])
+def test_groupby_igual_a_la_suma_linea_por_linea(servidor, logistica, agrupar):
+    df = servidor.motor_saldos.calcular()
+    esperado = {g: {} for g in servidor.AGRUPACIONES_CONSOLIDADO}
+    for linea in df[df["saldo"] > 0].to_dict("records"):
+        servidor.acumular_consolidado(esperado, linea, linea["saldo"])
+    assert servidor.consolidar_pendientes(df, agrupar) == esperado[agrupar]
+
+
+def test_parametros_no_validos(logistica):
+    assert logistica.get("/api/logistica/consolidado?agrupar=obra").status_code == 400
+    assert logistica.get("/api/logistica/consolidado?estado=cerrado").status_code == 400
@@ -0,0 +1,62 @@
+"""Flujo Server-Sent Events en /api/eventos y su reanudación con Last-Event-ID."""
+import json
+
+REPORTE = {
+    "fecha": "19/10/2026", "codigo_obra": "OBRA-1", "nombre_ingeniero": "Ana",
+    "materiales_usados": [], "equipos_usados": [], "vehiculos_usados": [], "personal_de_campo": []
+}
+
+
+def leer_eventos(respuesta, cantidad):
+    """Lee los primeros eventos del flujo (sin la línea retry inicial) y cierra la conexión."""
+    try:
+        partes = (parte.decode() for parte in respuesta.response)
+        assert next(partes).startswith("retry:")
+        eventos = []
+        for _ in range(cantidad):
+            campos = dict(linea.split(": ", 1) for linea in next(partes).strip().split("\n"))
+            eventos.append((int(campos["id"]), campos["event"], json.loads(campos["data"])))
+        return eventos
+    finally:
+        respuesta.close()
+
+
+def test_retoma_despues_del_ultimo_evento_recibido(servidor, cliente):
+    for orden in ("OT1", "OT2", "OT3"):
+        cliente.post("/api/logistica/enviar-requerimientos", json={
+            "fecha": "2026/10/19", "solicitante": "Ana", "orden_trabajo": orden, "cliente": "X",
+            "productos": [{"producto": "CEMENTO", "unidad": "BOLSA", "cantidad": 1}]})
+    cliente.post("/recibir-datos", json=REPORTE)
+    primero = servidor.central_eventos._historial[0]["id"]
+
+    respuesta = cliente.get("/api/eventos", headers={"Last-Event-ID": str(primero + 1)})
+    assert respuesta.mimetype == "text/event-stream"
+    eventos = leer_eventos(respuesta, 2)
+    assert [(i - primero, tipo) for i, tipo, _ in eventos] == [(2, "logistica"), (3, "reporte_diario")]
+    assert eventos[0][2]["orden_trabajo"] == "OT3"
+
+    (evento,) = leer_eventos(cliente.get(f"/api/eventos?ultimo_id={primero + 2}"), 1)
+    assert evento[1] == "reporte_diario"
+    assert servidor.central_eventos.cantidad_oyentes() == 0
+
+
+def test_hueco_en_el_historial_pide_resincronizar(servidor, cliente):
+    servidor.central_eventos.publicar("logistica")
+    (evento,) = leer_eventos(cliente.get("/api/eventos?ultimo_id=5"), 1)
+    assert evento[1] == "reinicio"
+    assert cliente.get("/api/eventos?ultimo_id=x").status_code == 400
+
+
+def test_sin_cupo_responde_503_con_retry_after(servidor, cliente):
+    servidor.central_eventos.max_oyentes = 0
+    respuesta = cliente.get("/api/eventos")
+    assert respuesta.status_code == 503
+    assert int(respuesta.headers["Retry-After"]) >= 0
+
+
+def test_oyente_lento_se_desconecta_sin_bloquear(servidor):
+    oyente, _ = servidor.central_eventos.suscribir()
+    for i in range(servidor.EVENTOS_COLA_OYENTE + 1):
+        servidor.central_eventos.publicar("logistica", n=i)
+    assert oyente.desbordado
+    assert servidor.central_eventos.cantidad_oyentes() == 0
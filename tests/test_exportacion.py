@@ -0,0 +1,124 @@
+"""Exportación por flujo de libros combinados desde varias particiones."""
+import datetime
+import io
+import os
+
+import openpyxl
+import pytest
+
+CABECERAS = {"Uno": ["Fecha", "Texto", "Número"], "Dos": ["Fecha", "Texto", "Número", "Extra"]}
+VALORES = [datetime.datetime(2026, 9, 1, 8, 30), 'a <&> "b"', None, 1.5, 7, True, datetime.date(2026, 9, 2)]
+
+
+@pytest.fixture
+def particiones(tmp_path):
+    rutas = []
+    for periodo, filas in (("2026-08", 2000), ("2026-09", 5)):
+        wb = openpyxl.Workbook()
+        wb.remove(wb.active)
+        for titulo, cabecera in CABECERAS.items():
+            ws = wb.create_sheet(titulo)
+            ws.append(cabecera)
+            for i in range(filas):
+                ws.append([f"{titulo}-{periodo}-{i}"] + VALORES)
+        ruta = os.path.join(tmp_path, f"libro_{periodo}.xlsx")
+        wb.save(ruta)
+        rutas.append((periodo, ruta))
+    return rutas
+
+
+def leer_libro(datos):
+    wb = openpyxl.load_workbook(io.BytesIO(datos))
+    return {ws.title: [list(fila) for fila in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+
+
+def test_libro_se_entrega_por_partes(servidor, particiones, monkeypatch):
+    exportacion = servidor.sya_exportacion
+    monkeypatch.setattr(exportacion, "BLOQUE_SALIDA", 1024)
+    partes = [parte for parte in exportacion.exportar_libro(CABECERAS, particiones) if parte]
+    assert len(partes) > 2
+    libro = leer_libro(b"".join(partes))
+    assert list(libro) == ["Uno", "Dos"]
+    assert libro["Dos"][0][:4] == CABECERAS["Dos"]
+    assert len(libro["Uno"]) == 1 + 2000 + 5
+    assert libro["Uno"][1] == ["Uno-2026-08-0", datetime.datetime(2026, 9, 1, 8, 30), 'a <&> "b"', None, 1.5, 7, True,
+                               datetime.datetime(2026, 9, 2)]
+    assert libro["Uno"][-1][0] == "Uno-2026-09-4"
+
+
+def test_completar_fila_modifica_u_omite_filas(servidor, particiones):
+    def completar(periodo, hoja, numero_fila, fila):
+        if hoja == "Dos" and (periodo == "2026-08" or numero_fila > 3):
+            return None
+        return fila[:1] + [numero_fila]
+
+    libro = leer_libro(b"".join(servidor.sya_exportacion.exportar_libro(CABECERAS, particiones, completar)))
+    assert [fila[:2] for fila in libro["Dos"][1:]] == [["Dos-2026-09-0", 2], ["Dos-2026-09-1", 3]]
+    assert len(libro["Uno"]) == 2006
+
+
+def test_descarga_combinada_sin_content_length(servidor, cliente):
+    servidor.asegurar_archivo(servidor.ruta_particion(servidor.EXCEL_FILE))
+    ruta = servidor.ruta_particion(servidor.EXCEL_FILE, "2020-01")
+    servidor.INICIALIZADORES[servidor.EXCEL_FILE](ruta)
+    wb = openpyxl.load_workbook(ruta)
+    wb["Reporte Principal"].append([datetime.date(2020, 1, 5), "OBRA-1", "Ana"])
+    wb.save(ruta)
+
+    respuesta = cliente.get("/descargar-excel")
+    assert respuesta.is_streamed
+    assert "Content-Length" not in respuesta.headers
+    assert f"_2020-01_{servidor.periodo_actual()}.xlsx" in respuesta.headers["Content-Disposition"]
+    libro = leer_libro(respuesta.get_data())
+    assert libro["Reporte Principal"][1][:3] == [datetime.datetime(2020, 1, 5), "OBRA-1", "Ana"]
+
+
+def test_logistica_informa_las_lineas_antes_de_enviar(servidor, cliente):
+    for orden in ("OT1", "OT2"):
+        cliente.post("/api/logistica/enviar-requerimientos", json={
+            "fecha": "2026/10/19", "solicitante": "Ana", "orden_trabajo": orden, "cliente": "X",
+            "productos": [{"producto": "CEMENTO", "unidad": "BOLSA", "cantidad": 1}]})
+    respuesta = cliente.get("/api/logistica/descargar-requerimientos")
+    assert (respuesta.headers["X-Lineas-Desde"], respuesta.headers["X-Lineas"]) == ("0", "2")
+    filas = leer_libro(respuesta.get_data())["Requerimientos"][1:]
+    assert [fila[2] for fila in filas] == ["OT1", "OT2"]
+
+
+@pytest.fixture
+def exportacion_paralela(servidor, tmp_path, monkeypatch):
+    """Pool de dos procesos con los temporales en tmp_path; se cierra al terminar la prueba."""
+    exportacion = servidor.sya_exportacion
+    monkeypatch.setattr(exportacion, "PROCESOS_MAXIMOS", 2)
+    temporales = tmp_path / "temporales"
+    temporales.mkdir()
+    monkeypatch.setattr(exportacion.tempfile, "tempdir", str(temporales))
+    yield exportacion, temporales
+    exportacion.reiniciar_ejecutor()
+
+
+def test_paralelo_igual_al_secuencial(exportacion_paralela, particiones):
+    exportacion, temporales = exportacion_paralela
+    secuencial = leer_libro(b"".join(exportacion.exportar_libro(CABECERAS, particiones)))
+    paralelo = leer_libro(b"".join(exportacion.exportar_libro(CABECERAS, particiones, paralelo=True)))
+    assert paralelo == secuencial
+    assert not os.listdir(temporales)
+
+    # Cerrar el flujo sin recorrerlo también borra el XML de las hojas
+    exportacion.exportar_libro(CABECERAS, particiones, paralelo=True).close()
+    assert not os.listdir(temporales)
+
+
+def test_fallo_del_pool_usa_la_exportacion_secuencial(servidor, cliente, exportacion_paralela):
+    exportacion, _ = exportacion_paralela
+    servidor.asegurar_archivo(servidor.ruta_particion(servidor.EXCEL_FILE))
+    servidor.INICIALIZADORES[servidor.EXCEL_FILE](servidor.ruta_particion(servidor.EXCEL_FILE, "2020-01"))
+    esperado = leer_libro(cliente.get("/descargar-excel").get_data())
+
+    roto = exportacion.obtener_ejecutor()
+    roto.shutdown()
+    respuesta = cliente.get("/descargar-excel")
+    assert respuesta.status_code == 200
+    assert leer_libro(respuesta.get_data()) == esperado
+    # El pool roto se descarta y la siguiente descarga usa uno nuevo
+    assert exportacion.obtener_ejecutor() is not roto
+    assert leer_libro(cliente.get("/descargar-excel").get_data()) == esperado
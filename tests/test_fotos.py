@@ -0,0 +1,61 @@
+"""Almacén de fotos por contenido: deduplicación de reenvíos y referencias por carpeta."""
+import io
+import os
+import zipfile
+
+CARPETA = "20261001_juan-p_ABC-1"
+
+
+def foto(contenido):
+    return (io.BytesIO(contenido), "foto.jpg")
+
+
+def blobs(servidor):
+    return sorted(nombre for _, _, nombres in os.walk(servidor.FOTOS_BLOBS_DIR) for nombre in nombres)
+
+
+def salida_con_fotos(cliente):
+    datos = {"tipo_formulario": "salida", "nombre_chofer": "Juan P", "placa": "ABC 1", "vehiculo": "Hilux",
+             "fecha_salida": "2026-10-01", "hora_salida": "08:00", "km_inicial": "1",
+             "foto_km_inicial_1": foto(b"AAAA"), "foto_km_inicial_2": foto(b"BBBB")}
+    assert cliente.post("/api/recibir_datos_choferes", data=datos, content_type="multipart/form-data").status_code == 200
+
+
+def test_fotos_repetidas_se_guardan_una_vez(servidor, cliente):
+    salida_con_fotos(cliente)
+    for _ in range(2):
+        respuesta = cliente.post("/api/recibir_datos_choferes", content_type="multipart/form-data", data={
+            "row_idx": "2", "nombre_chofer": "Juan P", "placa": "ABC 1", "foto_km_final_1": foto(b"AAAA")})
+        assert respuesta.status_code == 200
+
+    carpeta = os.path.join(servidor.FOTOS_VEHICULOS_DIR, CARPETA)
+    referencias = servidor.leer_referencias(carpeta)
+    assert sorted(referencias) == [f"{CARPETA}_llegada_1.jpg", f"{CARPETA}_salida_1.jpg", f"{CARPETA}_salida_2.jpg"]
+    # Tres referencias y dos contenidos distintos: la foto repetida apunta al mismo blob
+    assert referencias[f"{CARPETA}_llegada_1.jpg"] == referencias[f"{CARPETA}_salida_1.jpg"]
+    assert len(blobs(servidor)) == 2
+    assert os.listdir(carpeta) == [servidor.REFERENCIAS_FOTOS]
+
+
+def test_descarga_resuelve_las_referencias(cliente):
+    salida_con_fotos(cliente)
+    respuesta = cliente.get(f"/descargar-carpeta-fotos/{CARPETA}")
+    with zipfile.ZipFile(io.BytesIO(respuesta.data)) as zf:
+        contenido = {info.filename: zf.read(info) for info in zf.infolist()}
+    assert contenido == {f"{CARPETA}/{CARPETA}_salida_1.jpg": b"AAAA", f"{CARPETA}/{CARPETA}_salida_2.jpg": b"BBBB"}
+
+
+def test_deduplicar_mueve_las_fotos_sueltas_al_almacen(servidor, cliente):
+    salida_con_fotos(cliente)
+    legado = os.path.join(servidor.FOTOS_VEHICULOS_DIR, "legado")
+    os.makedirs(legado)
+    with open(os.path.join(legado, "x.jpg"), "wb") as f:
+        f.write(b"BBBB")
+
+    resultado = servidor.app.test_cli_runner().invoke(servidor.deduplicar_fotos_cli)
+    assert resultado.exception is None
+    assert "bytes duplicados liberados: 4" in resultado.output
+    assert os.listdir(legado) == [servidor.REFERENCIAS_FOTOS]
+    assert len(blobs(servidor)) == 2
+    with zipfile.ZipFile(io.BytesIO(cliente.get("/descargar-carpeta-fotos/legado").data)) as zf:
+        assert zf.read("legado/x.jpg") == b"BBBB"
@@ -0,0 +1,75 @@
+"""Un envío que falla en el servidor debe poder reintentarse con la misma Idempotency-Key."""
+import io
+
+import openpyxl
+
+REPORTE = {
+    "fecha": "19/10/2026", "codigo_obra": "OBRA-1", "nombre_ingeniero": "Ana",
+    "materiales_usados": [], "equipos_usados": [], "vehiculos_usados": [], "personal_de_campo": []
+}
+
+
+def filas_reporte(servidor):
+    wb = openpyxl.load_workbook(servidor.ruta_particion(servidor.EXCEL_FILE), read_only=True)
+    try:
+        return wb["Reporte Principal"].max_row - 1
+    finally:
+        wb.close()
+
+
+def test_reintento_tras_fallo_interno_procesa_el_envio(servidor, monkeypatch):
+    cliente = servidor.app.test_client()
+    cabeceras = {"Idempotency-Key": "reporte-1"}
+    guardar = openpyxl.Workbook.save
+
+    def libro_bloqueado(self, ruta):
+        raise PermissionError("El libro está abierto en Excel")
+
+    monkeypatch.setattr(openpyxl.Workbook, "save", libro_bloqueado)
+    fallida = cliente.post("/recibir-datos", json=REPORTE, headers=cabeceras)
+    assert fallida.status_code == 500
+
+    monkeypatch.setattr(openpyxl.Workbook, "save", guardar)
+    reintento = cliente.post("/recibir-datos", json=REPORTE, headers=cabeceras)
+    assert reintento.status_code == 200
+    assert reintento.headers.get("Idempotency-Replayed") is None
+    assert filas_reporte(servidor) == 1
+
+    repetida = cliente.post("/recibir-datos", json=REPORTE, headers=cabeceras)
+    assert repetida.headers.get("Idempotency-Replayed") == "true"
+    assert filas_reporte(servidor) == 1
+
+
+def test_datos_no_validos_responden_400(servidor):
+    cliente = servidor.app.test_client()
+    respuesta = cliente.post("/recibir-datos", json=dict(REPORTE, fecha="bad-date"),
+                             headers={"Idempotency-Key": "reporte-2"})
+    assert respuesta.status_code == 400
+    assert filas_reporte(servidor) == 0
+
+    respuesta = cliente.post("/recibir-requerimientos", json={"fecha": "bad-date", "requerimientos": []})
+    assert respuesta.status_code == 400
+
+
+def test_adquisicion_repetida_se_registra_una_vez(servidor):
+    cliente = servidor.app.test_client()
+    cabeceras = {"Idempotency-Key": "adquisicion-1"}
+    adquisicion = {"producto": "CEMENTO", "unidad": "BOLSA", "cantidad": 3}
+    primera = cliente.post("/api/logistica/adquisiciones", json=adquisicion, headers=cabeceras)
+    repetida = cliente.post("/api/logistica/adquisiciones", json=adquisicion, headers=cabeceras)
+    assert primera.status_code == repetida.status_code == 200
+    assert repetida.headers.get("Idempotency-Replayed") == "true"
+    assert servidor.adquisiciones_logistica.estado()[1] == 1
+
+
+def test_huella_multipart_incluye_el_contenido_de_las_fotos(servidor):
+    cliente = servidor.app.test_client()
+    formulario = {"tipo_formulario": "salida", "nombre_chofer": "Ana", "placa": "P1", "vehiculo": "H",
+                  "fecha_salida": "2026-10-01", "hora_salida": "08:00", "km_inicial": "1"}
+    cabeceras = {"Idempotency-Key": "viaje-1"}
+    primera = cliente.post("/api/recibir_datos_choferes", headers=cabeceras, content_type="multipart/form-data",
+                           data=dict(formulario, foto_km_inicial_1=(io.BytesIO(b"aaaa"), "km.jpg")))
+    assert primera.status_code == 200
+    otra_foto = cliente.post("/api/recibir_datos_choferes", headers=cabeceras, content_type="multipart/form-data",
+                             data=dict(formulario, foto_km_inicial_1=(io.BytesIO(b"bbbb"), "km.jpg")))
+    assert otra_foto.status_code == 422
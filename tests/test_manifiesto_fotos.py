@@ -0,0 +1,61 @@
+"""Manifiesto de carpetas de fotos: listado filtrado y paginado, compactación y reconstrucción."""
+import io
+import os
+
+import pytest
+
+
+def salida(cliente, chofer, placa, fecha, *fotos):
+    datos = {"tipo_formulario": "salida", "nombre_chofer": chofer, "placa": placa, "vehiculo": "Hilux",
+             "fecha_salida": fecha, "hora_salida": "08:00", "km_inicial": "1"}
+    for i, contenido in enumerate(fotos, 1):
+        datos[f"foto_km_inicial_{i}"] = (io.BytesIO(contenido), "foto.jpg")
+    assert cliente.post("/api/recibir_datos_choferes", data=datos, content_type="multipart/form-data").status_code == 200
+
+
+@pytest.fixture
+def carpetas(servidor, cliente):
+    # Carpeta anterior al manifiesto: se incorpora al construirlo desde el disco
+    legado = os.path.join(servidor.FOTOS_VEHICULOS_DIR, "20250101_pepe_Z-9")
+    os.makedirs(legado)
+    with open(os.path.join(legado, "a.jpg"), "wb") as f:
+        f.write(b"12345")
+    salida(cliente, "Juan Perez", "ABC 1", "2026-10-01", b"aa", b"bbb")
+    salida(cliente, "Rosa", "XY 2", "2026-10-05", b"cccc")
+    return cliente
+
+
+def test_listado_sin_parametros(carpetas):
+    assert carpetas.get("/api/listar-carpetas-fotos").json == {
+        "20250101_pepe_Z-9": 1, "20261001_juan-perez_ABC-1": 2, "20261005_rosa_XY-2": 1}
+
+
+def test_filtros_y_paginacion(carpetas):
+    (rosa,) = carpetas.get("/api/listar-carpetas-fotos?desde=2026-10-02").json["resultados"]
+    assert (rosa["carpeta"], rosa["chofer"], rosa["placa"], rosa["fotos"], rosa["bytes"]) == (
+        "20261005_rosa_XY-2", "Rosa", "XY 2", 1, 4)
+    assert [c["carpeta"] for c in carpetas.get("/api/listar-carpetas-fotos?chofer=juan").json["resultados"]] == [
+        "20261001_juan-perez_ABC-1"]
+    assert [c["fecha"] for c in carpetas.get("/api/listar-carpetas-fotos?hasta=01/06/2025").json["resultados"]] == [
+        "2025-01-01"]
+
+    pagina = carpetas.get("/api/listar-carpetas-fotos?limite=2&cursor=1").json
+    assert (pagina["total"], len(pagina["resultados"]), pagina["siguiente_cursor"]) == (3, 2, None)
+    assert carpetas.get("/api/listar-carpetas-fotos?desde=ayer").status_code == 400
+
+
+def test_compacta_y_se_reconstruye(servidor, cliente, monkeypatch):
+    monkeypatch.setattr(servidor, "MANIFIESTO_COMPACTAR_LINEAS", 5)
+    for i in range(12):
+        salida(cliente, "Ana", "P1", f"2026-10-0{1 + i % 2}", b"x%d" % i)
+    with open(servidor.MANIFIESTO_FOTOS_FILE, encoding="utf-8") as f:
+        assert sum(1 for _ in f) <= 5
+    # Cada salida reemplaza la foto salida_1 de su carpeta
+    esperado = {"20261001_ana_P1": 1, "20261002_ana_P1": 1}
+    assert cliente.get("/api/listar-carpetas-fotos").json == esperado
+
+    # Otro proceso lee el archivo compactado; sin el archivo, se reconstruye desde las carpetas
+    assert len(servidor.ManifiestoFotos(servidor.MANIFIESTO_FOTOS_FILE).consultar()) == 2
+    os.remove(servidor.MANIFIESTO_FOTOS_FILE)
+    nuevo = servidor.ManifiestoFotos(servidor.MANIFIESTO_FOTOS_FILE)
+    assert {c["carpeta"]: c["fotos"] for c in nuevo.consultar()} == esperado
@@ -0,0 +1,66 @@
+"""Libros particionados por mes: selección por rango, descargas y cierre de viajes de meses anteriores."""
+import datetime
+import io
+
+import openpyxl
+
+
+def crear_particion(servidor, ruta_base, periodo, filas=()):
+    ruta = servidor.ruta_particion(ruta_base, periodo)
+    servidor.INICIALIZADORES[ruta_base](ruta)
+    wb = openpyxl.load_workbook(ruta)
+    for fila in filas:
+        wb.active.append(fila)
+    wb.save(ruta)
+    return ruta
+
+
+def viaje_abierto(fecha, placa):
+    return [fecha, "Juan", "hilux", placa, fecha, "08:00", "Base", "100", "", None, None, None, None, None]
+
+
+def test_rango_selecciona_particiones_y_libro_historico(servidor):
+    base = servidor.REGISTROS_CHOFERES_EXCEL
+    servidor.INICIALIZADORES[base](base)
+    julio = crear_particion(servidor, base, "2020-07")
+    agosto = crear_particion(servidor, base, "2020-08")
+    actual = servidor.ruta_particion(base)
+
+    todas = servidor.particiones_en_rango(base)
+    assert todas[:3] == [(None, base), ("2020-07", julio), ("2020-08", agosto)]
+    assert todas[-1] == (servidor.periodo_actual(), actual)
+
+    assert servidor.particiones_en_rango(base, "2020-08", "2020-08") == [("2020-08", agosto)]
+    # Un rango que empieza antes de la primera partición incluye el libro sin particionar
+    assert servidor.particiones_en_rango(base, "2020-01", "2020-07") == [(None, base), ("2020-07", julio)]
+
+
+def test_descarga_por_rango(servidor, cliente):
+    base = servidor.REGISTROS_CHOFERES_EXCEL
+    crear_particion(servidor, base, "2020-07", [viaje_abierto(datetime.date(2020, 7, 1), "A-1")])
+    crear_particion(servidor, base, "2020-08", [viaje_abierto(datetime.date(2020, 8, 1), "B-2")])
+
+    un_mes = cliente.get("/descargar-registro-rutas?desde=2020-08&hasta=2020-08")
+    assert un_mes.status_code == 200
+    assert "registros_choferes_2020-08.xlsx" in un_mes.headers["Content-Disposition"]
+
+    completa = cliente.get("/descargar-registro-rutas")
+    assert completa.status_code == 200
+    assert f"registros_choferes_2020-07_{servidor.periodo_actual()}.xlsx" in completa.headers["Content-Disposition"]
+    ws = openpyxl.load_workbook(io.BytesIO(completa.data)).active
+    assert [fila[3] for fila in ws.iter_rows(min_row=2, values_only=True)] == ["A-1", "B-2"]
+
+    assert cliente.get("/descargar-registro-rutas?desde=2020-13").status_code == 400
+
+
+def test_llegada_cierra_viaje_abierto_en_un_mes_anterior(servidor, cliente):
+    ruta = crear_particion(servidor, servidor.REGISTROS_CHOFERES_EXCEL, "2020-07",
+                           [viaje_abierto(datetime.date(2020, 7, 30), "ABC 1")])
+    llegada = {"tipo_formulario": "llegada", "nombre_chofer": "Juan", "placa": "ABC 1",
+               "fecha_llegada": "2020-08-02", "hora_retorno": "18:00", "ubicacion_final": "Base",
+               "km_final": "200", "observaciones_llegada": ""}
+    respuesta = cliente.post("/api/recibir_datos_choferes", data=llegada)
+    assert respuesta.status_code == 200
+    assert respuesta.json["periodo"] == "2020-07"
+    fila = [celda.value for celda in openpyxl.load_workbook(ruta).active[2]]
+    assert fila[10:13] == ["18:00", "Base", "200"]
@@ -0,0 +1,54 @@
+"""Proyección de campos, paginación y consultas incrementales de los catálogos."""
+import os
+from datetime import datetime
+
+import pytest
+
+MTIME_ORIGINAL = 1_700_000_000  # 2023-11-14
+
+
+@pytest.fixture
+def materiales(servidor):
+    with open(servidor.MATERIALES_CSV_PATH, "w", encoding="utf-8") as f:
+        f.write("material,unidad\ncemento,bolsa\narena,m3\nfierro,kg\n")
+    os.utime(servidor.MATERIALES_CSV_PATH, (MTIME_ORIGINAL, MTIME_ORIGINAL))
+    return servidor
+
+
+def test_paginacion_en_cabeceras(materiales, cliente):
+    primera = cliente.get("/api/materiales?limite=2")
+    assert primera.json == [{"material": "cemento", "unidad": "bolsa"}, {"material": "arena", "unidad": "m3"}]
+    assert (primera.headers["X-Total"], primera.headers["X-Siguiente-Cursor"]) == ("3", "2")
+    ultima = cliente.get("/api/materiales?limite=2&cursor=2")
+    assert ultima.json == [{"material": "fierro", "unidad": "kg"}]
+    assert "X-Siguiente-Cursor" not in ultima.headers
+
+
+def test_proyeccion_de_campos(materiales, cliente):
+    assert cliente.get("/api/materiales?campos=material").json == [
+        {"material": "cemento"}, {"material": "arena"}, {"material": "fierro"}]
+    assert cliente.get("/api/materiales?formato=columnar&campos=unidad").json == {
+        "columnas": ["unidad"], "filas": [["bolsa"], ["m3"], ["kg"]]}
+    desconocido = cliente.get("/api/materiales?campos=precio")
+    assert desconocido.status_code == 400
+    assert "precio" in desconocido.json["error"]
+
+
+def test_modificado_desde_devuelve_solo_los_cambios(materiales, cliente):
+    marca = cliente.get("/api/materiales").headers["X-Modificado-Hasta"]
+    assert marca == datetime.fromtimestamp(MTIME_ORIGINAL).isoformat(timespec="seconds")
+    with open(materiales.MATERIALES_CSV_PATH, "w", encoding="utf-8") as f:
+        f.write("material,unidad\ncemento,bolsa\narena,m3\nfierro,varilla\nclavos,kg\n")
+    cambios = cliente.get("/api/materiales?modificado_desde=2024-01-01")
+    assert cambios.json == [{"material": "fierro", "unidad": "varilla"}, {"material": "clavos", "unidad": "kg"}]
+    assert cambios.headers["X-Total"] == "2"
+    assert cambios.headers["X-Modificado-Hasta"] > marca
+    assert cliente.get("/api/materiales?modificado_desde=ayer").status_code == 400
+
+
+def test_catalogo_escalar_se_pagina(servidor, cliente):
+    with open(servidor.CONDUCTORES_CSV_PATH, "w", encoding="utf-8") as f:
+        f.write("conductor\nJuan\nRosa\n\nLuis\n")
+    assert cliente.get("/api/conductores").json == ["Juan", "Rosa", "Luis"]
+    pagina = cliente.get("/api/conductores?limite=2")
+    assert (pagina.json, pagina.headers["X-Siguiente-Cursor"]) == (["Juan", "Rosa"], "2")
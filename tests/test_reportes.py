@@ -0,0 +1,62 @@
+"""Consulta filtrada de reportes diarios en /api/reportes."""
+import pytest
+
+
+def reporte(fecha, obra, ingeniero, materiales=()):
+    return {
+        "fecha": fecha, "codigo_obra": obra, "nombre_ingeniero": ingeniero,
+        "materiales_usados": [{"nombre": n, "unidad": u, "cantidad": c} for n, u, c in materiales],
+        "equipos_usados": [], "vehiculos_usados": [], "personal_de_campo": []
+    }
+
+
+@pytest.fixture
+def reportes(cliente):
+    for datos in (
+        reporte("03/09/2026", "OBRA-1", "Ana Pérez", [("CEMENTO", "BOLSA", 2)]),
+        reporte("01/09/2026", "OBRA-2", "Luis Soto"),
+        reporte("10/09/2026", "OBRA-1", "Luis Soto", [("ARENA", "M3", 1)]),
+        reporte("20/09/2026", "OBRA-1", "Ana Pérez"),
+    ):
+        assert cliente.post("/recibir-datos", json=datos).status_code == 200
+    return cliente
+
+
+def consultar(cliente, consulta):
+    respuesta = cliente.get(f"/api/reportes?{consulta}")
+    assert respuesta.status_code == 200
+    return respuesta.json
+
+
+def test_filtros_por_obra_ingeniero_y_fechas(reportes):
+    todos = consultar(reportes, "")
+    assert [r["fecha"] for r in todos["resultados"]] == ["2026-09-01", "2026-09-03", "2026-09-10", "2026-09-20"]
+
+    obra = consultar(reportes, "codigo_obra=obra-1&desde=2026-09-02&hasta=10/09/2026")
+    assert [(r["fecha"], r["ingeniero"]) for r in obra["resultados"]] == [("2026-09-03", "Ana Pérez"), ("2026-09-10", "Luis Soto")]
+
+    ingeniero = consultar(reportes, "ingeniero=ana")
+    assert {r["ingeniero"] for r in ingeniero["resultados"]} == {"Ana Pérez"}
+    assert ingeniero["total"] == 2
+
+
+def test_hoja_limita_el_contenido_de_cada_resultado(reportes):
+    resultado = consultar(reportes, "codigo_obra=OBRA-1&hoja=materiales&limite=1")["resultados"][0]
+    assert resultado["hojas"] == {"Materiales Usados": [{"Material": "CEMENTO", "Unidad": "BOLSA", "Cantidad": 2}]}
+
+
+def test_cursor_recorre_todas_las_paginas(reportes):
+    fechas, cursor = [], 0
+    while cursor is not None:
+        pagina = consultar(reportes, f"limite=3&cursor={cursor}")
+        assert pagina["total"] == 4
+        fechas += [r["fecha"] for r in pagina["resultados"]]
+        cursor = pagina["siguiente_cursor"]
+    assert fechas == ["2026-09-01", "2026-09-03", "2026-09-10", "2026-09-20"]
+
+
+@pytest.mark.parametrize("consulta", ["limite=abc", "limite=0", "cursor=-1", "desde=ayer", "hoja=fotos"])
+def test_parametros_no_validos_responden_400(cliente, consulta):
+    respuesta = cliente.get(f"/api/reportes?{consulta}")
+    assert respuesta.status_code == 400
+    assert "no válid" in respuesta.json["error"]
@@ -0,0 +1,61 @@
+"""Asignación FIFO de stock y adquisiciones a las líneas de requerimiento (MotorSaldos)."""
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def logistica(servidor, cliente):
+    with open(servidor.LOGISTICA_MATERIALES_CSV_PATH, "w", encoding="utf-8-sig") as f:
+        f.write("item,material,unidad,costo_unitario,stock\n1,CEMENTO,BOLSA,10,4\n2,ARENA,M3,50,0\n")
+    return cliente
+
+
+def requerir(cliente, orden, productos):
+    datos = {"fecha": "2026-10-10", "solicitante": "Ana", "orden_trabajo": orden, "cliente": "CL",
+             "productos": [{"producto": p, "unidad": u, "cantidad": c} for p, u, c in productos]}
+    assert cliente.post("/api/logistica/enviar-requerimientos", json=datos).status_code == 200
+
+
+def saldos(cliente, consulta=""):
+    return cliente.get(f"/api/logistica/saldos?{consulta}").json
+
+
+def columnas(resultados, *nombres):
+    return [tuple(linea[n] for n in nombres) for linea in resultados]
+
+
+def test_stock_y_adquisiciones_se_asignan_por_orden_de_llegada(logistica):
+    requerir(logistica, "OT1", [("CEMENTO", "BOLSA", 5)])
+    requerir(logistica, "OT2", [("CEMENTO", "BOLSA", 3), ("NADA", "U", 1)])
+    assert columnas(saldos(logistica)["resultados"], "orden_trabajo", "stock", "adquirido", "saldo") == [
+        ("OT1", 4.0, 0.0, 1.0), ("OT2", 0.0, 0.0, 3.0), ("OT2", 0.0, 0.0, 1.0)]
+
+    # La adquisición cubre primero el saldo de la línea más antigua
+    logistica.post("/api/logistica/adquisiciones", json={"producto": "cemento", "unidad": "BOLSA", "cantidad": 2})
+    resultados = saldos(logistica)["resultados"]
+    assert columnas(resultados, "orden_trabajo", "adquirido", "saldo", "observaciones") == [
+        ("OT1", 1.0, 0.0, "Atendido"), ("OT2", 1.0, 2.0, "Pendiente"), ("OT2", 0.0, 1.0, "No figura en el catálogo")]
+    assert resultados[1]["costo_pendiente"] == 20.0
+
+
+def test_filtros_y_totales_por_orden(logistica):
+    requerir(logistica, "OT1", [("CEMENTO", "BOLSA", 2)])
+    requerir(logistica, "OT2", [("CEMENTO", "BOLSA", 3), ("ARENA", "M3", 1)])
+    pendientes = saldos(logistica, "estado=pendiente&orden_trabajo=OT2")
+    assert columnas(pendientes["resultados"], "producto", "saldo") == [("CEMENTO", 1.0), ("ARENA", 1.0)]
+    ordenes = {o["orden_trabajo"]: o for o in saldos(logistica)["ordenes"]}
+    assert (ordenes["OT1"]["lineas_pendientes"], ordenes["OT2"]["lineas_pendientes"]) == (0, 2)
+    assert ordenes["OT2"]["costo_pendiente"] == 60.0
+
+
+def test_calculo_incremental_igual_al_completo(servidor, logistica):
+    motor = servidor.motor_saldos
+    lineas = [("OT1", "CEMENTO", "BOLSA", 3), ("OT2", "ARENA", "M3", 2), ("OT1", "CEMENTO", "BOLSA", 4), ("OT3", "ARENA", "M3", 1)]
+    for i, (orden, producto, unidad, cantidad) in enumerate(lineas):
+        requerir(logistica, orden, [(producto, unidad, cantidad)])
+        if i % 2:
+            servidor.adquisiciones_logistica.agregar({"producto": producto, "unidad": unidad, "cantidad": 1})
+        incremental = motor.calcular()
+        completo = servidor.MotorSaldos(servidor.lineas_logistica, servidor.adquisiciones_logistica).calcular()
+        pd.testing.assert_frame_equal(incremental, completo, check_dtype=False)
+    assert motor.calcular() is motor.calcular()
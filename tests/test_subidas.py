@@ -0,0 +1,91 @@
+"""Subida de fotos por partes con reanudación (/api/subidas) y limpieza de subidas vencidas."""
+import hashlib
+import io
+import os
+import time
+import zipfile
+
+import pytest
+
+
+@pytest.fixture
+def contenido():
+    return os.urandom(300_000)
+
+
+def crear(cliente, **metadatos):
+    respuesta = cliente.post("/api/subidas", json=metadatos)
+    assert respuesta.status_code == 201
+    assert respuesta.headers["Location"] == f"/api/subidas/{respuesta.json['id']}"
+    return respuesta.json["id"]
+
+
+def enviar(cliente, id_subida, datos, offset):
+    return cliente.put(f"/api/subidas/{id_subida}", data=datos, headers={"Upload-Offset": str(offset)})
+
+
+def test_reanuda_desde_el_offset_confirmado(servidor, cliente, contenido):
+    id_subida = crear(cliente, nombre="km.png", tamano=len(contenido), sha256=hashlib.sha256(contenido).hexdigest())
+    assert enviar(cliente, id_subida, contenido[:100_000], 0).json["offset"] == 100_000
+    # Un reintento con un offset que no es el del servidor se rechaza y se consulta el correcto
+    assert enviar(cliente, id_subida, contenido[100_000:], 0).status_code == 409
+    assert cliente.head(f"/api/subidas/{id_subida}").headers["Upload-Offset"] == "100000"
+    assert cliente.post(f"/api/subidas/{id_subida}/confirmar").status_code == 409
+
+    rango = {"Content-Range": f"bytes 100000-{len(contenido) - 1}/{len(contenido)}"}
+    assert cliente.put(f"/api/subidas/{id_subida}", data=contenido[100_000:], headers=rango).json["offset"] == len(contenido)
+    assert enviar(cliente, id_subida, b"x", len(contenido)).status_code == 413
+
+    confirmada = cliente.post(f"/api/subidas/{id_subida}/confirmar")
+    assert confirmada.status_code == 200
+    assert confirmada.json["sha256"] == hashlib.sha256(contenido).hexdigest()
+    with open(servidor.ruta_blob(confirmada.json["sha256"]), "rb") as f:
+        assert f.read() == contenido
+
+
+def test_hash_distinto_reinicia_la_subida(cliente):
+    id_subida = crear(cliente, sha256="00" * 32)
+    enviar(cliente, id_subida, b"abc", 0)
+    respuesta = cliente.post(f"/api/subidas/{id_subida}/confirmar")
+    assert respuesta.status_code == 422
+    assert respuesta.json["offset"] == 0
+
+
+def test_formulario_usa_subidas_confirmadas(cliente, contenido):
+    formulario = {"tipo_formulario": "salida", "nombre_chofer": "Ana", "placa": "P1", "vehiculo": "H",
+                  "fecha_salida": "2026-10-01", "hora_salida": "08:00", "km_inicial": "1"}
+    pendiente = crear(cliente)
+    respuesta = cliente.post("/api/recibir_datos_choferes", data=dict(formulario, foto_km_inicial_1_subida=pendiente))
+    assert respuesta.status_code == 400
+
+    id_subida = crear(cliente, nombre="km.png")
+    enviar(cliente, id_subida, contenido, 0)
+    cliente.post(f"/api/subidas/{id_subida}/confirmar")
+    respuesta = cliente.post("/api/recibir_datos_choferes", data=dict(formulario, foto_km_inicial_1_subida=id_subida))
+    assert respuesta.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(cliente.get("/descargar-carpeta-fotos/20261001_ana_P1").data)) as zf:
+        assert zf.read("20261001_ana_P1/20261001_ana_P1_salida_1.png") == contenido
+
+    assert cliente.get("/api/subidas/no-existe").status_code == 404
+
+
+def test_vencen_por_ultima_actividad(servidor, cliente):
+    viejo = time.time() - (servidor.SUBIDAS_VIGENCIA_HORAS + 1) * 3600
+
+    def envejecer(id_subida, *extensiones):
+        for extension in extensiones:
+            ruta = servidor.ruta_subida(id_subida, extension)
+            if os.path.exists(ruta):
+                os.utime(ruta, (viejo, viejo))
+
+    abandonada = crear(cliente)
+    enviar(cliente, abandonada, b"abc", 0)
+    envejecer(abandonada, ".json", ".parte")
+    activa = crear(cliente)
+    enviar(cliente, activa, b"abc", 0)
+    # Creada hace tiempo pero con bytes recientes: sigue vigente
+    envejecer(activa, ".json")
+
+    crear(cliente)
+    assert cliente.head(f"/api/subidas/{abandonada}").status_code == 404
+    assert cliente.head(f"/api/subidas/{activa}").headers["Upload-Offset"] == "3"
@@ -0,0 +1,60 @@
+"""Analítica de kilometraje y duración de viajes a partir de los formularios de choferes."""
+import json
+
+import pytest
+
+
+@pytest.fixture
+def viajes(cliente):
+    def enviar(tipo, chofer, placa, fecha, hora, km):
+        if tipo == "salida":
+            datos = {"tipo_formulario": "salida", "nombre_chofer": chofer, "placa": placa, "vehiculo": "Hilux",
+                     "fecha_salida": fecha, "hora_salida": hora, "km_inicial": km, "ubicacion_inicial": "Base"}
+        else:
+            datos = {"tipo_formulario": "llegada", "nombre_chofer": chofer, "placa": placa,
+                     "fecha_llegada": fecha, "hora_retorno": hora, "km_final": km, "ubicacion_final": "Obra"}
+        assert cliente.post("/api/recibir_datos_choferes", data=datos).status_code == 200
+
+    enviar("salida", "Juan", "ABC-1", "2026-10-01", "08:00", "1000")
+    enviar("salida", "Rosa", "XYZ-9", "2026-10-01", "09:00", "500")
+    enviar("llegada", "Juan", "ABC-1", "2026-10-01", "12:30", "1120")
+    enviar("salida", "Juan", "ABC-1", "2026-10-02", "08:00", "1100")
+    enviar("llegada", "Juan", "ABC-1", "2026-10-02", "07:00", "1050")
+    return cliente
+
+
+def consultar(cliente, consulta):
+    respuesta = cliente.get(f"/api/viajes/{consulta}")
+    assert respuesta.status_code == 200
+    return respuesta.json["resultados"]
+
+
+def test_totales_por_vehiculo_y_chofer(viajes):
+    (vehiculo,) = consultar(viajes, "vehiculos?placa=abc-1")
+    assert (vehiculo["km"], vehiculo["viajes"], vehiculo["viajes_abiertos"], vehiculo["horas_fuera"]) == (120.0, 2, 0, 4.5)
+    choferes = {c["chofer"]: c for c in consultar(viajes, "choferes")}
+    assert (choferes["Juan"]["viajes"], choferes["Rosa"]["viajes_abiertos"]) == (2, 1)
+    assert [v["placa"] for v in consultar(viajes, "abiertos")] == ["XYZ-9"]
+
+
+def test_anomalias_de_kilometraje_y_horario(viajes):
+    motivos = [a["motivo"] for a in consultar(viajes, "anomalias?placa=ABC-1")]
+    assert motivos == ["Kilometraje inicial menor que el último registrado para la placa",
+                       "Kilometraje final menor que el inicial", "Llegada anterior a la salida"]
+
+
+def test_reconstruir_da_el_mismo_resultado(servidor, viajes):
+    consultar(viajes, "vehiculos")
+    with open(servidor.ANALITICA_VIAJES_FILE, encoding="utf-8") as f:
+        incremental = json.load(f)
+    servidor.viajes_choferes.reconstruir()
+    servidor.analitica_viajes.reconstruir()
+    with open(servidor.ANALITICA_VIAJES_FILE, encoding="utf-8") as f:
+        reconstruido = json.load(f)
+    incremental.pop("indice_inodo")
+    reconstruido.pop("indice_inodo")
+    assert reconstruido == incremental
+
+
+def test_tipo_no_valido(cliente):
+    assert cliente.get("/api/viajes/rutas").status_code == 400